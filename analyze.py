@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline flight analytics over archives of logs main.py and recorder.py write, text and binary ones alike. Every log is
+loaded with lps_log.load and reduced to one row per Locus object of per-address statistics, computed with NumPy and
+pandas over whole columns at once:
+    lines, duration, rate - amount of lines, seconds between the first and the last one, lines per second
+    gap_* - packet inter-arrival gaps: median, 99th percentile, longest, and amount of gaps over the gap threshold
+    pos_error_* - positioning error distribution: mean, median, 95th percentile, largest, share of lines above 0
+    dropout_* - intervals when not every beacon was seen (beacons bits other than ALL_BEACONS): amount, total and
+                longest seconds, share of time, and share of lines each beacon was missing in
+    voltage_* - voltage sag: first, last and lowest voltage, sag from the first to the lowest one, least squares slope
+    speed_*, accel_* - velocity and acceleration from differences of positions: mean, 95th percentile, largest
+Logs are analysed by a pool of processes, one log per task, and the rows of all of them are written to a single CSV
+file. Voltage curves, median voltage of every address over fixed time steps, can be written to another one.
+Run 'python analyze.py --help' to see options
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import lps_log
+
+ALL_BEACONS = 0b1111  # beacons bits when every one of the four beacons is seen
+BEACONS = 4
+GAP_THRESHOLD = 0.5  # seconds between packets of an address counted as a gap
+CURVE_STEP = 10.0  # seconds of a voltage curve step
+COLUMNS = ('lines', 'duration', 'rate', 'gap_median', 'gap_p99', 'gap_max', 'gaps', 'pos_error_mean',
+           'pos_error_median', 'pos_error_p95', 'pos_error_max', 'pos_error_share', 'dropouts', 'dropout_seconds',
+           'dropout_max', 'dropout_share') + tuple('missing_%d' % (b + 1) for b in range(BEACONS)) + \
+          ('voltage_first', 'voltage_last', 'voltage_min', 'voltage_sag', 'voltage_slope', 'speed_mean', 'speed_p95',
+           'speed_max', 'accel_p95', 'accel_max')  # statistics of every address, in order of summary columns
+
+
+def log_frame(records, start_ns):
+    """
+    :param records: LOG_DTYPE records
+    :param start_ns: receive time of the start of the log, nanoseconds
+    :return: pandas DataFrame of the columns analysis uses, time in seconds since the start of the log
+    """
+    frame = pd.DataFrame({name: records[name] for name in ('addr', 'x', 'y', 'z', 'voltage', 'beacons', 'pos_error')})
+    frame.insert(0, 'time', (records['t_ns'].astype(np.int64) - np.int64(start_ns)) / 1e9)
+    return frame
+
+
+def _group_max(values, groups, count):
+    # Largest value of every group, NaN for groups without values
+    result = np.full(count, -np.inf)
+    np.maximum.at(result, groups, values)
+    result[np.isinf(result)] = np.nan
+    return result
+
+
+def analyze_frame(frame, gap_threshold=GAP_THRESHOLD):
+    """
+    :param frame: DataFrame of log_frame columns
+    :param gap_threshold: seconds between packets of an address counted as a gap
+    :return: DataFrame of statistics indexed by address
+    """
+    if not len(frame):
+        return pd.DataFrame(columns=COLUMNS, index=pd.Index([], name='addr'))
+    frame = frame.sort_values(['addr', 'time'], kind='stable')
+    addrs = frame['addr'].to_numpy()
+    t = frame['time'].to_numpy()
+    position = frame[['x', 'y', 'z']].to_numpy()
+    beacons = frame['beacons'].to_numpy()
+    # Every address is a contiguous run of lines in time order now, differences across runs are masked out
+    first = np.ones(len(frame), dtype=bool)
+    first[1:] = addrs[1:] != addrs[:-1]
+    last = np.ones(len(frame), dtype=bool)
+    last[:-1] = first[1:]
+    groups = np.cumsum(first) - 1  # index of the address of every line
+    count = int(groups[-1]) + 1
+    dt = np.diff(t, prepend=np.nan)
+    dt[first] = np.nan
+    step = np.where(dt > 0, dt, np.nan)  # lines stamped at the same time give no velocity
+    velocity = np.diff(position, axis=0, prepend=np.nan) / step[:, None]
+    second = np.zeros(len(frame), dtype=bool)
+    second[1:] = first[:-1]
+    acceleration = np.diff(velocity, axis=0, prepend=np.nan) / step[:, None]
+    acceleration[second] = np.nan
+    # Dropout lasts from a line with a beacon missing until the next line of the address
+    dropout = beacons != ALL_BEACONS
+    hold = np.zeros(len(frame))
+    hold[:-1] = np.nan_to_num(dt[1:])
+    hold[last] = 0.0
+    starts = dropout & (first | ~np.roll(dropout, 1))
+    intervals = np.cumsum(starts) - 1
+    interval_seconds = np.bincount(intervals[dropout], weights=hold[dropout], minlength=int(starts.sum()))
+    interval_groups = groups[starts]
+    lines = frame.assign(group=groups, dt=dt, gap=dt > gap_threshold, pos_error_set=frame['pos_error'] > 0,
+                         speed=np.linalg.norm(velocity, axis=1), accel=np.linalg.norm(acceleration, axis=1),
+                         dropout_time=np.where(dropout, hold, 0.0),
+                         **{'missing_%d' % (b + 1): (beacons >> b) & 1 == 0 for b in range(BEACONS)})
+    by_addr = lines.groupby('group', sort=True)
+    stats = by_addr.agg(addr=('addr', 'first'), lines=('time', 'size'), first_time=('time', 'first'),
+                        last_time=('time', 'last'), gap_median=('dt', 'median'), gap_max=('dt', 'max'),
+                        gaps=('gap', 'sum'), pos_error_mean=('pos_error', 'mean'),
+                        pos_error_median=('pos_error', 'median'), pos_error_max=('pos_error', 'max'),
+                        pos_error_share=('pos_error_set', 'mean'), dropout_seconds=('dropout_time', 'sum'),
+                        voltage_first=('voltage', 'first'), voltage_last=('voltage', 'last'),
+                        voltage_min=('voltage', 'min'), speed_mean=('speed', 'mean'), speed_max=('speed', 'max'),
+                        accel_max=('accel', 'max'),
+                        **{'missing_%d' % (b + 1): ('missing_%d' % (b + 1), 'mean') for b in range(BEACONS)})
+    quantiles = by_addr[['dt', 'pos_error', 'speed', 'accel']].quantile([0.99, 0.95]).unstack()
+    stats['gap_p99'] = quantiles[('dt', 0.99)]
+    stats['pos_error_p95'] = quantiles[('pos_error', 0.95)]
+    stats['speed_p95'] = quantiles[('speed', 0.95)]
+    stats['accel_p95'] = quantiles[('accel', 0.95)]
+    stats['duration'] = stats['last_time'] - stats['first_time']
+    stats['rate'] = (stats['lines'] - 1) / stats['duration'].where(stats['duration'] > 0)
+    stats['dropouts'] = np.bincount(interval_groups, minlength=count)
+    stats['dropout_max'] = np.nan_to_num(_group_max(interval_seconds, interval_groups, count))
+    stats['dropout_share'] = stats['dropout_seconds'] / stats['duration'].where(stats['duration'] > 0)
+    stats['voltage_sag'] = stats['voltage_first'] - stats['voltage_min']
+    # Least squares slope of voltage over time from sums of every address, volts per minute
+    centered_t = t - (stats['first_time'].to_numpy() + stats['duration'].to_numpy() / 2)[groups]
+    voltage = frame['voltage'].to_numpy()
+    sums = pd.DataFrame({'tt': centered_t * centered_t, 'tv': centered_t * voltage, 't': centered_t, 'v': voltage,
+                         'n': 1.0}).groupby(groups).sum()
+    variance = sums['tt'] - sums['t'] ** 2 / sums['n']
+    covariance = sums['tv'] - sums['t'] * sums['v'] / sums['n']
+    stats['voltage_slope'] = (covariance / variance.where(variance > 0)).to_numpy() * 60
+    return stats.set_index('addr')[list(COLUMNS)]
+
+
+def voltage_curves(frame, step=CURVE_STEP):
+    """
+    :param frame: DataFrame of log_frame columns
+    :param step: seconds of a curve step
+    :return: DataFrame of median voltage of every address over every step, with addr, time and voltage columns, time
+             is the start of the step
+    """
+    curves = frame.groupby(['addr', (frame['time'] // step) * step])['voltage'].median()
+    return curves.reset_index()
+
+
+def analyze_file(path, gap_threshold=GAP_THRESHOLD, curve_step=None, cache=False):
+    """
+    Task of a worker process
+    :param path: log filename
+    :param gap_threshold: seconds between packets of an address counted as a gap
+    :param curve_step: seconds of a voltage curve step, no curves if None
+    :param cache: whether to save the parsed copy of a text log next to it, see lps_log.load
+    :return: tuple of statistics and voltage curves (or None) DataFrames, both with a file column, and amount of lines
+    """
+    start_ns, records = lps_log.load(path, cache=cache)
+    frame = log_frame(records, start_ns)
+    stats = analyze_frame(frame, gap_threshold).reset_index()
+    stats.insert(0, 'file', os.path.basename(path))
+    curves = None
+    if curve_step:
+        curves = voltage_curves(frame, curve_step)
+        curves.insert(0, 'file', os.path.basename(path))
+    return stats, curves, len(records)
+
+
+def analyze(paths, jobs=None, gap_threshold=GAP_THRESHOLD, curve_step=None, cache=False):
+    """
+    :param paths: log filenames
+    :param jobs: amount of worker processes, all CPUs if None, 1 to analyse in this process
+    :return: tuple of statistics and voltage curves (or None) DataFrames of all the logs, and amount of lines
+    """
+    options = (gap_threshold, curve_step, cache)
+    if jobs == 1 or len(paths) < 2:
+        results = [analyze_file(path, *options) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(analyze_file, paths, *[[option] * len(paths) for option in options]))
+    stats = pd.concat([result[0] for result in results], ignore_index=True) if results else pd.DataFrame()
+    curves = pd.concat([result[1] for result in results], ignore_index=True) if curve_step and results else None
+    return stats, curves, sum(result[2] for result in results)
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='Per-address statistics of Locus telemetry logs')
+    parser.add_argument('paths', nargs='+', help='log files and directories of logs (.txt and .l3b)')
+    parser.add_argument('--output', default='summary.csv', help='CSV file of statistics, one row per log and address')
+    parser.add_argument('--curves', help='CSV file of voltage curves, median voltage per address and time step')
+    parser.add_argument('--curve-step', type=float, default=CURVE_STEP, help='voltage curve time step, seconds')
+    parser.add_argument('--gap', type=float, default=GAP_THRESHOLD, help='time between packets of an address '
+                                                                         'counted as a gap, seconds')
+    parser.add_argument('--jobs', type=int, help='worker processes (default: all CPUs)')
+    parser.add_argument('--cache', action='store_true', help='save parsed copies of text logs next to them')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parseArgs()
+    logs = lps_log.find_logs(args.paths)
+    if not logs:
+        sys.exit('no logs found')
+    started = time.perf_counter()
+    summary, curves, total = analyze(logs, args.jobs, args.gap, args.curve_step if args.curves else None, args.cache)
+    summary.to_csv(args.output, index=False, float_format='%.6g')
+    if curves is not None:
+        curves.to_csv(args.curves, index=False, float_format='%.6g')
+    print('%d logs, %d lines, %d addresses analysed in %.2f s, written to %s' % (
+        len(logs), total, len(summary), time.perf_counter() - started, args.output))
@@ -0,0 +1,1162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Performance measurements of the ground station. Run 'python benchmark.py <name> --help' to see options of a benchmark
+"""
+import argparse
+import asyncio
+import glob
+import os
+import random
+import statistics
+import threading
+import time
+import gs_lps
+
+BAUDRATE = 57600  # RS-485 line speed, 10 bits on the wire per byte
+
+def frames_from_logs(paths):
+    """
+    Rebuild frames the way they were received on the bus from telemetry rows of text logs. Non telemetry lines of
+    extended logs are skipped
+    :param paths: list of text log filenames
+    :return: list of frames
+    """
+    frames = []
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                row = line.strip().split(', ')
+                if len(row) != 18:
+                    continue
+                frames.append(gs_lps.encode_telemetry([int(v) for v in row[1:5]] + [float(v) for v in row[5:11]] +
+                                                      [int(v) for v in row[11:14]] + [float(row[14])] +
+                                                      [int(v) for v in row[15:18]]))
+    return frames
+
+
+def capture_from_logs(paths):
+    """
+    Rebuild byte stream the way it was received on the bus from telemetry rows of text logs
+    :param paths: list of text log filenames
+    :return: tuple of byte stream and amount of frames in it
+    """
+    frames = frames_from_logs(paths)
+    return b''.join(frames), len(frames)
+
+
+def corrupt(stream, rate, seed):
+    """
+    Flip random bits of the stream to check scanner resynchronisation
+    :param stream: bytes to corrupt
+    :param rate: probability of each byte to be corrupted
+    :param seed: random generator seed, so runs are reproducible
+    :return: corrupted copy of the stream
+    """
+    rng = random.Random(seed)
+    data = bytearray(stream)
+    for i in range(len(data)):
+        if rng.random() < rate:
+            data[i] ^= 1 << rng.randrange(8)
+    return bytes(data)
+
+
+def legacy_scan(chunks):
+    """
+    Per-byte state machine us_nav.run used before frame_scanner, kept as the reference point
+    :param chunks: list of received chunks
+    :return: amount of frames passed CRC check
+    """
+    crc_table = gs_lps.crc8.crcTable
+    buffer = bytearray(260)
+    idx = size = frames = 0
+    for data in chunks:
+        data_len = len(data)
+        i = 0
+        while i < data_len:
+            if idx == 0:
+                if data[i] == 0xFE:
+                    idx += 1
+                i += 1
+            elif idx == 1:
+                buffer[idx] = data[i]
+                size = data[i] + 4
+                i += 1
+                idx += 1
+            elif idx < size:
+                block_len = min(size - idx, data_len - i)
+                buffer[idx: idx + block_len] = data[i: i + block_len]
+                idx += block_len
+                i += block_len
+            else:
+                crc = 0
+                for byte in buffer[1:size]:
+                    crc = crc_table[crc ^ byte]
+                if data[i] == crc:
+                    frames += 1
+                idx = 0
+                i += 1
+    return frames
+
+
+def bench_scanner(args):
+    if args.capture:
+        stream = b''.join(open(path, 'rb').read() for path in args.capture)
+        expected = None
+    else:
+        stream, expected = capture_from_logs(args.log or sorted(glob.glob('logs/*.txt')))
+    if args.corrupt > 0:
+        stream = corrupt(stream, args.corrupt, args.seed)
+    chunks = [stream[i:i + args.chunk] for i in range(0, len(stream), args.chunk)]
+    print('stream: %d bytes, %d chunks of %d bytes%s' % (len(stream), len(chunks), args.chunk,
+                                                          '' if expected is None else ', %d frames sent' % expected))
+
+    def run_legacy():
+        return legacy_scan(chunks)
+
+    def run_scanner():
+        scanner = gs_lps.frame_scanner()
+        frames = 0
+        for chunk in chunks:
+            frames += len(scanner.feed(chunk))
+        return frames
+
+    for name, fn in (('legacy state machine', run_legacy), ('frame_scanner', run_scanner)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            frames = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('%-22s %8d frames  %10.0f packets/s  %7.2f MB/s' % (name, frames, frames / best,
+                                                                  len(stream) / best / 1e6))
+
+
+def bench_decode(args):
+    frames = [frame[:-1] for frame in frames_from_logs(args.log or sorted(glob.glob('logs/*.txt')))]
+    nav = gs_lps.us_nav(debug=True, queue_size=len(frames))
+    print('%d telemetry packets' % len(frames))
+
+    def run_scalar():
+        for frame in frames:
+            nav.parse_packet(frame)
+        nav.drain()
+
+    def run_batch():
+        gs_lps.decode_telemetry_batch(frames)
+
+    for name, fn in (('parse_packet', run_scalar), ('decode_telemetry_batch', run_batch)):
+        best = min(timeit(fn) for _ in range(args.repeat))
+        print('%-22s %10.0f packets/s' % (name, len(frames) / best))
+
+
+def bench_swarm(args):
+    import lps_sim
+    print('%.0f s of synthetic %s flight, %.0f Hz per drone, serial line carries %d bytes/s'
+          % (args.duration, args.pattern, args.rate, BAUDRATE // 10))
+    for drones in args.drones:
+        emitter = lps_sim.swarm_emitter(drones, args.rate, args.pattern, args.seed, args.corrupt)
+        stream = emitter.stream(args.duration)
+        expected = emitter.sent - emitter.corrupted
+        port = lps_sim.memory_port()
+        nav = gs_lps.us_nav(ser=port, queue_size=args.queue)
+        nav.start()
+        consumed = 0
+        start = time.perf_counter()
+        for i in range(0, len(stream), args.chunk):
+            port.feed(stream[i:i + args.chunk])
+        while nav.queue.pushed < expected and time.perf_counter() - start < 60:
+            time.sleep(0.001)
+            consumed += len(nav.drain())
+        elapsed = time.perf_counter() - start
+        consumed += len(nav.drain())
+        nav.stop()
+        capacity = nav.queue.pushed / elapsed
+        required = expected / args.duration
+        print('%4d drones: %7.0f packets/s needed, %6.0f bytes/s (%4.1f serial lines), ingest sustains %8.0f packets/s '
+              '(%5.1fx real time), %d consumed, %d dropped'
+              % (drones, required, len(stream) / args.duration, len(stream) / args.duration / (BAUDRATE // 10),
+                 capacity, capacity / required, consumed, nav.queue.dropped))
+    if args.render:
+        bench_swarm_render(args)
+
+
+def bench_multiport(args):
+    import lps_sim
+    print('%d drones, %.0f Hz each, %.0f s of flight split between adapters, %d drones heard on every bus'
+          % (args.drones, args.rate, args.duration, args.overlap))
+    for ports in args.ports:
+        streams = []
+        expected = 0
+        for i in range(ports):
+            # Every adapter hears its own share of the swarm plus the overlapping drones, which are the same on all
+            share = (args.drones - args.overlap) // ports
+            emitter = lps_sim.swarm_emitter(share, args.rate, args.pattern, args.seed + i,
+                                            first_addr=args.overlap + 1 + i * share)
+            stream = emitter.stream(args.duration)
+            expected += emitter.sent
+            if args.overlap:
+                common = lps_sim.swarm_emitter(args.overlap, args.rate, args.pattern, args.seed - 1)
+                stream += common.stream(args.duration)
+                expected += common.sent if i == 0 else 0
+            streams.append(stream)
+        group = gs_lps.us_nav_group(navs=[gs_lps.us_nav(ser=lps_sim.memory_port(), queue_size=args.queue)
+                                          for _ in range(ports)], dedup_window=args.dedup)
+        group.start()
+        delivered = 0
+        start = time.perf_counter()
+        for nav, stream in zip(group.navs, streams):
+            for i in range(0, len(stream), args.chunk):
+                nav.ser.feed(stream[i:i + args.chunk])
+        while delivered < expected and time.perf_counter() - start < 60:
+            time.sleep(0.001)
+            delivered += len(group.drain())
+        elapsed = time.perf_counter() - start
+        group.stop()
+        line = sum(len(stream) for stream in streams) / args.duration / ports / (BAUDRATE // 10)
+        print('%2d adapters: %8.0f packets/s merged, %d delivered of %d, %d duplicates dropped, bus load %5.1f%%'
+              % (ports, delivered / elapsed, delivered, expected, sum(group.duplicates), line * 100))
+
+
+def bench_pubsub(args):
+    import lps_sim
+    import lps_pubsub
+    emitter = lps_sim.swarm_emitter(args.drones, args.rate, 'circle', args.seed)
+    stream = emitter.stream(args.duration)
+    print('%d packets as fast as possible, then %.0f s in real time, %d subscribers (%d of them never read)'
+          % (emitter.sent, args.realtime, args.subscribers, args.slow))
+
+    def subscribe(transport, latencies):
+        subscribers = []
+        for i in range(args.subscribers):
+            subscriber = lps_pubsub.telemetry_subscriber(transport, queue_size=1 << 20)
+            if i < args.slow:
+                subscriber.run = lambda: None  # never reads its socket
+            else:
+                push = subscriber.queue.push
+
+                def timed_push(record, push=push):
+                    latencies.append((time.monotonic_ns() - record.t_ns) / 1e3)
+                    push(record)
+                subscriber.queue.push = timed_push
+            subscriber.start()
+            subscribers.append(subscriber)
+        return subscribers
+
+    for transport in args.transports:
+        for publish in (False, True):
+            latencies = []
+            subscribers = subscribe(transport, latencies) if publish else []
+            port = lps_sim.memory_port()
+            nav = gs_lps.us_nav(ser=port, queue_size=1 << 20)
+            publisher = lps_pubsub.telemetry_publisher(transport)
+            if publish:
+                publisher.attach(nav)
+            nav.start()
+            time.sleep(0.2)
+            start = time.perf_counter()
+            for i in range(0, len(stream), args.chunk):
+                port.feed(stream[i:i + args.chunk])
+            while nav.queue.pushed < emitter.sent and time.perf_counter() - start < 60:
+                time.sleep(0.001)
+            elapsed = time.perf_counter() - start
+            time.sleep(0.3)
+            nav.stop()
+            for subscriber in subscribers:
+                subscriber.stop()
+            publisher.close()
+            if publish:
+                print('%-5s with publisher   reader %8.0f packets/s, %d sent, %d dropped, fast subscribers received %s'
+                      % (transport, nav.queue.pushed / elapsed, publisher.sent, publisher.dropped,
+                         [subscriber.received for subscriber in subscribers[args.slow:]]))
+            else:
+                print('%-5s no publisher     reader %8.0f packets/s' % (transport, nav.queue.pushed / elapsed))
+
+        latencies = []
+        subscribers = subscribe(transport, latencies)
+        nav = lps_sim.simulate(args.drones, args.rate, seed=args.seed)
+        publisher = lps_pubsub.telemetry_publisher(transport)
+        publisher.attach(nav)
+        nav.start()
+        time.sleep(args.realtime)
+        nav.stop()
+        time.sleep(0.2)
+        for subscriber in subscribers:
+            subscriber.stop()
+        publisher.close()
+        latencies.sort()
+        if latencies:
+            print('%-5s real time        %d received of %d published, reader to subscriber latency median %6.1f us '
+                  'p99 %7.1f us' % (transport, len(latencies), nav.queue.pushed * (args.subscribers - args.slow),
+                                    statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]))
+
+
+def bench_swarm_render(args):
+    """
+    Run the live view offscreen against real time synthetic swarms and measure how many packets it keeps up with
+    """
+    from panda3d.core import loadPrcFileData
+    loadPrcFileData('', 'window-type offscreen\naudio-library-name null')
+    if args.fps:
+        loadPrcFileData('', 'clock-mode limited\nclock-frame-rate %f' % args.fps)
+    import lps_sim
+    import main as live
+    app = None
+    for drones in args.render:
+        if app is None:
+            app = live.Locus3D(lps_sim.simulate(drones, args.rate, args.pattern, args.seed), labelRate=args.label_rate)
+            app.debugging = args.labels
+        else:
+            app.lps.stop()
+            app.lps = lps_sim.simulate(drones, args.rate, args.pattern, args.seed)
+            app.lps.start()
+        app.taskMgr.step()
+        sent = app.lps.queue.pushed
+        app.lps.latency = gs_lps.latency_histogram()
+        app.frames = app.handleTime = 0
+        frames = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.duration:
+            app.taskMgr.step()
+            frames += 1
+        elapsed = time.perf_counter() - start
+        print('%4d drones rendered: %6.1f fps, %5.2f ms per frame (%5.3f ms handling telemetry), %7.0f packets/s '
+              'received, %d dropped, receive to display latency p50 %.1f ms p99 %.1f ms'
+              % (drones, frames / elapsed, elapsed / frames * 1000, app.handleTime / app.frames / 1e6,
+                 (app.lps.queue.pushed - sent) / elapsed, app.lps.queue.dropped,
+                 app.lps.latency.percentile(50) / 1000, app.lps.latency.percentile(99) / 1000))
+    app.lps.stop()
+
+
+def bench_render(args):
+    from panda3d.core import loadPrcFileData
+    loadPrcFileData('', 'window-type offscreen\naudio-library-name null\nwin-size %d %d\nsync-video false'
+                    % tuple(args.size))
+    from direct.showbase.ShowBase import ShowBase
+    import numpy as np
+    import lps_render
+    base = ShowBase()
+    base.disableMouse()
+    base.camera.setPos(0, -16, 9)
+    base.camera.lookAt(0, 0, 1.5)
+    gsg = base.win.getGsg()
+    print('%s %s, instancing %ssupported' % (gsg.getDriverVendor(), gsg.getDriverRenderer(),
+                                              '' if lps_render.supports_instancing(base.win) else 'not '))
+    rng = np.random.default_rng(args.seed)
+    for drones in args.drones:
+        for instanced in (False, True):
+            if instanced and not lps_render.supports_instancing(base.win):
+                continue
+            for trail in sorted({0, args.trail}):
+                root = base.render.attachNewNode('swarm')
+                swarm = lps_render.make_swarm(base, root, instanced)
+                trails = lps_render.drone_trails(root, trail, args.trail_decimation) if trail else None
+                slots = np.arange(drones)
+                for i in slots:
+                    swarm.spawn()
+                    swarm.set_visible(i, True)
+                    if trails is not None:
+                        trails.spawn()
+                positions = rng.uniform((-5, -5, 0), (5, 5, 4), (drones, 3)).astype(np.float32)
+                times, trailTimes = [], []
+                for frame in range(args.frames + 10):
+                    start = time.perf_counter()
+                    positions += rng.normal(0, 0.01, positions.shape).astype(np.float32)
+                    swarm.set_positions(slots, positions)
+                    swarm.flush()
+                    if trails is not None:
+                        trailStart = time.perf_counter()
+                        for i, (x, y, z) in enumerate(positions.tolist()):  # packet by packet, as the views do
+                            trails.set_pos(i, x, y, z)
+                        trails.flush()
+                        trailTimes.append(time.perf_counter() - trailStart)
+                    base.graphicsEngine.renderFrame()
+                    times.append(time.perf_counter() - start)
+                times = sorted(times[10:])  # first frames compile shaders and upload geometry
+                print('%5d drones %-15s %-16s frame time median %7.2f ms  p95 %7.2f ms%s'
+                      % (drones, type(swarm).__name__, '+ %d point trails' % trail if trail else '',
+                         statistics.median(times) * 1000, times[int(len(times) * 0.95)] * 1000,
+                         ', trail updates %.2f ms' % (statistics.median(trailTimes[10:]) * 1000) if trail else ''))
+                root.removeNode()
+
+
+def bench_smoothing(args):
+    """
+    Error of drawn drone positions against the synthetic ground truth, for drones jumping from packet to packet,
+    dead reckoning of the live view and interpolation of the player, and CPU time of lps_motion per frame
+    """
+    import heapq
+    import numpy as np
+    import lps_motion
+    import lps_sim
+    emitter = lps_sim.swarm_emitter(args.drones, args.rate, args.pattern, args.seed)
+    rng = random.Random(args.seed)
+
+    def sample(drone, t):
+        (x, y, z), (vx, vy, vz) = emitter.state(drone, t)
+        noise = [rng.gauss(0, args.noise / 1000) for _ in range(3)] if args.noise else (0.0, 0.0, 0.0)
+        return (x + noise[0], y + noise[1], z + noise[2]), (vx / 1000, vy / 1000, vz / 1000)
+
+    # Packets of every drone in time order, as (time, drone) pairs, and the packet after each one for interpolation
+    packets = []
+    for t, i in emitter.schedule:
+        while t < args.duration:
+            packets.append((t, i))
+            t += emitter.drones[i]['period']
+    heapq.heapify(packets)
+    held = np.zeros((args.drones, 3))
+    reckoning, interpolation = lps_motion.motion_smoother(args.drones), lps_motion.motion_smoother(args.drones)
+    for i in range(args.drones):
+        reckoning.spawn()
+        interpolation.spawn()
+    seen = np.zeros(args.drones, dtype=bool)
+    errors = {'sample and hold': [], 'dead reckoning': [], 'interpolation': []}
+    nextPacket = {}
+    for frame in range(int(args.duration * args.fps)):
+        now = frame / args.fps
+        while packets and packets[0][0] <= now:
+            t, i = heapq.heappop(packets)
+            drone = emitter.drones[i]
+            pos, vel = nextPacket.pop(i) if i in nextPacket else sample(drone, t)
+            nextPacket[i] = sample(drone, t + drone['period'])
+            held[i] = pos
+            reckoning.update(i, t, pos, vel)
+            interpolation.set_segment(i, t, pos, t + drone['period'], nextPacket[i][0])
+            seen[i] = True
+        if now < 1.0 or not seen.all():  # blending of the first packets is not what is measured
+            continue
+        truth = np.array([emitter.state(drone, now)[0] for drone in emitter.drones])
+        errors['sample and hold'].append(np.linalg.norm(held - truth, axis=1))
+        errors['dead reckoning'].append(np.linalg.norm(reckoning.positions(now) - truth, axis=1))
+        # The player knows the next line of a log, so it moves towards the next packet ahead of its time
+        errors['interpolation'].append(np.linalg.norm(interpolation.positions(now) - truth, axis=1))
+    for name, error in errors.items():
+        error = np.concatenate(error) * 1000
+        print('%-16s position error RMS %6.1f mm, p99 %6.1f mm, max %6.1f mm'
+              % (name, np.sqrt(np.mean(error ** 2)), np.percentile(error, 99), error.max()))
+
+    # CPU time of positions of the whole swarm, computed once per frame
+    for drones in args.swarm:
+        motion = lps_motion.motion_smoother(drones)
+        for i in range(drones):
+            motion.spawn()
+            motion.update(i, 0.0, (rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(0, 4)), (0.5, 0.5, 0.0))
+        slots = np.arange(drones)
+        times = []
+        for frame in range(args.frames):
+            start = time.perf_counter()
+            motion.positions(frame / args.fps)[slots]
+            times.append(time.perf_counter() - start)
+        print('%5d drones: positions() %6.1f us per frame' % (drones, statistics.median(times) * 1e6))
+
+
+def bench_logger(args):
+    """
+    CPU time per record of the text log written on the render thread, as it used to be, and of lps_log loggers
+    """
+    import shutil
+    import tempfile
+    import lps_log
+    import lps_sim
+    frames = lps_sim.swarm_emitter(args.drones, seed=args.seed).stream(args.records / args.drones / 10.0)
+    packets = gs_lps.frame_scanner().feed(frames)
+    t_ns = time.monotonic_ns() + 60 * 10 ** 9  # received after every logger has started
+    records = [gs_lps.telemetry(*row, t_ns + i * 100000)
+               for i, row in enumerate(gs_lps.decode_telemetry_batch(packets).tolist())]
+    batches = [records[i:i + args.batch] for i in range(0, len(records), args.batch)]
+    directory = tempfile.mkdtemp()
+
+    def legacy(name):
+        # Formatting and unbuffered text writes in the render thread, the way main.py used to log
+        timer = time.monotonic_ns()
+        with open(os.path.join(directory, name + '.txt'), 'w') as log:
+            for batch in batches:
+                lines = []
+                for record in batch:
+                    if record.t_ns < timer:
+                        continue
+                    stamp = '%.4f' % ((record.t_ns - timer) / 1e9)
+                    lines.append(stamp + ', ' + str(tuple(record[:-1]))[1:-1] + '\n')
+                log.write(''.join(lines))
+        return os.path.getsize(log.name)
+
+    def threaded(log_format):
+        def run(name):
+            logger = lps_log.make_logger(log_format, directory=directory, name=name)
+            for batch in batches:
+                logger.log(batch)
+            logger.close()
+            return logger.bytes
+        return run
+
+    try:
+        for name, run in (('text, render thread', legacy), ('text, lps_log thread', threaded('text')),
+                          ('binary, lps_log thread', threaded('binary'))):
+            cpu, caller = time.process_time(), time.thread_time()
+            start = time.perf_counter()
+            size = run(name.replace(' ', '_').replace(',', ''))
+            elapsed = time.perf_counter() - start
+            caller, cpu = time.thread_time() - caller, time.process_time() - cpu
+            print('%-24s %6.2f us/record on the calling thread, %6.2f us/record CPU in total, %5.1f bytes/record, '
+                  '%8.0f records/s' % (name, caller / len(records) * 1e6, cpu / len(records) * 1e6,
+                                       size / len(records), len(records) / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_recorder(args):
+    """
+    CPU and memory footprint of recorder.py reading a pseudo-terminal a real time synthetic swarm is written into
+    """
+    import resource
+    import shutil
+    import signal
+    import subprocess
+    import sys
+    import tempfile
+    import lps_log
+    import lps_sim
+    port = lps_sim.virtual_port()
+    directory = tempfile.mkdtemp()
+    try:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        recorder = subprocess.Popen([sys.executable, 'recorder.py', '--port', port.name, '--directory', directory,
+                                     '--log-format', args.log_format, '--mode', args.mode, '--status', '0'],
+                                    cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL)
+        time.sleep(1.0)  # recorder opens the port
+        emitter = lps_sim.swarm_emitter(args.drones, args.rate, seed=args.seed)
+        lps_sim.play(emitter, port, args.duration).join()
+        time.sleep(0.5)  # the last records are drained
+        recorder.send_signal(signal.SIGTERM)
+        recorder.wait()
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = after.ru_utime + after.ru_stime - usage.ru_utime - usage.ru_stime
+        records = 0
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(lps_log.binary_logger.EXTENSION):
+                records += len(lps_log.read(path)[1])
+            else:
+                with open(path) as f:
+                    records += sum(1 for _ in f)
+        print('%s mode, %d drones at %.0f Hz for %.0f s: %.1f%% of a core (startup included), max RSS %.1f MB, '
+              '%d records (%.0f%% of sent) in %d files' % (args.mode, args.drones, args.rate, args.duration,
+                                                cpu / (args.duration + 1.5) * 100,
+                                                after.ru_maxrss / 1024, records,
+                                                records / emitter.sent * 100,
+                                                len(os.listdir(directory))))
+    finally:
+        port.close()
+        shutil.rmtree(directory)
+
+
+STARTUP_SCRIPT = """
+import sys
+from panda3d.core import loadPrcFileData
+loadPrcFileData('', 'window-type offscreen\\naudio-library-name null')
+if sys.argv[1] == 'main':
+    import lps_sim, main
+    app = main.Locus3D(lps_sim.simulate(1))
+else:
+    import player
+    app = player.LogPlayer(sys.argv[2])
+while not hasattr(app, 'firstFrameTime'):
+    app.taskMgr.step()
+if sys.argv[1] == 'main':
+    app.lps.stop()
+"""
+
+
+def bench_startup(args):
+    """
+    Time from the start of the interpreter till the first rendered frame of the live view and the player, with empty
+    (cold) and filled (warm) model cache. Every run is a separate process, so imports are measured too
+    """
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import lps_render
+    import lps_sim
+    frames = lps_sim.swarm_emitter(args.drones, seed=args.seed).generate(args.duration)
+    scanner = gs_lps.frame_scanner()
+    packets = [packet for _, frame in frames for packet in scanner.feed(frame)]
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as log:
+        for (t, _), row in zip(frames, gs_lps.decode_telemetry_batch(packets).tolist()):
+            log.write('%.4f, %s\n' % (t, str(row)[1:-1]))
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        for program in ('main', 'player'):
+            for cache in ('cold', 'warm'):
+                times = []
+                for _ in range(args.runs):
+                    if cache == 'cold':
+                        shutil.rmtree(lps_render.CACHE_DIR, ignore_errors=True)
+                    start = time.perf_counter()
+                    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, program, log.name], cwd=cwd,
+                                            capture_output=True, text=True, check=True).stdout
+                    times.append(time.perf_counter() - start)
+                    reported = [line for line in output.splitlines() if 'first frame in' in line]
+                print('%-6s %s cache: first frame in %.3f s median (%.3f s min), %s'
+                      % (program, cache, statistics.median(times), min(times),
+                         reported[-1] if reported else 'no report'))
+    finally:
+        os.remove(log.name)
+        if os.path.exists(log.name + '.npy'):
+            os.remove(log.name + '.npy')  # parsed copy the player saved
+
+
+def synthetic_records(rows, drones, seed):
+    """
+    :return: LOG_DTYPE records of drones sending 10 packets per second each at random positions, quicker to make
+             than an lps_sim stream of the same length
+    """
+    import numpy as np
+    import lps_log
+    rng = np.random.default_rng(seed)
+    records = np.zeros(rows, dtype=lps_log.LOG_DTYPE)
+    records['start'], records['size'], records['event'] = 0, 30, 2
+    records['addr'] = rng.integers(1, drones + 1, rows)
+    for name in ('roll', 'pitch', 'yaw'):
+        records[name] = rng.uniform(0, 6.28, rows).round(3)
+    for name, (low, high) in (('x', (-5.5, 5.5)), ('y', (-5.5, 5.5)), ('z', (0, 4))):
+        records[name] = rng.uniform(low, high, rows).round(3)
+    for name in ('vX', 'vY', 'vZ'):
+        records[name] = rng.integers(-500, 500, rows)
+    records['voltage'] = rng.uniform(7, 8.4, rows).round(3)
+    records['beacons'], records['status'] = 15, 130
+    records['pos_error'] = rng.integers(0, 3, rows)
+    records['t_ns'] = np.arange(rows) * (10 ** 9 // (drones * 10))  # 10 Hz per drone
+    return records
+
+
+def write_binary_log(path, records):
+    import lps_log
+    with open(path, 'wb') as f:
+        f.write(lps_log.HEADER.pack(lps_log.MAGIC, lps_log.VERSION, lps_log.LOG_DTYPE.itemsize, 0, 0, 0.0))
+        f.write(records.tobytes())
+
+
+LOAD_SCRIPT = """
+import sys, time
+import numpy as np
+import pandas
+import lps_log
+
+
+def peak_rss():
+    # ru_maxrss would include the benchmark process the script is forked from, VmHWM is reset on exec
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmHWM'))
+
+
+method, path = sys.argv[1:]
+before = peak_rss()
+start = time.perf_counter()
+if method == 'lines':
+    with open(path, 'r') as f:
+        log = [line.strip().split(', ') for line in f.read().splitlines()]
+else:
+    log = lps_log.load(path, cache=method != 'parse')
+elapsed = time.perf_counter() - start
+print(elapsed, (peak_rss() - before) / 1024)
+"""
+
+
+def bench_logload(args):
+    """
+    Time and peak memory of opening a log in the player: text lines split into lists of strings, as the player used to,
+    text log parsed into columns, text log loaded from its parsed copy and binary log. Every load is a separate
+    process, so memory is not shared between them
+    """
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import lps_log
+    records = synthetic_records(args.rows, args.drones, args.seed)
+    directory = tempfile.mkdtemp()
+    text, binary = os.path.join(directory, 'log.txt'), os.path.join(directory, 'log.l3b')
+    with open(text, 'w') as f:
+        f.write(lps_log.format_lines(records.tolist(), 0))
+    write_binary_log(binary, records)
+    del records
+    print('%d rows: text log %.1f MB, binary log %.1f MB' % (args.rows, os.path.getsize(text) / 2 ** 20,
+                                                             os.path.getsize(binary) / 2 ** 20))
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        for name, method, path in (('text, lines of strings', 'lines', text), ('text, parsed', 'parse', text),
+                                   ('text, parsed and saved', 'cache', text), ('text, parsed copy', 'cache', text),
+                                   ('binary', 'cache', binary)):
+            output = subprocess.run([sys.executable, '-c', LOAD_SCRIPT, method, path], cwd=cwd, capture_output=True,
+                                    text=True, check=True).stdout
+            elapsed, memory = map(float, output.split())
+            print('%-24s %7.3f s, peak memory %7.1f MB' % (name, elapsed, memory))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_playback(args):
+    """
+    Run the player offscreen at several speeds and measure whether the played log time keeps up with the play time
+    """
+    import tempfile
+    from panda3d.core import loadPrcFileData
+    loadPrcFileData('', 'window-type offscreen\naudio-library-name null\nsync-video false')
+    import numpy as np
+    import player
+    rows = int(args.drones * 10 * (args.duration * max(args.speed) + 10))
+    with tempfile.NamedTemporaryFile(suffix='.l3b', delete=False) as log:
+        write_binary_log(log.name, synthetic_records(rows, args.drones, args.seed))
+    try:
+        app = player.LogPlayer(log.name, trailLength=args.trail, smooth=args.smooth)
+        app.messenger.send('f1')
+        app.taskMgr.step()
+        print('%d drones, %d lines per second of log' % (args.drones, args.drones * 10))
+        for speed in args.speed:
+            app.speed = speed
+            app._seek(0.0)
+            frames, lags = 0, []
+            start = time.perf_counter()
+            while time.perf_counter() - start < args.duration:
+                app.taskMgr.step()
+                frames += 1
+                if app.iterator:
+                    lags.append(app._playTime() - app.log.time(app.iterator - 1))
+            elapsed = time.perf_counter() - start
+            print('x%-5g %6.1f fps, %7.0f lines/s played (one line per frame would be %4.0f), log time behind play '
+                  'time by %.3f s median, %.3f s p99' % (speed, frames / elapsed, app.iterator / elapsed,
+                                                         frames / elapsed, np.median(lags), np.percentile(lags, 99)))
+    finally:
+        os.remove(log.name)
+
+
+STREAM_SCRIPT = """
+import sys, time
+from panda3d.core import loadPrcFileData
+loadPrcFileData('', 'window-type offscreen\\naudio-library-name null\\nsync-video false')
+import player
+
+
+def rss(field):
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field)) / 1024
+
+
+mode, path, duration = sys.argv[1], sys.argv[2], float(sys.argv[3])
+before = rss('RssAnon')  # private memory, pages of a mapped file are page cache the OS takes back when it needs
+start = time.perf_counter()
+app = player.LogPlayer(path, stream=mode == 'stream')
+opened = time.perf_counter() - start
+memory = peak = rss('RssAnon') - before
+app.speed = player.SPEEDS[-1]
+app.messenger.send('f1')
+frames, start = 0, time.perf_counter()
+while time.perf_counter() - start < duration:
+    app.taskMgr.step()
+    frames += 1
+    if frames % 100 == 0:
+        app._seek(app._playTime() + app.duration / 10)  # jumps, as a user looking for something does
+        peak = max(peak, rss('RssAnon') - before)
+print(opened, memory, peak, frames / (time.perf_counter() - start),
+      getattr(app.log, 'misses', 0), getattr(app.log, 'prefetched', 0))
+"""
+
+
+def bench_stream(args):
+    """
+    Open time and memory of the player with the log in memory and memory-mapped, for a large binary log. Every mode
+    runs in its own process, the log is in the page cache of the OS for both
+    """
+    import subprocess
+    import sys
+    import tempfile
+    with tempfile.NamedTemporaryFile(suffix='.l3b', delete=False) as log:
+        pass
+    write_binary_log(log.name, synthetic_records(0, args.drones, args.seed))
+    with open(log.name, 'ab') as f:
+        for start in range(0, args.rows, 1000000):  # a million rows at a time, the log may not fit in memory
+            records = synthetic_records(min(1000000, args.rows - start), args.drones, args.seed + start)
+            records['t_ns'] += start * (10 ** 9 // (args.drones * 10))
+            f.write(records.tobytes())
+    print('%d rows, %.0f MB binary log' % (args.rows, os.path.getsize(log.name) / 2 ** 20))
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        for mode in ('memory', 'stream'):
+            output = subprocess.run([sys.executable, '-c', STREAM_SCRIPT, mode, log.name, str(args.duration)],
+                                    cwd=cwd, capture_output=True, text=True, check=True).stdout
+            opened, memory, peak, fps, misses, prefetched = map(float, output.split()[-6:])
+            print('%-6s opened in %6.3f s, private memory %7.1f MB after opening, %7.1f MB peak while playing at 50x '
+                  'with seeks, '
+                  '%5.1f fps%s' % (mode, opened, memory, peak, fps, ', %d chunks read ahead, %d waited for'
+                                   % (prefetched, misses) if mode == 'stream' else ''))
+    finally:
+        os.remove(log.name)
+
+
+def loop_stats(records):
+    """
+    :return: inter-arrival gaps, dropout seconds and largest speed of every address, computed line by line in Python
+             the way a notebook would
+    """
+    stats = {}
+    for row in records.tolist():
+        addr, x, y, z, beacons, t = row[2], row[7], row[8], row[9], row[14], row[-1] / 1e9
+        s = stats.setdefault(addr, {'last': None, 'gaps': [], 'dropout': 0.0, 'speed': 0.0})
+        if s['last'] is not None:
+            t0, x0, y0, z0, beacons0 = s['last']
+            s['gaps'].append(t - t0)
+            if beacons0 != 15:
+                s['dropout'] += t - t0
+            if t > t0:
+                s['speed'] = max(s['speed'], ((x - x0) ** 2 + (y - y0) ** 2 + (z - z0) ** 2) ** 0.5 / (t - t0))
+        s['last'] = (t, x, y, z, beacons)
+    return stats
+
+
+def bench_analyze(args):
+    """
+    Per-address statistics of a set of logs: one log line by line in Python, then every log with analyze.py in this
+    process and with a pool of worker processes
+    """
+    import shutil
+    import tempfile
+    import analyze
+    import lps_log
+    directory = tempfile.mkdtemp()
+    paths = []
+    for i in range(args.logs):
+        records = synthetic_records(args.rows, args.drones, args.seed + i)
+        records['beacons'][::7] = 11  # a beacon missing now and then
+        path = os.path.join(directory, 'log%d%s' % (i, '.txt' if args.text else lps_log.binary_logger.EXTENSION))
+        if args.text:
+            with open(path, 'w') as f:
+                f.write(lps_log.format_lines(records.tolist(), 0))
+        else:
+            write_binary_log(path, records)
+        paths.append(path)
+    total = args.logs * args.rows
+    print('%d %s logs of %d lines, %d drones' % (args.logs, 'text' if args.text else 'binary', args.rows, args.drones))
+    try:
+        elapsed = timeit(lambda: loop_stats(lps_log.load(paths[0], cache=False)[1]))
+        print('%-24s %8.3f s per log, %10.0f lines/s' % ('python loop (3 stats)', elapsed, args.rows / elapsed))
+        for jobs in sorted({1, args.jobs or os.cpu_count()}):
+            elapsed = timeit(lambda: analyze.analyze(paths, jobs, curve_step=analyze.CURVE_STEP))
+            print('%-24s %8.3f s per log, %10.0f lines/s' % ('analyze, %d process%s' % (jobs, 'es' if jobs > 1 else ''),
+                                                             elapsed / args.logs, total / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_convert(args):
+    """
+    Conversion of a set of text logs with convert.py into every format available, in this process and with a pool of
+    worker processes: compression ratio and throughput
+    """
+    import importlib.util
+    import shutil
+    import tempfile
+    import convert
+    import lps_log
+    directory = tempfile.mkdtemp()
+    paths = []
+    for i in range(args.logs):
+        paths.append(os.path.join(directory, 'log%d.txt' % i))
+        with open(paths[-1], 'w') as f:
+            f.write(lps_log.format_lines(synthetic_records(args.rows, args.drones, args.seed + i).tolist(), 0))
+    size = sum(os.path.getsize(path) for path in paths)
+    print('%d text logs of %d lines, %.1f MB' % (args.logs, args.rows, size / 2 ** 20))
+    formats = [name for name in convert.FORMATS if name != 'parquet' or importlib.util.find_spec('pyarrow')]
+    try:
+        for output_format in formats:
+            for jobs in sorted({1, args.jobs or os.cpu_count()}):
+                output = os.path.join(directory, '%s-%d' % (output_format, jobs))
+                start = time.perf_counter()
+                results = convert.convert(paths, output_format, output, jobs=jobs)
+                elapsed = time.perf_counter() - start
+                converted = sum(result['output_bytes'] for result in results)
+                print('%-8s %2d process%-2s %6.1f MB/s, %9.0f rows/s, %5.1f MB, %4.1fx smaller'
+                      % (output_format, jobs, 'es' if jobs > 1 else '', size / 2 ** 20 / elapsed,
+                         args.logs * args.rows / elapsed, converted / 2 ** 20, size / converted))
+        if 'parquet' not in formats:
+            print('parquet  skipped, pyarrow is not installed')
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_export(args):
+    """
+    Export a synthetic log offscreen into PNG frames with one and several encoding threads, and into a video when
+    ffmpeg is installed: frames per second and how many times faster than real time
+    """
+    import shutil
+    import tempfile
+    from panda3d.core import loadPrcFileData
+    loadPrcFileData('', 'window-type offscreen\naudio-library-name null\nsync-video false\nwin-size %d %d'
+                    % tuple(args.size))
+    import numpy as np
+    import lps_export
+    import player
+    rows = int(args.drones * 10 * args.duration) + args.drones
+    directory = tempfile.mkdtemp()
+    log = os.path.join(directory, 'log.l3b')
+    write_binary_log(log, synthetic_records(rows, args.drones, args.seed))
+    try:
+        app = player.LogPlayer(log, trailLength=args.trail, smooth=args.smooth)
+        frame = np.random.default_rng(args.seed).integers(0, 2, (args.size[1], args.size[0], 4), dtype=np.uint8) * 255
+        frame[:, :args.size[0] * 3 // 4] = 0  # mostly black, as rendered frames are
+        print('%d drones, %gs of log at %g fps, %dx%d: PNG encoding %.1f ms per frame on one thread'
+              % (args.drones, args.duration, args.fps, args.size[0], args.size[1],
+                 timeit(lambda: lps_export.encode_png(frame)) * 1000))
+        outputs = [('png, 1 thread', os.path.join(directory, 'png1'), 1)]
+        jobs = args.jobs or os.cpu_count()
+        if jobs > 1:
+            outputs.append(('png, %d threads' % jobs, os.path.join(directory, 'png%d' % jobs), jobs))
+        if shutil.which('ffmpeg'):
+            outputs.append(('ffmpeg mp4', os.path.join(directory, 'video.mp4'), None))
+        for name, path, threads in outputs:
+            start = time.perf_counter()
+            frames = app.export(path, args.fps, 0.0, args.duration, threads)
+            elapsed = time.perf_counter() - start
+            print('%-16s %6.1f frames/s, %5.1fx real time' % (name, frames / elapsed, frames / elapsed / args.fps))
+        if not shutil.which('ffmpeg'):
+            print('ffmpeg mp4       skipped, ffmpeg is not installed')
+    finally:
+        shutil.rmtree(directory)
+
+
+def timeit(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_ingest(args):
+    frames = frames_from_logs(args.log or sorted(glob.glob('logs/*.txt')))[:args.packets]
+    print('%d packets per mode, %.0f ms apart, %.1f s idle window' % (len(frames), args.interval * 1000, args.idle))
+    import tty
+    for mode in args.modes:
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        nav = gs_lps.us_nav(serial_port=os.ttyname(slave), mode='blocking' if mode == 'async' else mode)
+        received = threading.Event()
+        arrivals = []
+        push = nav.queue.push
+
+        def timed_push(record):
+            arrivals.append(time.perf_counter_ns())
+            push(record)
+            received.set()
+        nav.queue.push = timed_push
+
+        if mode == 'async':
+            loop = asyncio.new_event_loop()
+            reader = threading.Thread(target=loop.run_until_complete, args=(nav.run_async(),))
+            reader.start()
+        else:
+            nav.start()
+        time.sleep(0.3)  # let reader settle
+
+        cpu, wall = time.process_time(), time.perf_counter()
+        time.sleep(args.idle)
+        idle = (time.process_time() - cpu) / (time.perf_counter() - wall) * 100
+
+        latencies = []
+        for frame in frames:
+            received.clear()
+            sent = time.perf_counter_ns()
+            os.write(master, frame)
+            if received.wait(1.0):
+                latencies.append((arrivals[-1] - sent) / 1e3)
+            time.sleep(args.interval)
+
+        nav.stop()
+        if mode == 'async':
+            reader.join()
+            loop.close()
+        os.close(master)
+        os.close(slave)
+        latencies.sort()
+        if latencies:
+            print('%-9s idle CPU %6.2f%%  latency median %7.1f us  p99 %7.1f us  max %7.1f us  (%d/%d received)'
+                  % (mode, idle, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1],
+                     latencies[-1], len(latencies), len(frames)))
+        else:
+            print('%-9s idle CPU %6.2f%%  no packets received' % (mode, idle))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    benchmarks = parser.add_subparsers(dest='benchmark', required=True)
+
+    scanner = benchmarks.add_parser('scanner', help='frame extraction throughput in packets per second')
+    scanner.add_argument('--log', nargs='+', help='text logs to rebuild byte stream from (default: logs/*.txt)')
+    scanner.add_argument('--capture', nargs='+', help='raw byte stream captures to use instead of logs')
+    scanner.add_argument('--chunk', type=int, default=64, help='size of a single serial read, bytes')
+    scanner.add_argument('--corrupt', type=float, default=0.0, help='probability of a byte to be corrupted')
+    scanner.add_argument('--seed', type=int, default=0)
+    scanner.add_argument('--repeat', type=int, default=3)
+    scanner.set_defaults(func=bench_scanner)
+
+    decode = benchmarks.add_parser('decode', help='telemetry decoding throughput, packet by packet and as a batch')
+    decode.add_argument('--log', nargs='+', help='text logs to rebuild packets from (default: logs/*.txt)')
+    decode.add_argument('--repeat', type=int, default=3)
+    decode.set_defaults(func=bench_decode)
+
+    ingest = benchmarks.add_parser('ingest', help='idle CPU and per-packet latency of serial reader modes over a pty')
+    ingest.add_argument('--modes', nargs='+', default=['poll', 'blocking', 'select', 'async'],
+                        choices=['poll', 'blocking', 'select', 'async'])
+    ingest.add_argument('--log', nargs='+', help='text logs to rebuild packets from (default: logs/*.txt)')
+    ingest.add_argument('--packets', type=int, default=200, help='amount of packets to measure latency with')
+    ingest.add_argument('--interval', type=float, default=0.005, help='pause between packets, seconds')
+    ingest.add_argument('--idle', type=float, default=3.0, help='idle CPU measurement window, seconds')
+    ingest.set_defaults(func=bench_ingest)
+
+    swarm = benchmarks.add_parser('swarm', help='how many drones and packets per second ingest and live view sustain')
+    swarm.add_argument('--drones', type=int, nargs='+', default=[10, 25, 50, 100, 250])
+    swarm.add_argument('--rate', type=float, default=10.0, help='telemetry rate of each drone, Hz')
+    swarm.add_argument('--pattern', default='circle')
+    swarm.add_argument('--duration', type=float, default=10.0, help='simulated flight time, seconds')
+    swarm.add_argument('--corrupt', type=float, default=0.0, help='probability of a frame to be corrupted')
+    swarm.add_argument('--chunk', type=int, default=256, help='size of a single serial read, bytes')
+    swarm.add_argument('--queue', type=int, default=4096, help='telemetry queue size')
+    swarm.add_argument('--seed', type=int, default=0)
+    swarm.add_argument('--render', type=int, nargs='*', metavar='DRONES',
+                       help='also run the live view offscreen in real time with given swarm sizes')
+    swarm.add_argument('--fps', type=float, help='limit frame rate of the live view, like vsync does')
+    swarm.add_argument('--labels', action='store_true', help='show debug labels in the live view')
+    swarm.add_argument('--label-rate', type=float, default=5.0, help='debug label text updates per second')
+    swarm.set_defaults(func=bench_swarm)
+
+    multiport = benchmarks.add_parser('multiport', help='merged throughput and deduplication of several adapters')
+    multiport.add_argument('--ports', type=int, nargs='+', default=[1, 2, 4])
+    multiport.add_argument('--drones', type=int, default=40)
+    multiport.add_argument('--overlap', type=int, default=4, help='amount of drones heard on every bus')
+    multiport.add_argument('--rate', type=float, default=10.0, help='telemetry rate of each drone, Hz')
+    multiport.add_argument('--pattern', default='circle')
+    multiport.add_argument('--duration', type=float, default=10.0, help='simulated flight time, seconds')
+    multiport.add_argument('--chunk', type=int, default=256, help='size of a single serial read, bytes')
+    multiport.add_argument('--queue', type=int, default=65536, help='telemetry queue size of each port')
+    multiport.add_argument('--dedup', type=float, default=0.05, help='deduplication window, seconds')
+    multiport.add_argument('--seed', type=int, default=1)
+    multiport.set_defaults(func=bench_multiport)
+
+    pubsub = benchmarks.add_parser('pubsub', help='reader overhead, fan-out latency and isolation from slow '
+                                                  'subscribers of lps_pubsub')
+    pubsub.add_argument('--transports', nargs='+', default=['udp', 'unix'], choices=['udp', 'unix'])
+    pubsub.add_argument('--subscribers', type=int, default=3)
+    pubsub.add_argument('--slow', type=int, default=1, help='amount of subscribers which never read')
+    pubsub.add_argument('--drones', type=int, default=50)
+    pubsub.add_argument('--rate', type=float, default=10.0, help='telemetry rate of each drone, Hz')
+    pubsub.add_argument('--duration', type=float, default=10.0, help='simulated flight time, seconds')
+    pubsub.add_argument('--chunk', type=int, default=64, help='size of a single serial read, bytes')
+    pubsub.add_argument('--realtime', type=float, default=5.0, help='real time run to measure latency, seconds')
+    pubsub.add_argument('--seed', type=int, default=0)
+    pubsub.set_defaults(func=bench_pubsub)
+
+    render = benchmarks.add_parser('render', help='frame time of per-node and instanced drone rendering')
+    render.add_argument('--drones', type=int, nargs='+', default=[30, 300, 3000])
+    render.add_argument('--frames', type=int, default=100, help='amount of frames to measure')
+    render.add_argument('--size', type=int, nargs=2, default=[800, 600], help='offscreen buffer size')
+    render.add_argument('--trail', type=int, default=0, metavar='LENGTH', help='also measure flight path trails of '
+                                                                               'given amount of points')
+    render.add_argument('--trail-decimation', type=int, default=1, help='frames per trail point')
+    render.add_argument('--seed', type=int, default=0)
+    render.set_defaults(func=bench_render)
+
+    smoothing = benchmarks.add_parser('smoothing', help='position error of drones drawn between packets and CPU '
+                                                        'time of motion smoothing')
+    smoothing.add_argument('--drones', type=int, default=50)
+    smoothing.add_argument('--rate', type=float, default=10.0, help='telemetry rate of each drone, Hz')
+    smoothing.add_argument('--pattern', default='circle', choices=('circle', 'figure8'))
+    smoothing.add_argument('--noise', type=float, default=0.0, help='position noise of packets, mm')
+    smoothing.add_argument('--duration', type=float, default=30.0, help='seconds of flight')
+    smoothing.add_argument('--fps', type=float, default=60.0, help='frame rate of the view')
+    smoothing.add_argument('--swarm', type=int, nargs='+', default=[100, 1000], help='swarm sizes to time')
+    smoothing.add_argument('--frames', type=int, default=1000, help='frames to time')
+    smoothing.add_argument('--seed', type=int, default=0)
+    smoothing.set_defaults(func=bench_smoothing)
+
+    logger = benchmarks.add_parser('logger', help='CPU time per record of text and binary loggers')
+    logger.add_argument('--records', type=int, default=200000)
+    logger.add_argument('--drones', type=int, default=50)
+    logger.add_argument('--batch', type=int, default=50, help='records logged at once, one frame worth')
+    logger.add_argument('--seed', type=int, default=0)
+    logger.set_defaults(func=bench_logger)
+
+    recorder = benchmarks.add_parser('recorder', help='CPU and memory footprint of the headless recorder')
+    recorder.add_argument('--drones', type=int, default=50)
+    recorder.add_argument('--rate', type=float, default=10.0, help='telemetry rate of each drone, Hz')
+    recorder.add_argument('--duration', type=float, default=30.0, help='seconds to record')
+    recorder.add_argument('--log-format', default='binary', choices=('binary', 'text'))
+    recorder.add_argument('--mode', default='blocking', choices=gs_lps.us_nav.MODES, help='serial reader mode')
+    recorder.add_argument('--seed', type=int, default=0)
+    recorder.set_defaults(func=bench_recorder)
+
+    startup = benchmarks.add_parser('startup', help='time to the first frame of live view and player, cold and warm '
+                                                    'model cache')
+    startup.add_argument('--runs', type=int, default=3, help='amount of runs of each program and cache state')
+    startup.add_argument('--drones', type=int, default=30, help='amount of drones in the played log')
+    startup.add_argument('--duration', type=float, default=60.0, help='length of the played log, seconds')
+    startup.add_argument('--seed', type=int, default=0)
+    startup.set_defaults(func=bench_startup)
+
+    logload = benchmarks.add_parser('logload', help='time and memory of opening a log in the player')
+    logload.add_argument('--rows', type=int, default=1000000)
+    logload.add_argument('--drones', type=int, default=50)
+    logload.add_argument('--seed', type=int, default=0)
+    logload.set_defaults(func=bench_logload)
+
+    playback = benchmarks.add_parser('playback', help='whether the player keeps up with the log at several speeds')
+    playback.add_argument('--drones', type=int, default=50)
+    playback.add_argument('--speed', type=float, nargs='+', default=[1.0, 10.0, 50.0])
+    playback.add_argument('--duration', type=float, default=10.0, help='seconds to play at each speed')
+    playback.add_argument('--trail', type=int, default=0, metavar='LENGTH', help='trail points, no trails if 0')
+    playback.add_argument('--smooth', action='store_true', help='move drones between log lines')
+    playback.add_argument('--seed', type=int, default=0)
+    playback.set_defaults(func=bench_playback)
+
+    stream = benchmarks.add_parser('stream', help='open time and memory of the player for a large log, in memory '
+                                                  'and memory-mapped')
+    stream.add_argument('--rows', type=int, default=10000000)
+    stream.add_argument('--drones', type=int, default=50)
+    stream.add_argument('--duration', type=float, default=10.0, help='seconds to play')
+    stream.add_argument('--seed', type=int, default=0)
+    stream.set_defaults(func=bench_stream)
+
+    analysis = benchmarks.add_parser('analyze', help='throughput of per-address log statistics, in a Python loop and '
+                                                     'with analyze.py')
+    analysis.add_argument('--logs', type=int, default=8)
+    analysis.add_argument('--rows', type=int, default=500000)
+    analysis.add_argument('--drones', type=int, default=20)
+    analysis.add_argument('--text', action='store_true', help='text logs instead of binary ones')
+    analysis.add_argument('--jobs', type=int, help='worker processes (default: all CPUs)')
+    analysis.add_argument('--seed', type=int, default=0)
+    analysis.set_defaults(func=bench_analyze)
+
+    conversion = benchmarks.add_parser('convert', help='compression ratio and throughput of text log conversion')
+    conversion.add_argument('--logs', type=int, default=4)
+    conversion.add_argument('--rows', type=int, default=500000)
+    conversion.add_argument('--drones', type=int, default=20)
+    conversion.add_argument('--jobs', type=int, help='worker processes (default: all CPUs)')
+    conversion.add_argument('--seed', type=int, default=0)
+    conversion.set_defaults(func=bench_convert)
+
+    export = benchmarks.add_parser('export', help='headless export of a log into frames or a video compared to real '
+                                                  'time')
+    export.add_argument('--drones', type=int, default=20)
+    export.add_argument('--duration', type=float, default=30.0, help='seconds of log to export')
+    export.add_argument('--fps', type=float, default=30.0)
+    export.add_argument('--size', type=int, nargs=2, default=[1280, 720])
+    export.add_argument('--trail', type=int, default=32, help='trail points, 0 for no trails')
+    export.add_argument('--smooth', action='store_true', help='move drones between log lines')
+    export.add_argument('--jobs', type=int, help='encoding threads (default: all CPUs)')
+    export.add_argument('--seed', type=int, default=0)
+    export.set_defaults(func=bench_export)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Converts text logs (main.py F1, lps_log.text_logger) into columnar formats that load without parsing text:
+    l3b - binary log of lps_log (see its description), played by player.py and read by analyze.py like any other log.
+          Text logs keep time since the start of the session, so start_ns of the header is 0 and t_ns is that time in
+          nanoseconds; start_time is taken from the date and time in the log name (e.g. 29-03-2023_17-53), 0 if none
+    npz - NumPy archive, compressed, of one array per column of a text log line
+    parquet - Parquet file of the same columns, needs pyarrow
+Columns of npz and Parquet are the ones of a text log line in the same order, lps_log.TEXT_COLUMNS: time in seconds
+since the start of the session, then the fields of us_nav.get_telemetry, typed as in lps_log.LOG_DTYPE. Lines other
+than telemetry, e.g. the ones of extended log, are skipped and counted.
+Logs are converted by a pool of processes, one log per task. Every converted file is read back and its amount of rows
+checked against the log, a mismatch is reported as an error. Logs whose converted files are newer than them are
+skipped unless --force is given.
+Run 'python convert.py --help' to see options
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import lps_log
+
+FORMATS = ('l3b', 'npz', 'parquet')
+EXTENSIONS = {'l3b': lps_log.binary_logger.EXTENSION, 'npz': '.npz', 'parquet': '.parquet'}
+NAME_TIME = re.compile(r'\d\d-\d\d-\d{4}_\d\d-\d\d(-\d\d)?')  # date and time in names of logs
+READ_SIZE = 1 << 20  # bytes read at once to count lines
+
+
+def start_time(path):
+    """
+    :param path: log filename
+    :return: time.time() of the date and time in the log name, local time, 0.0 if there's none
+    """
+    found = NAME_TIME.search(os.path.basename(path))
+    if found is None:
+        return 0.0
+    return datetime.strptime(found.group(), '%d-%m-%Y_%H-%M-%S' if found.group(1) else '%d-%m-%Y_%H-%M').timestamp()
+
+
+def count_lines(path):
+    """
+    :return: amount of lines of a text file
+    """
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            lines += data.count(b'\n')
+            last = data[-1:]
+    return lines + (last != b'\n')  # last line without a line break
+
+
+def columns(records):
+    """
+    :param records: LOG_DTYPE records of a text log
+    :return: dictionary of lps_log.TEXT_COLUMNS arrays, in order
+    """
+    table = {'time': records['t_ns'] / 1e9}
+    for name in lps_log.TEXT_COLUMNS[1:]:
+        table[name] = records[name]
+    return table
+
+
+def write(records, path, output_format, start):
+    """
+    :param records: LOG_DTYPE records of a text log
+    :param path: converted filename
+    :param output_format: one of FORMATS
+    :param start: time.time() the session was started at
+    """
+    temporary = path + '.tmp'  # a half-written file is never taken for a converted log
+    if output_format == 'l3b':
+        with open(temporary, 'wb') as f:
+            f.write(lps_log.HEADER.pack(lps_log.MAGIC, lps_log.VERSION, lps_log.LOG_DTYPE.itemsize, 0, 0, start))
+            f.write(records.tobytes())
+    elif output_format == 'npz':
+        with open(temporary, 'wb') as f:
+            np.savez_compressed(f, **columns(records))
+    else:
+        import pyarrow
+        import pyarrow.parquet
+        table = pyarrow.table(columns(records))
+        table = table.replace_schema_metadata({'start_time': repr(start)})
+        pyarrow.parquet.write_table(table, temporary, compression='zstd')
+    os.replace(temporary, path)
+
+
+def count_rows(path, output_format):
+    """
+    :return: amount of rows of a converted file, read from the file
+    """
+    if output_format == 'l3b':
+        return len(lps_log.read(path)[1])
+    if output_format == 'npz':
+        with np.load(path) as archive:
+            return len(archive['time'])
+    import pyarrow.parquet
+    return pyarrow.parquet.read_metadata(path).num_rows
+
+
+def convert_file(path, output_format='l3b', directory=None, force=False):
+    """
+    Task of a worker process
+    :param path: text log filename
+    :param output_format: one of FORMATS
+    :param directory: directory converted files are written to, the one of the log if None
+    :param force: whether to convert a log with an up-to-date converted file
+    :return: dictionary of the converted filename, rows, skipped lines, input and output bytes and seconds spent,
+             rows is None if the log was skipped
+    """
+    started = time.perf_counter()
+    name = os.path.splitext(os.path.basename(path))[0] + EXTENSIONS[output_format]
+    output = os.path.join(directory if directory is not None else os.path.dirname(path), name)
+    result = {'path': path, 'output': output, 'input_bytes': os.path.getsize(path), 'rows': None}
+    if not force and os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(path):
+        result.update(output_bytes=os.path.getsize(output), skipped=0, seconds=0.0)
+        return result
+    records = lps_log.read_text(path)
+    lines = count_lines(path)
+    write(records, output, output_format, start_time(path))
+    rows = count_rows(output, output_format)
+    if rows != len(records):
+        raise ValueError('%s: %d rows written, %d read back from %s' % (path, len(records), rows, output))
+    result.update(rows=rows, skipped=lines - rows, output_bytes=os.path.getsize(output),
+                  seconds=time.perf_counter() - started)
+    return result
+
+
+def convert(paths, output_format='l3b', directory=None, force=False, jobs=None):
+    """
+    :param paths: text log filenames
+    :param jobs: amount of worker processes, all CPUs if None, 1 to convert in this process
+    :return: list of convert_file results in order of paths
+    """
+    if output_format == 'parquet':
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet output needs pyarrow: pip install pyarrow') from None
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    options = (output_format, directory, force)
+    if jobs == 1 or len(paths) < 2:
+        return [convert_file(path, *options) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(convert_file, paths, *[[option] * len(paths) for option in options]))
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='Convert text Locus telemetry logs into columnar formats')
+    parser.add_argument('paths', nargs='+', help='text log files and directories of them')
+    parser.add_argument('--format', default='l3b', choices=FORMATS, help='l3b is the binary log of lps_log, parquet '
+                                                                         'needs pyarrow')
+    parser.add_argument('--directory', help='directory to write converted files to (default: next to the logs)')
+    parser.add_argument('--force', action='store_true', help='convert logs whose converted files are up to date')
+    parser.add_argument('--jobs', type=int, help='worker processes (default: all CPUs)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parseArgs()
+    logs = lps_log.find_logs(args.paths, [lps_log.text_logger.EXTENSION])
+    if not logs:
+        sys.exit('no text logs found')
+    started = time.perf_counter()
+    try:
+        results = convert(logs, args.format, args.directory, args.force, args.jobs)
+    except ImportError as e:
+        sys.exit(str(e))
+    elapsed = time.perf_counter() - started
+    converted = [result for result in results if result['rows'] is not None]
+    for result in results:
+        if result['rows'] is None:
+            print('%s: up to date' % result['output'])
+        else:
+            print('%s: %d rows, %d lines skipped, %.1f MB -> %.1f MB (%.1fx) in %.2f s' % (
+                result['output'], result['rows'], result['skipped'], result['input_bytes'] / 2 ** 20,
+                result['output_bytes'] / 2 ** 20, result['input_bytes'] / max(result['output_bytes'], 1),
+                result['seconds']))
+    if not converted:
+        sys.exit(0)
+    input_bytes = sum(result['input_bytes'] for result in converted)
+    output_bytes = sum(result['output_bytes'] for result in converted)
+    rows = sum(result['rows'] for result in converted)
+    print('%d of %d logs converted in %.2f s: %d rows, %.1f MB -> %.1f MB (%.1fx), %.1f MB/s, %.0f rows/s' % (
+        len(converted), len(results), elapsed, rows, input_bytes / 2 ** 20, output_bytes / 2 ** 20,
+        input_bytes / max(output_bytes, 1), input_bytes / 2 ** 20 / elapsed, rows / elapsed))
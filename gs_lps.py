@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import os
 import time
+import bisect
+import heapq
+import select
+import asyncio
 import serial
+import numpy as np
 import struct
-from threading import Thread
+from collections import deque, namedtuple
+from threading import Thread, Lock, current_thread
 import math
 from random import randint
 
@@ -46,6 +53,13 @@ class crc8(object):
                 0x74, 0x2A, 0xC8, 0x96, 0x15, 0x4B, 0xA9, 0xF7,
                 0xB6, 0xE8, 0x0A, 0x54, 0xD7, 0x89, 0x6B, 0x35]
 
+    # crcPositionTable[d][b] is crc contribution of byte b followed by d more bytes of the message
+    crcPositionTable = np.empty((260, 256), dtype=np.uint8)
+    crcPositionTable[0] = crcTable
+    for _d in range(1, 260):
+        crcPositionTable[_d] = crcPositionTable[0][crcPositionTable[_d - 1]]
+    del _d
+
     def crc8(self, data_bytes):
         """
         CRC8 received packet data integrity check using predefined cyclic redundancy check table
@@ -57,12 +71,492 @@ class crc8(object):
             crc = self.crcTable[crc ^ byte]
         return crc
 
+    def crc8_many(self, messages):
+        """
+        Vectorised CRC8 of many messages of the same length. CRC8 is linear, so crc of a message is XOR of crcs of each
+        of its bytes alone, and contribution of a byte depends only on its value and its distance to the message end.
+        These contributions are looked up in crcPositionTable all at once instead of walking the bytes one by one
+        :param messages: numpy uint8 array, one message per row
+        :return: numpy uint8 array of crcs
+        """
+        length = messages.shape[1]
+        rows = np.arange(length - 1, -1, -1, dtype=np.intp) * 256  # distance to the message end of each column
+        return np.bitwise_xor.reduce(self.crcPositionTable.ravel().take(rows + messages), axis=1)
+
+
+class frame_scanner(object):
+    """
+    Bulk Locus frame extractor. Received chunks are appended to an internal buffer, start bytes are searched for with
+    bytearray.find instead of walking every byte, and CRC is validated over the whole frame at once. Frame layout is
+    0xFE, size, addr, event, payload (size bytes), crc8 of everything between the start byte and the crc itself.
+    A serial read returns a few bytes at a time, so until the buffered frame can be complete feed() only appends: the
+    buffer length needed is known from the size byte, and nothing is scanned or checked before it's reached
+    """
+    BATCH_BYTES = 512  # amount of buffered bytes from which frames are walked first and checked afterwards
+    BATCH = 16  # amount of frames from which vectorised CRC check beats checking them one by one
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.crcTable = crc8.crcTable
+        self.crc8_many = crc8().crc8_many
+        self.frames = 0  # amount of frames passed CRC check
+        self.crc_errors = 0  # amount of frames failed CRC check
+        self.resyncs = 0  # amount of times garbage bytes were skipped to find the next start byte
+        self.skipped = 0  # total amount of garbage bytes skipped
+        self.synced = True  # whether the last bytes scanned were a valid frame
+        self.trailing = []  # amount of bytes received after the end of each frame returned by the last feed
+        self.needed = 0  # buffer length the buffered frame is complete at, nothing to scan before that
+
+    def feed(self, data):
+        """
+        Append received bytes and extract every complete frame found so far. Incomplete frame tail stays buffered until
+        the next call. After a CRC error scanning resumes right after the false start byte, so a real frame hidden
+        inside the rejected one is not lost
+        :param data: bytes of received data
+        :return: list of frames (bytes without trailing crc, the same slice us_nav.parse_packet expects)
+        """
+        buf = self.buffer
+        buf += data
+        length = len(buf)
+        if length < self.needed:  # frame isn't received completely yet
+            self.trailing = []
+            return []
+        self.trailing = trailing = []
+        if length < self.BATCH_BYTES:
+            frames, pos = self._scan(buf, trailing)
+        else:
+            frames, pos = self._scan_batch(buf, trailing)
+        del buf[:pos]
+        # Scanning stops at the start byte of a frame not received completely yet, or consumes the whole buffer
+        if len(buf) > 1 and buf[0] == 0xFE:
+            self.needed = buf[1] + 5  # start and size bytes, addr, event, payload and crc
+        else:
+            self.needed = len(buf) + 1
+        self.frames += len(frames)
+        return frames
+
+    def _scan(self, buf, trailing):
+        """
+        Extract frames checking them one by one, cheaper when only a few frames are buffered
+        :param buf: buffer to scan
+        :param trailing: list to append amount of buffer bytes after each extracted frame to
+        :return: tuple of frames list and amount of buffer bytes consumed
+        """
+        table = self.crcTable
+        frames = []
+        pos = 0
+        length = len(buf)
+        while pos < length:
+            if buf[pos] == 0xFE:  # frames usually follow each other, no need to search
+                start = pos
+            else:
+                start = buf.find(0xFE, pos)
+                if start < 0:
+                    start = length
+                self._lost(start - pos)
+                pos = start
+                if start == length:
+                    break
+            if start + 1 >= length:  # size byte not received yet
+                break
+            end = start + buf[start + 1] + 4  # crc byte position
+            if end >= length:  # frame not received completely yet
+                break
+            crc = 0
+            for byte in buf[start + 1:end + 1]:  # crc of a message followed by its own crc byte is zero
+                crc = table[crc ^ byte]
+            if crc:
+                self.crc_errors += 1
+                pos = start + 1
+            else:
+                frames.append(bytes(buf[start:end]))
+                pos = end + 1
+                trailing.append(length - pos)
+                self.synced = True
+        return frames, pos
+
+    def _scan_batch(self, buf, trailing):
+        """
+        Extract frames walking their headers first as if every start byte found was a real frame, then checking all of
+        them at once. After a CRC error headers are walked again only until the walk lands on an already known frame
+        :param buf: buffer to scan
+        :param trailing: list to append amount of buffer bytes after each extracted frame to
+        :return: tuple of frames list and amount of buffer bytes consumed
+        """
+        frames = []
+        length = len(buf)
+        spans, tail, _ = self._walk(buf, 0, [], 0)
+        passed = dict(zip([span[0] for span in spans], self._check(buf, spans)))
+        pos = 0
+        i = 0
+        while i < len(spans):
+            start, end = spans[i]
+            if start != pos:
+                self._lost(start - pos)
+            if passed[start]:
+                frames.append(bytes(buf[start:end]))
+                pos = end + 1
+                trailing.append(length - pos)
+                self.synced = True
+                i += 1
+                continue
+            self.crc_errors += 1
+            pos = start + 1
+            walked, stop, resumed = self._walk(buf, pos, spans, i + 1)
+            unchecked = [span for span in walked if span[0] not in passed]
+            passed.update(zip([span[0] for span in unchecked], self._check(buf, unchecked)))
+            if resumed:
+                spans[i + 1:resumed] = walked
+            else:
+                spans[i + 1:] = walked
+                tail = stop
+            i += 1
+        if tail != pos:
+            self._lost(tail - pos)
+        return frames, tail
+
+    def _lost(self, amount):
+        """
+        Account bytes skipped while looking for the next frame. Resync is counted once per run of skipped bytes, no
+        matter how many received chunks it is spread across
+        :param amount: amount of skipped bytes
+        """
+        self.skipped += amount
+        if self.synced:
+            self.synced = False
+            self.resyncs += 1
+
+    @staticmethod
+    def _walk(buf, pos, known, lo):
+        """
+        Walk frame headers starting from the given position
+        :param buf: buffer to walk
+        :param pos: position to start from
+        :param known: list of already walked (start, crc byte position) tuples, walk stops when it lands on one of them
+        :param lo: index of the first of known frames located after the given position
+        :return: tuple of (start, crc byte position) list, position walk stopped at and index of the known frame walk
+                 landed on (0 if it did not)
+        """
+        spans = []
+        length = len(buf)
+        last = known[-1][0] if len(known) > lo else -1
+        while True:
+            start = buf.find(0xFE, pos)
+            if start < 0:
+                return spans, length, 0
+            if start <= last:
+                j = bisect.bisect_left(known, (start,), lo)
+                if known[j][0] == start:
+                    return spans, start, j
+            if start + 1 >= length:  # size byte not received yet
+                return spans, start, 0
+            end = start + buf[start + 1] + 4  # crc byte position
+            if end >= length:  # frame not received completely yet
+                return spans, start, 0
+            spans.append((start, end))
+            pos = end + 1
+
+    def _check(self, buf, spans):
+        """
+        Validate CRC of frame candidates. Crc of a message followed by its own crc byte is zero, so the whole span from
+        size byte up to the crc byte is checked without comparing anything
+        :param buf: buffer frames lie in
+        :param spans: list of (start, crc byte position) tuples
+        :return: list of flags whether each candidate passed CRC check
+        """
+        if len(spans) < self.BATCH:
+            table = self.crcTable
+            passed = []
+            for start, end in spans:
+                crc = 0
+                for byte in buf[start + 1:end + 1]:
+                    crc = table[crc ^ byte]
+                passed.append(not crc)
+            return passed
+        passed = [False] * len(spans)
+        groups = {}  # frames of equal length are checked together
+        for i, (start, end) in enumerate(spans):
+            groups.setdefault(end - start, []).append(i)
+        for length, indexes in groups.items():
+            messages = b''.join([buf[spans[i][0] + 1:spans[i][1] + 1] for i in indexes])
+            crcs = self.crc8_many(np.frombuffer(messages, dtype=np.uint8).reshape(len(indexes), length))
+            for i, crc in zip(indexes, crcs.tolist()):
+                passed[i] = not crc
+        return passed
+
+    def reset(self):
+        """
+        Drop buffered incomplete data, e.g. after the port was flushed or reopened
+        """
+        self.buffer.clear()
+        self.needed = 0
+
+
+def build_frame(addr, event, payload):
+    """
+    Build Locus frame the way the hardware sends it, mainly to replay or simulate byte streams
+    :param addr: dynamic address of Locus object
+    :param event: event (packet type) id
+    :param payload: packet payload bytes
+    :return: bytes of the frame including start byte and crc
+    """
+    frame = bytearray((0xFE, len(payload), addr, event))
+    frame += payload
+    frame.append(crc8().crc8(frame[1:]))
+    return bytes(frame)
+
+
+EV_TELEMETRY = 0x02
+EV_SYS_STATUS = 0x08
+EV_INFO = 0x18
+EV_RAW_ACCEL = 0x1D
+EV_STRENGTH = 0x33
+EVENT_NAMES = {EV_TELEMETRY: 'telemetry', EV_SYS_STATUS: 'sys_status', EV_INFO: 'info', EV_RAW_ACCEL: 'raw_accel',
+               EV_STRENGTH: 'strength'}
+
+"""
+TELEMETRY_PACKET structure: uint8_t start B
+                            uint8_t size B
+                            uint8_t addr B
+                            uint8_t event B
+                            uint32_t orientations I
+                            int32_t pos[3] 3i
+                            int16_t vel[3] 3h
+                            uint16_t voltage H
+                            uint8_t beacons B
+                            uint8_t status B
+                            uint8_t posError B
+                            NUL byte x
+"""
+TELEMETRY_PACKET = struct.Struct('<BBBBI3i3hHBBBx')
+SYS_STATUS_PACKET = struct.Struct('<HBBII')
+"""
+INFO_PACKET structure: uint16_t hwId H
+                       uint16_t fwType H
+                       uint16_t fwVersion H
+                       uint8_t protoMinor B
+                       uint8_t protoMajor B
+                       uint32_t commit I
+                       uint16_t commitCount H
+"""
+INFO_PACKET = struct.Struct('<HHHBBIH')
+"""
+RAW_ACCEL_PACKET structure: int16_t accel[3] 3h
+"""
+RAW_ACCEL_PACKET = struct.Struct('<3h')
+STRENGTH_PACKET = struct.Struct('<hhhh')
+ANGLE_SCALE = 360 / 2 ** 11
+
+# Orientation is packed into 11 bits of roll, 10 bits of pitch and 11 bits of yaw. Every possible value is converted to
+# radians and rounded once here instead of on every packet
+ROLL_TABLE = [round((i * math.pi / 1024), 3) for i in range(2 ** 11)]  # * ANGLE_SCALE
+PITCH_TABLE = [round((i * math.pi / 1024), 3) for i in range(2 ** 10)]  # * ANGLE_SCALE
+YAW_TABLE = [round((i * math.pi / 102), 3) for i in range(2 ** 11)]  # * ANGLE_SCALE
+
+# TELEMETRY_PACKET as numpy dtype to decode many packets at once
+TELEMETRY_RAW_DTYPE = np.dtype([('start', 'u1'), ('size', 'u1'), ('addr', 'u1'), ('event', 'u1'),
+                                ('orientation', '<u4'), ('x', '<i4'), ('y', '<i4'), ('z', '<i4'),
+                                ('vX', '<i2'), ('vY', '<i2'), ('vZ', '<i2'), ('voltage', '<u2'),
+                                ('beacons', 'u1'), ('status', 'u1'), ('pos_error', 'u1'), ('pad', 'V1')])
+# Decoded telemetry, the same fields and units as telemetry records have
+TELEMETRY_DTYPE = np.dtype([('start', 'u1'), ('size', 'u1'), ('addr', 'u1'), ('event', 'u1'),
+                            ('roll', 'f8'), ('pitch', 'f8'), ('yaw', 'f8'), ('x', 'f8'), ('y', 'f8'), ('z', 'f8'),
+                            ('vX', 'i2'), ('vY', 'i2'), ('vZ', 'i2'), ('voltage', 'f8'),
+                            ('beacons', 'u1'), ('status', 'u1'), ('pos_error', 'u1')])
+_ROLL_ARRAY = np.array(ROLL_TABLE)
+_PITCH_ARRAY = np.array(PITCH_TABLE)
+_YAW_ARRAY = np.array(YAW_TABLE)
+
+
+def decode_telemetry_batch(frames):
+    """
+    Decode many telemetry frames at once, e.g. a burst received in one read or frames of a whole raw capture
+    :param frames: list of telemetry frames (bytes without trailing crc, as frame_scanner returns them). Frames shorter
+                   than TELEMETRY_PACKET or of other events must be filtered out beforehand
+    :return: numpy structured array of TELEMETRY_DTYPE, one row per frame
+    """
+    size = TELEMETRY_PACKET.size
+    raw = np.frombuffer(b''.join([frame[:size] for frame in frames]), dtype=TELEMETRY_RAW_DTYPE)
+    decoded = np.empty(len(raw), dtype=TELEMETRY_DTYPE)
+    for name in ('start', 'size', 'addr', 'event', 'vX', 'vY', 'vZ', 'beacons', 'status', 'pos_error'):
+        decoded[name] = raw[name]
+    orientation = raw['orientation']
+    decoded['roll'] = _ROLL_ARRAY[orientation & 0b11111111111]
+    decoded['pitch'] = _PITCH_ARRAY[orientation >> 11 & 0b1111111111]
+    decoded['yaw'] = _YAW_ARRAY[orientation >> 21 & 0b11111111111]
+    for name in ('x', 'y', 'z', 'voltage'):
+        decoded[name] = raw[name] / 1000.0
+    return decoded
+
+
+def encode_telemetry(record, size=30):
+    """
+    Build telemetry frame from a record, inverse of us_nav telemetry decoding. Used to simulate and replay byte streams
+    :param record: telemetry record (or any sequence of the same fields in the same units)
+    :param size: payload size written into the frame header, Locus pads telemetry payload to 30 bytes
+    :return: bytes of the frame including start byte and crc
+    """
+    start, _, addr, event, roll, pitch, yaw, x, y, z, vx, vy, vz, voltage, beacons, status, pos_error = record[:17]
+    orientation = (round(roll * 1024 / math.pi) & 0b11111111111) | \
+        (round(pitch * 1024 / math.pi) & 0b1111111111) << 11 | (round(yaw * 102 / math.pi) & 0b11111111111) << 21
+    packet = TELEMETRY_PACKET.pack(start, size, addr, event, orientation, round(x * 1000), round(y * 1000),
+                                   round(z * 1000), vx, vy, vz, round(voltage * 1000), beacons, status, pos_error)
+    return build_frame(addr, event, packet[4:].ljust(size, b'\x00'))
+
+
+"""
+Decoded telemetry packet, fields and units are the same as us_nav.get_telemetry returns: angles in radians, position in
+meters, voltage in volts. t_ns is the receive time, time.monotonic_ns() of the moment the last byte of the frame arrived
+"""
+telemetry = namedtuple('telemetry', ['start', 'size', 'addr', 'event', 'roll', 'pitch', 'yaw', 'x', 'y', 'z',
+                                     'vX', 'vY', 'vZ', 'voltage', 'beacons', 'status', 'pos_error', 't_ns'],
+                       defaults=[0])
+
+
+class telemetry_queue(object):
+    """
+    Bounded thread-safe ring buffer of decoded telemetry records. Reader thread pushes records as soon as they are
+    decoded, consumer drains everything that arrived since its previous call at once. When the buffer is full the
+    oldest record is overwritten and counted as dropped
+    """
+    def __init__(self, size=4096, latest=True):
+        """
+        :param size: maximum amount of records kept until they are drained
+        :param latest: whether to keep the last record of each address for get_latest
+        """
+        self._lock = Lock()
+        self._records = deque(maxlen=size)
+        self._latest = {} if latest else None
+        self.pushed = 0  # amount of records pushed since creation
+        self.dropped = 0  # amount of records overwritten before being drained
+        self.dropped_by_addr = {}  # amount of dropped records of each address
+
+    def push(self, record):
+        """
+        Add record to the buffer, overwriting the oldest one if the buffer is full
+        :param record: telemetry record
+        """
+        with self._lock:
+            if len(self._records) == self._records.maxlen:
+                addr = self._records[0].addr
+                self.dropped += 1
+                self.dropped_by_addr[addr] = self.dropped_by_addr.get(addr, 0) + 1
+            self._records.append(record)
+            self.pushed += 1
+            if self._latest is not None:
+                self._latest[record.addr] = record
+
+    def drain(self):
+        """
+        Take every record pushed since the previous drain
+        :return: list of records in arrival order
+        """
+        with self._lock:
+            records = list(self._records)
+            self._records.clear()
+        return records
+
+    def get_latest(self):
+        """
+        :return: dictionary of the last record received from each address (empty if latest view is disabled)
+        """
+        with self._lock:
+            return dict(self._latest) if self._latest is not None else {}
+
+    def __len__(self):
+        return len(self._records)
+
+
+class latency_histogram(object):
+    """
+    Histogram of latencies with power of two buckets: bucket i counts latencies of less than 2**i microseconds and at
+    least 2**(i - 1). Adding a latency is a few integer operations, so it stays on in production
+    """
+    BUCKETS = 32  # up to 2**31 us, about 36 minutes
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.total = 0
+        self.max_us = 0
+
+    def add_records(self, records, now_ns=None):
+        """
+        Count latency of every record from its receive time till now
+        :param records: sequence of telemetry records
+        :param now_ns: time.monotonic_ns() of consumption, current time if None
+        """
+        if not records:
+            return
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        counts, last = self.counts, self.BUCKETS - 1
+        worst = 0
+        for record in records:
+            us = (now_ns - record.t_ns) // 1000
+            if us > worst:
+                worst = us
+            counts[min(us.bit_length(), last) if us > 0 else 0] += 1
+        self.total += len(records)
+        if worst > self.max_us:
+            self.max_us = worst
+
+    def merge(self, other):
+        """
+        :param other: latency_histogram to add counts of
+        """
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, p):
+        """
+        :param p: percentile, 0..100
+        :return: upper bound of the bucket the percentile falls into, microseconds, 0 if nothing was counted
+        """
+        rank = self.total * p / 100.0
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(1 << i, self.max_us)
+        return 0
+
+    def to_dict(self):
+        return {'count': self.total, 'p50_us': self.percentile(50), 'p90_us': self.percentile(90),
+                'p99_us': self.percentile(99), 'max_us': self.max_us,
+                'buckets_us': {1 << i: count for i, count in enumerate(self.counts) if count}}
+
 
 class us_nav(Thread):
-    def __init__(self, serial_port="/dev/ttyUSB0", debug=False):
+    """
+    Locus RS-485 reader thread. Reader modes:
+        'blocking' - blocking reads with timeout, thread sleeps in the kernel until bytes arrive (default)
+        'select' - select() on the port file descriptor, then everything available is read at once (POSIX only)
+        'poll' - busy polling of inWaiting, lowest latency at the cost of a whole CPU core
+    Besides start(), the same ingestion can be run as an asyncio coroutine with run_async()
+    """
+    MODES = ('blocking', 'select', 'poll')
+    READ_TIMEOUT = 0.1  # seconds blocking read or select waits before checking whether the thread should stop
+
+    def __init__(self, serial_port="/dev/ttyUSB0", debug=False, queue_size=4096, mode='blocking', ser=None):
+        """
+        :param serial_port: name of RS-485 adapter port
+        :param debug: generate random positions instead of reading the port
+        :param queue_size: maximum amount of telemetry records kept until they are drained
+        :param mode: reader mode, one of MODES
+        :param ser: already created serial-like object to read from instead of serial_port, e.g. lps_sim.memory_port
+        """
         Thread.__init__(self)
+        if mode not in self.MODES:
+            raise ValueError("unknown reader mode: " + str(mode))
+        if mode == 'select' and os.name != 'posix':
+            mode = 'blocking'  # select doesn't work with serial ports on Windows
         self.debug = debug
-        if not self.debug:
+        self.mode = mode
+        self.queue = telemetry_queue(queue_size)  # decoded telemetry records waiting to be drained by the consumer
+        if ser is not None:
+            self.ser = ser
+        elif not self.debug:
             # Initialize serial connection through RS-485 using given port and other parameters
             self.ser = serial.Serial()
             self.ser.port = serial_port
@@ -70,50 +564,35 @@ class us_nav(Thread):
             self.ser.parity = serial.PARITY_NONE
             self.ser.stopbits = serial.STOPBITS_ONE
             self.ser.bytesize = serial.EIGHTBITS
+        if not self.debug and self.mode != 'poll':
+            self.ser.timeout = self.READ_TIMEOUT
 
         self._run = True
-        self.idx = 0
-        self.size = 0
-        self.buffer = bytearray(260)
-        self.crc8 = crc8().crc8
-
-        """
-        __TELEMETRY_PACKET structure: uint8_t start B
-                                      uint8_t size B
-                                      uint8_t addr B
-                                      uint8_t event B
-                                      uint32_t orientations I
-                                      int32_t pos[3] 3i
-                                      int16_t vel[3] 3h
-                                      uint16_t voltage H
-                                      uint8_t beacons B
-                                      uint8_t status B
-                                      uint8_t posError B
-                                      NUL byte x
-        """
-        self.__TELEMETRY_PACKET = '<BBBBI3i3hHBBBx'
-        self.__SYS_STATUS_PACKET = '<HBBII'
-        """
-        __INFO_PACKET structure:uint16_t hwId H
-                                uint16_t fwType H
-                                uint16_t fwVersion H
-                                uint8_t protoMinor B
-                                uint8_t protoMajor B
-                                uint32_t commit I
-                                uint16_t commitCount H
-        """
-        self.__INFO_PACKET = '<HHHBBIH'
-        """
-        __RAW_ACCEL_PACKET structure: int16_t accel[3] 3h
-        """
-        self.__RAW_ACCEL_PACKET = '<3h'
-        self.__STRENGTH_PACKET = '<hhhh'
-        self.__EV_TELEMETRY = 0x02
-        self.__EV_SYS_STATUS = 0x08
-        self.__EV_INFO = 0x18
-        self.__EV_RAW_ACCEL = 0x1D
-        self.__EV_STRENGTH = 0x33
-        self.__ANGLE_SCALE = 360 / 2 ** 11
+        self._loop = None  # event loop run_async is running in
+        self.scanner = frame_scanner()
+        self.crc_errors = 0
+        self.t_ns = 0  # receive time of the frame being parsed, time.monotonic_ns()
+        # Time a byte takes on the wire, to tell when each frame of a read was completed. Bytes of in-memory streams
+        # arrive all at once
+        baudrate = getattr(self.ser, 'baudrate', None) if not self.debug else None
+        self.byte_ns = 10 * 10**9 // baudrate if baudrate else 0
+
+        self.decoders = {}  # event id -> (packet layout, payload offset, exact packet length or None, handler)
+        self.register_decoder(EV_TELEMETRY, TELEMETRY_PACKET, self._on_telemetry, offset=0)
+        self.register_decoder(EV_SYS_STATUS, SYS_STATUS_PACKET, self._on_sys_status, exact=True)
+        self.register_decoder(EV_INFO, INFO_PACKET, self._on_info)
+        self.register_decoder(EV_RAW_ACCEL, RAW_ACCEL_PACKET, self._on_raw_accel)
+        self.register_decoder(EV_STRENGTH, STRENGTH_PACKET, self._on_strength, exact=True)
+        self.bad_length = 0  # amount of packets dropped because they were too short for their layout
+        self.listeners = []  # callables receiving every list of telemetry records as soon as it is decoded
+
+        # Metrics, see get_metrics
+        self.bytes_received = 0
+        self.event_counts = [0] * 256  # amount of frames received of each event id
+        self.parse_ns = 0  # time spent extracting and decoding frames
+        self.latency = latency_histogram()  # time from receive to drain of telemetry records
+        self._metrics_last = None  # time and counters of the previous get_metrics call
+        self.batch_size = 16  # amount of telemetry frames in one read from which they are decoded as a batch
 
         self.tel_received = False
         self.h_start = None
@@ -145,7 +624,7 @@ class us_nav(Thread):
         self.rawAccel = None
 
         self.levels = None
-        if not self.debug:
+        if not self.debug and not self.ser.is_open:
             try:
                 self.ser.open()
             except Exception as e:
@@ -156,35 +635,22 @@ class us_nav(Thread):
         if not self.debug:
             self.ser.flushInput()
             self.ser.flushOutput()
+            self.scanner.reset()
+            fd = self.ser.fileno() if self.mode == 'select' else None
             while self._run:
                 try:
-                    data_len = self.ser.inWaiting()
-                    if data_len > 0:
-                        data = self.ser.read(data_len)
-                        i = 0
-                        while i < data_len:
-                            if self.idx == 0:
-                                if data[i] == 0xFE:
-                                    self.idx += 1
-                                i += 1
-                            elif self.idx == 1:
-                                self.buffer[self.idx] = data[i]
-                                self.size = data[i] + 4
-                                i += 1
-                                self.idx += 1
-                            elif self.idx < self.size:
-                                block_len = min(self.size - self.idx, data_len - i)
-                                self.buffer[self.idx: self.idx+block_len] = data[i: i+block_len]
-                                self.idx += block_len
-                                i += block_len
-                            else:
-                                if data[i] == self.crc8(self.buffer[1:self.size]):
-                                    self.parse_packet(self.buffer[:self.size])
-                                else:
-                                    crc_packet = self.buffer[:self.size]
-                                    print("crc error: id %d, size %d" % (crc_packet[3], self.size))
-                                self.idx = 0
-                                i += 1
+                    if self.mode == 'blocking':
+                        # Sleep until at least one byte arrives, then take everything already received along with it
+                        data = self.ser.read(self.ser.inWaiting() or 1)
+                    elif self.mode == 'select':
+                        if not select.select([fd], [], [], self.READ_TIMEOUT)[0]:
+                            continue
+                        data = self.ser.read(self.ser.inWaiting() or 1)
+                    else:
+                        data_len = self.ser.inWaiting()
+                        data = self.ser.read(data_len) if data_len > 0 else None
+                    if data:
+                        self._ingest(data)
 
                 except Exception as e:
                     print("Error occurred:" + str(e))
@@ -193,6 +659,69 @@ class us_nav(Thread):
                 self.parse_packet(None)
                 time.sleep(0.1)
 
+    async def run_async(self):
+        """
+        Asyncio variant of run: port file descriptor is watched by the running event loop, which calls the reader
+        whenever bytes arrive, so no thread is needed (POSIX only). Use it instead of start(), e.g. as a task next to
+        other coroutines. Returns after stop() is called, the port is closed on return
+        """
+        loop = asyncio.get_running_loop()
+        self._stopped = loop.create_future()
+        self._loop = loop
+        self.ser.timeout = 0  # reader is only called when bytes are available, so reads must never block the loop
+        self.ser.flushInput()
+        self.ser.flushOutput()
+        self.scanner.reset()
+
+        def on_readable():
+            try:
+                data = self.ser.read(self.ser.inWaiting() or 1)
+                if data:
+                    self._ingest(data)
+            except Exception as e:
+                print("Error occurred:" + str(e))
+
+        fd = self.ser.fileno()
+        loop.add_reader(fd, on_readable)
+        try:
+            if self._run:
+                await self._stopped
+        finally:
+            loop.remove_reader(fd)
+            self._loop = None
+            self.ser.close()
+
+    def _ingest(self, data):
+        """
+        Extract frames from received bytes and parse them
+        :param data: bytes of received data
+        """
+        t_read = time.monotonic_ns()
+        self.bytes_received += len(data)
+        packets = self.scanner.feed(data)
+        # The read returns right after its last byte arrived, every frame was completed as many byte times earlier as
+        # many bytes were received after it
+        byte_ns = self.byte_ns
+        stamps = [t_read - trailing * byte_ns for trailing in self.scanner.trailing] if byte_ns else \
+            [t_read] * len(packets)
+        if len(packets) >= self.batch_size:
+            size = TELEMETRY_PACKET.size
+            batch = [i for i, packet in enumerate(packets) if packet[3] == EV_TELEMETRY and len(packet) >= size]
+            if len(batch) >= self.batch_size and self.decoders[EV_TELEMETRY][3] == self._on_telemetry:
+                self.event_counts[EV_TELEMETRY] += len(batch)
+                self._on_telemetry_batch([packets[i] for i in batch], [stamps[i] for i in batch])
+                # Everything else, short telemetry frames included, goes through parse_packet and is counted there
+                batched = set(batch)
+                rest = [i for i in range(len(packets)) if i not in batched]
+                packets, stamps = [packets[i] for i in rest], [stamps[i] for i in rest]
+        for packet, t_ns in zip(packets, stamps):
+            self.t_ns = t_ns
+            self.parse_packet(packet)
+        if self.scanner.crc_errors != self.crc_errors:
+            print("crc error: %d frames total" % self.scanner.crc_errors)
+            self.crc_errors = self.scanner.crc_errors
+        self.parse_ns += time.monotonic_ns() - t_read
+
     def parse_packet(self, packet):
         if packet is None:
             self.x = randint(0, 105) * 100
@@ -204,32 +733,129 @@ class us_nav(Thread):
             self.levels = [randint(2, 2500), randint(2, 2500), 300, 1000]
             self.beacons = 0b1010
             return
-        if packet[3] == self.__EV_TELEMETRY:  # '<BBBBI3i3hHBBBx', no packet length check?
-            # print(''.join('{:02x}'.format(x) for x in packet))
-            self.tel_received = True
-            self.h_start, self.h_size, self.h_addr, self.h_event, orientation, self.x, self.y, self.z, self.vX, \
-                self.vY, self.vZ, self.voltage, self.beacons, self.status, \
-                self.pos_error = struct.unpack_from(self.__TELEMETRY_PACKET, packet, 0)
-            # print("addr {}: ".format(self.h_addr), len(packet))
-            self.roll = round(((orientation & 0b11111111111) * math.pi / 1024), 3)  # * self.__ANGLE_SCALE #11 bit
-            self.pitch = round(((orientation >> 11 & 0b1111111111) * math.pi / 1024), 3)  # * self.__ANGLE_SCALE #10 bit
-            self.yaw = round(((orientation >> 21 & 0b11111111111) * math.pi / 102), 3)  # * self.__ANGLE_SCALE #11 bit
-        elif packet[3] == self.__EV_SYS_STATUS and len(packet) == 16:
-            ident, cfg_status, log_status, logger_capacity, log_size = \
-                struct.unpack_from(self.__SYS_STATUS_PACKET, packet, 4)
-            # print(ident, cfg_status, log_status, logger_capacity, log_size)
-        elif packet[3] == self.__EV_INFO:  # '<HHH2BBBIH', no packet length check?
-            self.hwld, self.fwType, self.fwVersion, self.protoMinor, self.protoMajor, self.commit, \
-                self.commitCount = struct.unpack_from(self.__INFO_PACKET, packet, 4)
-        elif packet[3] == self.__EV_RAW_ACCEL:  # '<3h', no packet length check?
-            raw_a, raw_b, raw_c = struct.unpack_from(self.__RAW_ACCEL_PACKET, packet, 4)
-            self.rawAccel = (raw_a, raw_b, raw_c)
-        elif packet[3] == self.__EV_STRENGTH and len(packet) == 12:
-            level1, level2, level3, level4 = struct.unpack_from(self.__STRENGTH_PACKET, packet, 4)
-            self.levels = [level1, level2, level3, level4]
-        else:
+        self.event_counts[packet[3]] += 1
+        decoder = self.decoders.get(packet[3])
+        if decoder is None:
             # print('unknown packet... ' + str(hex(packet[3])))
-            pass
+            return
+        layout, offset, length, handler = decoder
+        if len(packet) < offset + layout.size or (length is not None and len(packet) != length):
+            self.bad_length += 1
+            return
+        handler(layout.unpack_from(packet, offset))
+
+    def register_decoder(self, event, layout, handler, offset=4, exact=False):
+        """
+        Assign packet handler to an event id. Packets too short for the layout are dropped before reaching the handler
+        :param event: event (packet type) id
+        :param layout: precompiled struct.Struct of the packet
+        :param handler: method to be called with the tuple of unpacked values
+        :param offset: offset of the layout within the packet, 4 to skip start, size, addr and event bytes
+        :param exact: whether packet length must match the layout exactly instead of being at least as long
+        """
+        self.decoders[event] = (layout, offset, offset + layout.size if exact else None, handler)
+
+    def _on_telemetry(self, values):
+        self._update_telemetry(values)
+        record = telemetry(*self.get_telemetry(), self.t_ns)
+        self.queue.push(record)
+        for listener in self.listeners:
+            listener((record,))
+
+    def _update_telemetry(self, values):
+        # print("addr {}: ".format(values[2]))
+        self.tel_received = True
+        self.h_start, self.h_size, self.h_addr, self.h_event, orientation, self.x, self.y, self.z, self.vX, \
+            self.vY, self.vZ, self.voltage, self.beacons, self.status, self.pos_error = values
+        self.roll = ROLL_TABLE[orientation & 0b11111111111]  # 11 bit
+        self.pitch = PITCH_TABLE[orientation >> 11 & 0b1111111111]  # 10 bit
+        self.yaw = YAW_TABLE[orientation >> 21 & 0b11111111111]  # 11 bit
+
+    def _on_telemetry_batch(self, frames, stamps):
+        """
+        Decode telemetry frames of a burst at once and push them as records, legacy attributes keep the last one
+        :param frames: list of telemetry frames
+        :param stamps: list of receive times of the frames, time.monotonic_ns()
+        """
+        records = [telemetry._make(record + (t_ns,))
+                   for record, t_ns in zip(decode_telemetry_batch(frames).tolist(), stamps)]
+        push = self.queue.push
+        for record in records:
+            push(record)
+        for listener in self.listeners:
+            listener(records)
+        self._update_telemetry(TELEMETRY_PACKET.unpack_from(frames[-1]))
+
+    def _on_sys_status(self, values):
+        ident, cfg_status, log_status, logger_capacity, log_size = values
+        # print(ident, cfg_status, log_status, logger_capacity, log_size)
+
+    def _on_info(self, values):
+        self.hwld, self.fwType, self.fwVersion, self.protoMinor, self.protoMajor, self.commit, \
+            self.commitCount = values
+
+    def _on_raw_accel(self, values):
+        self.rawAccel = values
+
+    def _on_strength(self, values):
+        self.levels = list(values)
+
+    def add_listener(self, listener):
+        """
+        Subscribe a callable to decoded telemetry besides the queue. It is called on the reader thread with a sequence
+        of records, so it has to return quickly and must never block
+        :param listener: callable taking a sequence of telemetry records
+        """
+        self.listeners.append(listener)
+
+    def drain(self):
+        """
+        Take every telemetry record decoded since the previous call, so no packet is lost between two frames
+        :return: list of telemetry records in arrival order
+        """
+        records = self.queue.drain()
+        self.latency.add_records(records)
+        return records
+
+    def get_latest(self):
+        """
+        :return: dictionary of the last telemetry record received from each address
+        """
+        return self.queue.get_latest()
+
+    def get_metrics(self):
+        """
+        Ingest counters since start and rates since the previous call. Counters are updated by the reader thread for
+        free, the snapshot is only assembled here
+        :return: dictionary of metrics, JSON serializable
+        """
+        now = time.monotonic()
+        frames = {name: self.event_counts[event] for event, name in EVENT_NAMES.items()}
+        frames['other'] = sum(self.event_counts) - sum(frames.values())
+        counters = (self.bytes_received, frames, self.parse_ns)
+        last_time, (last_bytes, last_frames, last_parse_ns) = self._metrics_last or (None, (0, {}, 0))
+        self._metrics_last = (now, counters)
+        elapsed = now - last_time if last_time is not None else None
+        ser = getattr(self, 'ser', None)  # there is no port in debug mode
+        return {
+            'port': getattr(ser, 'port', None),
+            'bytes': self.bytes_received,
+            'bytes_per_s': (self.bytes_received - last_bytes) / elapsed if elapsed else None,
+            'bus_load': (self.bytes_received - last_bytes) * 10 / self.ser.baudrate / elapsed
+            if elapsed and hasattr(ser, 'baudrate') else None,  # 10 bits on the wire per byte
+            'frames': frames,
+            'frames_per_s': {name: (count - last_frames.get(name, 0)) / elapsed for name, count in frames.items()}
+            if elapsed else None,
+            'parser_busy': (self.parse_ns - last_parse_ns) / 1e9 / elapsed if elapsed else None,
+            'crc_errors': self.scanner.crc_errors,
+            'resyncs': self.scanner.resyncs,
+            'skipped_bytes': self.scanner.skipped,
+            'bad_length': self.bad_length,
+            'pushed': self.queue.pushed,
+            'dropped': self.queue.dropped,
+            'dropped_by_addr': dict(self.queue.dropped_by_addr),
+            'latency': self.latency.to_dict(),
+        }
 
     def telemetry_received(self):
         if self.tel_received and self.h_addr is not None:
@@ -282,5 +908,110 @@ class us_nav(Thread):
 
     def stop(self):
         self._run = False
+        loop = self._loop
+        if loop is not None:  # run_async closes the port itself once the event loop gets to it
+            loop.call_soon_threadsafe(lambda: self._stopped.done() or self._stopped.set_result(None))
+            return
+        if self.is_alive() and current_thread() is not self:
+            self.join(self.READ_TIMEOUT * 5)  # let pending read return before the port is closed under it
         if not self.debug:
             self.ser.close()
+
+
+class us_nav_group(object):
+    """
+    Several RS-485 adapters read at once, each by its own us_nav thread, so total throughput grows with the amount of
+    buses instead of being capped by one 57600 baud line. Drained records of all ports are merged into one feed ordered
+    by receive time. A drone heard on two buses is delivered once: a record repeating one of the same address already
+    delivered from another port within dedup_window is counted as duplicate and dropped. Repeats from the same port
+    are kept, a hovering drone sends the same packet over and over
+    """
+    def __init__(self, serial_ports=("/dev/ttyUSB0",), dedup_window=0.05, navs=None, **kwargs):
+        """
+        :param serial_ports: names of RS-485 adapter ports
+        :param dedup_window: time two copies of the same packet may arrive apart on different buses, seconds
+        :param navs: already created us_nav readers to use instead of opening serial_ports, e.g. lps_sim.simulate ones
+        :param kwargs: other us_nav arguments (mode, queue_size...) applied to every port
+        """
+        self.navs = list(navs) if navs is not None else [us_nav(serial_port=port, **kwargs) for port in serial_ports]
+        self.ports = [getattr(nav.ser, 'port', str(i)) if not nav.debug else str(i) for i, nav in enumerate(self.navs)]
+        self.dedup_window = int(dedup_window * 1e9)
+        self._recent = {}  # addr -> deque of (t_ns, port index, fields) of records delivered within dedup_window
+        self._latest = {}
+        self.received = [0] * len(self.navs)  # amount of records drained from each port
+        self.duplicates = [0] * len(self.navs)  # amount of records of each port dropped as duplicates
+        self.addrs = [set() for _ in self.navs]  # addresses heard on each port
+        self.listeners = []  # callables receiving every list of merged telemetry records as soon as it is drained
+
+    def start(self):
+        for nav in self.navs:
+            nav.start()
+
+    def stop(self):
+        for nav in self.navs:
+            nav.stop()
+
+    def drain(self):
+        """
+        Take every telemetry record decoded by any port since the previous call
+        :return: list of telemetry records ordered by receive time, without duplicates
+        """
+        feeds = []
+        for i, nav in enumerate(self.navs):
+            records = nav.drain()
+            self.received[i] += len(records)
+            feeds.append([(record.t_ns, i, record) for record in records])
+        merged = []
+        recent, window, latest = self._recent, self.dedup_window, self._latest
+        for t_ns, i, record in heapq.merge(*feeds, key=lambda item: item[:2]):
+            addr, fields = record.addr, record[:-1]
+            self.addrs[i].add(addr)
+            seen = recent.get(addr)
+            if seen is None:
+                seen = recent[addr] = deque()
+            while seen and t_ns - seen[0][0] > window:
+                seen.popleft()
+            if any(port != i and other == fields for _, port, other in seen):
+                self.duplicates[i] += 1
+                continue
+            seen.append((t_ns, i, fields))
+            latest[addr] = record
+            merged.append(record)
+        if merged:
+            for listener in self.listeners:
+                listener(merged)
+        return merged
+
+    def add_listener(self, listener):
+        """
+        Subscribe a callable to the merged feed. Unlike us_nav.add_listener, it is called by drain on the thread
+        draining the group, with the records drain returns: ordered by receive time and without duplicates
+        :param listener: callable taking a sequence of telemetry records
+        """
+        self.listeners.append(listener)
+
+    def get_latest(self):
+        """
+        :return: dictionary of the last telemetry record delivered of each address
+        """
+        return dict(self._latest)
+
+    def get_stats(self):
+        """
+        :return: list of per-port statistics dictionaries
+        """
+        return [{'port': port, 'received': self.received[i], 'duplicates': self.duplicates[i],
+                 'dropped': nav.queue.dropped, 'crc_errors': nav.scanner.crc_errors, 'resyncs': nav.scanner.resyncs,
+                 'addrs': sorted(self.addrs[i])} for i, (port, nav) in enumerate(zip(self.ports, self.navs))]
+
+    def get_metrics(self):
+        """
+        :return: dictionary of metrics of every port (see us_nav.get_metrics) and of the merged feed, JSON serializable
+        """
+        latency = latency_histogram()
+        for nav in self.navs:
+            latency.merge(nav.latency)
+        ports = [nav.get_metrics() for nav in self.navs]
+        for metrics, received, duplicates in zip(ports, self.received, self.duplicates):
+            metrics['received'], metrics['duplicates'] = received, duplicates
+        return {'ports': ports, 'duplicates': sum(self.duplicates), 'latency': latency.to_dict()}
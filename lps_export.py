@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Frame writers of headless export: frames rendered into an offscreen buffer are handed over as arrays and encoded
+while the next ones are rendered, so rendering never waits for encoding unless encoding falls behind.
+    png_frames - numbered PNG files in a directory, compressed by a pool of threads: zlib releases the GIL, so frames
+                 are compressed on every core while the render thread goes on
+    ffmpeg_video - raw frames piped to ffmpeg, which encodes the video in its own process and threads
+Frames are arrays of height x width x 4 bytes, blue, green, red and alpha, with rows from the bottom up, as Panda3D
+keeps images in memory, so the render thread only copies them. Writers reorder them on their side of the pipeline
+"""
+import os
+import shutil
+import struct
+import subprocess
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi', '.webm')  # exported to a video with ffmpeg, to PNG frames otherwise
+PNG_LEVEL = 1  # zlib compression level of PNG frames, mostly black frames compress well at the fastest level
+QUEUED_FRAMES = 2  # frames queued per encoding thread before write() waits
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png(frame, level=PNG_LEVEL):
+    """
+    :param frame: height x width x 4 array of BGRA bytes, rows from the bottom up
+    :param level: zlib compression level
+    :return: PNG file contents
+    """
+    height, width = frame.shape[:2]
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)  # every row starts with filter type 0, none
+    rows[:, 1:].reshape(height, width, 3)[:] = frame[::-1, :, 2::-1]  # top row first, RGB
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)  # 8-bit RGB
+    return b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header) + _png_chunk(b'IDAT', zlib.compress(rows, level)) + \
+        _png_chunk(b'IEND', b'')
+
+
+def _write_png(path, frame, level):
+    data = encode_png(frame, level)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class png_frames(object):
+    """
+    Writes frame000000.png, frame000001.png... into a directory, e.g. for 'ffmpeg -i frame%06d.png' later
+    """
+    def __init__(self, directory, jobs=None, level=PNG_LEVEL):
+        """
+        :param directory: directory to write frames to, created if missing
+        :param jobs: amount of encoding threads, all CPUs if None
+        :param level: zlib compression level
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.level = level
+        jobs = jobs or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.pending = deque()  # frames being encoded, oldest first
+        self.queued = jobs * QUEUED_FRAMES
+        self.frames = 0  # amount of frames written
+
+    def write(self, frame):
+        """
+        :param frame: height x width x 4 array of BGRA bytes, rows from the bottom up, must not be changed afterwards
+        """
+        while len(self.pending) >= self.queued:
+            self.pending.popleft().result()  # waits for the oldest frame, raises its encoding error if any
+        path = os.path.join(self.directory, 'frame%06d.png' % self.frames)
+        self.pending.append(self.executor.submit(_write_png, path, frame, self.level))
+        self.frames += 1
+
+    def close(self):
+        """
+        Wait for every frame to be written
+        """
+        while self.pending:
+            self.pending.popleft().result()
+        self.executor.shutdown()
+
+
+class ffmpeg_video(object):
+    """
+    Pipes raw frames to ffmpeg, H.264 in yuv420p for .mp4, .mkv and .mov, ffmpeg defaults of the container otherwise
+    """
+    def __init__(self, path, size, fps, jobs=None):
+        """
+        :param path: video filename
+        :param size: (width, height) of frames
+        :param fps: frames per second of the video
+        :param jobs: amount of ffmpeg encoding threads, ffmpeg decides if None
+        """
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise FileNotFoundError('ffmpeg is not installed, export PNG frames into a directory instead')
+        command = [ffmpeg, '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'bgra', '-s', '%dx%d' % size,
+                   '-r', '%g' % fps, '-i', '-', '-vf', 'vflip,pad=ceil(iw/2)*2:ceil(ih/2)*2']
+        if path.lower().endswith(('.mp4', '.mkv', '.mov')):
+            command += ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p']
+        if jobs:
+            command += ['-threads', str(jobs)]
+        self.process = subprocess.Popen(command + [path], stdin=subprocess.PIPE)
+        self.frames = 0  # amount of frames written
+
+    def write(self, frame):
+        """
+        :param frame: height x width x 4 array of BGRA bytes, rows from the bottom up
+        """
+        self.process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))  # waits if ffmpeg falls behind
+        self.frames += 1
+
+    def close(self):
+        """
+        Wait for ffmpeg to encode every frame and finish the file
+        """
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError('ffmpeg failed with exit code %d' % self.process.returncode)
+
+
+def make_writer(path, size, fps, jobs=None):
+    """
+    :param path: video filename (one of VIDEO_EXTENSIONS) or directory of PNG frames
+    :param size: (width, height) of frames
+    :param fps: frames per second
+    :param jobs: amount of encoding threads, all CPUs if None
+    :return: ffmpeg_video or png_frames
+    """
+    if path.lower().endswith(VIDEO_EXTENSIONS):
+        return ffmpeg_video(path, size, fps, jobs)
+    return png_frames(path, jobs)
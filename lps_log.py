@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Telemetry loggers running on their own thread, so neither formatting nor disk writes stall the thread that receives or
+renders telemetry. log() only hands a list of records over, the logger thread encodes them and writes through a large
+buffered file, rotates files by size or age and flushes everything on close.
+    binary_logger - fixed-size records of LOG_DTYPE after a HEADER, '.l3b' files
+    text_logger - the text log format player.py has always read, '.txt' files
+
+Binary log file is HEADER.size bytes of header followed by records of LOG_DTYPE, all little-endian:
+    magic       8 bytes, b'LOCUS3D' and a zero byte
+    version     uint16, VERSION
+    record size uint16, LOG_DTYPE.itemsize
+    part        uint32, number of the file within a rotated session, 0 for the first one
+    start_ns    uint64, time.monotonic_ns() the file was started at, receive times are on the same clock
+    start_time  float64, time.time() of start_ns, to convert receive times to wall clock
+The first file of a session starts when the session does, a rotated one at the receive time of its earliest record
+(or when it was opened, if that's earlier), so every file plays from its own start. Each record has the fields and
+units of gs_lps.telemetry records: t_ns is the receive time stamped by the serial reader, so time of a record since the
+start of the file is (t_ns - start_ns) / 1e9 seconds. A file cut short by a crash is read up to its last complete
+record
+
+load() reads either format into the same LOG_DTYPE records. A text log is parsed once: its records are saved next to
+it as a NumPy file (log name + CACHE_EXTENSION) and loaded from there while the log is unchanged
+"""
+import atexit
+import itertools
+import os
+import queue
+import struct
+import time
+from datetime import datetime
+from threading import Thread
+import numpy as np
+
+MAGIC = b'LOCUS3D\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQd32x')  # 64 bytes, the rest is reserved
+LOG_DTYPE = np.dtype([('start', 'u1'), ('size', 'u1'), ('addr', 'u1'), ('event', 'u1'),
+                      ('roll', '<f8'), ('pitch', '<f8'), ('yaw', '<f8'), ('x', '<f8'), ('y', '<f8'), ('z', '<f8'),
+                      ('vX', '<i2'), ('vY', '<i2'), ('vZ', '<i2'), ('voltage', '<f8'),
+                      ('beacons', 'u1'), ('status', 'u1'), ('pos_error', 'u1'), ('t_ns', '<u8')])
+TEXT_COLUMNS = ('time',) + LOG_DTYPE.names[:-1]  # columns of text log lines
+CACHE_EXTENSION = '.npy'  # parsed text log saved next to it
+BUFFER_SIZE = 1 << 20  # bytes of file buffer
+MAX_BYTES = 256 << 20  # file size to rotate at
+FORMATS = ('binary', 'text')
+_ROTATE = []  # queued to rotate the file, told apart from lists of records by identity
+
+
+def format_lines(rows, start_ns):
+    """
+    :param rows: sequence of telemetry records or LOG_DTYPE rows as tuples (receive time is the last field)
+    :param start_ns: time.monotonic_ns() the session was started at
+    :return: text log lines: time since the start of the session, then telemetry fields
+    """
+    # [:-1] without receive time, [1:-1] without brackets
+    return ''.join(['%.4f, %s\n' % ((row[-1] - start_ns) / 1e9, str(tuple(row[:-1]))[1:-1]) for row in rows])
+
+
+def read_header(f):
+    """
+    :param f: binary log file opened for reading in binary mode
+    :return: dictionary of header fields
+    """
+    data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError("not a Locus 3D binary log: file is too short")
+    magic, version, record_size, part, start_ns, start_time = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("not a Locus 3D binary log")
+    if version != VERSION or record_size != LOG_DTYPE.itemsize:
+        raise ValueError("unsupported binary log version %d" % version)
+    return {'version': version, 'part': part, 'start_ns': start_ns, 'start_time': start_time}
+
+
+def read(path):
+    """
+    :param path: binary log filename
+    :return: tuple of header dictionary and numpy structured array of LOG_DTYPE records
+    """
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        count = (os.fstat(f.fileno()).st_size - HEADER.size) // LOG_DTYPE.itemsize
+        return header, np.fromfile(f, dtype=LOG_DTYPE, count=count)
+
+
+def read_text(path):
+    """
+    :param path: text log filename
+    :return: numpy structured array of LOG_DTYPE records, t_ns is the logged time since the start of the session. Lines
+             other than telemetry, e.g. the ones of extended log, are skipped
+    """
+    import pandas as pd
+    options = {'header': None, 'names': TEXT_COLUMNS, 'skipinitialspace': True, 'engine': 'c'}
+    try:
+        frame = pd.read_csv(path, dtype=np.float64, **options)
+    except ValueError:
+        # Not every line is telemetry: parse as text and drop lines that aren't numbers in every column
+        frame = pd.read_csv(path, dtype=str, on_bad_lines='skip', **options)
+        frame = frame.apply(pd.to_numeric, errors='coerce').dropna()
+    except pd.errors.EmptyDataError:
+        return np.zeros(0, dtype=LOG_DTYPE)
+    records = np.zeros(len(frame), dtype=LOG_DTYPE)
+    for name in TEXT_COLUMNS[1:]:
+        records[name] = frame[name].to_numpy()
+    records['t_ns'] = np.round(frame['time'].to_numpy() * 1e9)
+    return records
+
+
+def find_logs(paths, extensions=None):
+    """
+    :param paths: log filenames and directories to look for logs in, recursively
+    :param extensions: extensions of logs looked for in directories, text and binary ones if None
+    :return: sorted list of log filenames
+    """
+    if extensions is None:
+        extensions = (text_logger.EXTENSION, binary_logger.EXTENSION)
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for directory, _, names in os.walk(path):
+            found.extend(os.path.join(directory, name) for name in names if name.endswith(tuple(extensions)))
+    return sorted(found)
+
+
+def load(path, cache=True, mmap=False):
+    """
+    :param path: binary or text log filename
+    :param cache: whether to load a text log from its parsed copy, and to save one if it's missing or out of date
+    :param mmap: whether to memory-map records instead of reading them, only the pages used are read then. Text log is
+                 mapped through its parsed copy, so it's read into memory if the copy can't be saved
+    :return: tuple of start_ns and numpy structured array of LOG_DTYPE records, time of a record since the start of the
+             session is (t_ns - start_ns) / 1e9 seconds
+    """
+    if path.endswith(binary_logger.EXTENSION):
+        if not mmap:
+            header, records = read(path)
+            return header['start_ns'], records
+        with open(path, 'rb') as f:
+            header = read_header(f)
+            count = (os.fstat(f.fileno()).st_size - HEADER.size) // LOG_DTYPE.itemsize
+        if not count:
+            return header['start_ns'], np.zeros(0, dtype=LOG_DTYPE)  # empty file can't be mapped
+        return header['start_ns'], np.memmap(path, dtype=LOG_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+    cached = path + CACHE_EXTENSION
+    if cache and os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(path):
+        records = np.load(cached, mmap_mode='r' if mmap else None)
+        if records.dtype == LOG_DTYPE:
+            return 0, records
+    records = read_text(path)
+    if cache:
+        try:
+            with open(cached + '.tmp', 'wb') as f:  # a half-written copy is never loaded
+                np.save(f, records)
+            os.replace(cached + '.tmp', cached)
+        except OSError:
+            return 0, records  # read-only log directory, parsed every time
+        if mmap and len(records):
+            return 0, np.load(cached, mmap_mode='r')
+    return 0, records
+
+
+class telemetry_logger(Thread):
+    """
+    Base of the loggers: queue of record lists, writer thread, buffered files and rotation. Subclasses define the file
+    extension, header and encoding of records
+    """
+    EXTENSION = ''
+    READ_TIMEOUT = 0.25  # seconds the thread waits for records before checking whether the file is due to rotate
+
+    def __init__(self, directory='logs', name=None, max_bytes=MAX_BYTES, max_seconds=None, buffer_size=BUFFER_SIZE):
+        """
+        :param directory: directory log files are written to
+        :param name: filename without extension, date and time of the start (e.g. 29-03-2023_17-53) if None. Rotated
+                     files get _1, _2... suffixes
+        :param max_bytes: file size to start the next file at, never if None
+        :param max_seconds: file age to start the next file at, never if None
+        :param buffer_size: bytes of file buffer
+        """
+        Thread.__init__(self, daemon=True)
+        self.directory = directory
+        self.basename = name if name is not None else self._default_name(directory)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.buffer_size = buffer_size
+        self.start_ns = time.monotonic_ns()  # records received before are skipped
+        self.start_time = time.time()
+        self.part_start_ns = self.start_ns  # start of the file being written, see the module description
+        self.queue = queue.SimpleQueue()
+        self.paths = []  # files written, the last one is being written now
+        self.records = 0  # amount of records written
+        self.bytes = 0  # amount of bytes written
+        self._file = None
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        self._open()  # the first file exists as soon as logging is started
+        atexit.register(self.close)
+
+    def _default_name(self, directory):
+        """
+        :return: date and time of the start, e.g. 29-03-2023_17-53, with seconds (and a counter) added if a log of this
+                 minute exists already, so a log is never overwritten
+        """
+        now = datetime.now()
+        names = [now.strftime('%d-%m-%Y_%H-%M'), now.strftime('%d-%m-%Y_%H-%M-%S')]
+        for name in itertools.chain(names, (names[1] + '-%d' % n for n in itertools.count(2))):
+            if not os.path.exists(os.path.join(directory, name + self.EXTENSION)):
+                return name
+
+    @property
+    def path(self):
+        return self.paths[-1]
+
+    def log(self, records):
+        """
+        Hand records over to the logger thread, never blocks
+        :param records: list of telemetry records in arrival order, it must not be changed afterwards
+        """
+        if records:
+            self.queue.put(records)
+
+    def close(self):
+        """
+        Write everything logged so far, close the file and stop the thread. Safe to call more than once
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(None)
+        if self.is_alive():
+            self.join()
+        else:
+            self._drain()  # thread wasn't started, write from the calling thread
+        self._file.close()
+        atexit.unregister(self.close)
+
+    def rotate(self):
+        """
+        Start the next file once everything logged so far is written, e.g. to hand the finished file over to another
+        program while logging goes on
+        """
+        self.queue.put(_ROTATE)
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.READ_TIMEOUT)
+            except queue.Empty:
+                self._rotate_if_due()
+                continue
+            if not self._process(item):
+                break
+
+    def _drain(self):
+        try:
+            while self._process(self.queue.get_nowait()):
+                pass
+        except queue.Empty:
+            pass
+
+    def _process(self, item):
+        """
+        Write the item and everything queued after it at once
+        :return: False once the stop request is reached
+        """
+        batch = []
+        while True:
+            if item is None or item is _ROTATE:
+                self._write(batch)
+                batch = []
+                if item is None:
+                    return False
+                self._file.close()
+                self._open()
+            else:
+                batch.extend(item)
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self._write(batch)
+        return True
+
+    def _write(self, records):
+        start_ns = self.start_ns
+        records = [record for record in records if record[-1] >= start_ns]
+        if not records:
+            return
+        if not self._part_started:
+            self._start_part(records)
+        data = self._encode(records)
+        self._file.write(data)
+        self.records += len(records)
+        self.bytes += len(data)
+        self._size += len(data)
+        self._rotate_if_due()
+
+    def _rotate_if_due(self):
+        if self.max_bytes is not None and self._size >= self.max_bytes or \
+                self.max_seconds is not None and time.monotonic() - self._opened >= self.max_seconds:
+            self._file.close()
+            self._open()
+
+    def _open(self):
+        part = len(self.paths)
+        path = os.path.join(self.directory, self.basename + ('_%d' % part if part else '') + self.EXTENSION)
+        self._file = open(path, 'wb', buffering=self.buffer_size)
+        self.paths.append(path)
+        self._opened = time.monotonic()
+        self._size = 0
+        if part:
+            self.part_start_ns = time.monotonic_ns()  # until the first records are written
+        self._part_started = not part  # whether start of the file is final, the session start is for the first file
+        header = self._header(part)
+        self._file.write(header)
+        self._size += len(header)
+
+    def _start_part(self, records):
+        """
+        Move the start of a rotated file back to its earliest record, records queued before the rotation are written
+        into it too. Records written later are received later, but for milliseconds between ports
+        :param records: first records written into the file
+        """
+        self._part_started = True
+        earliest = min([record[-1] for record in records if record[0].__class__ is not str], default=None)
+        if earliest is None or earliest >= self.part_start_ns:
+            return
+        self.part_start_ns = earliest
+        header = self._header(len(self.paths) - 1)
+        if header:
+            self._file.seek(0)  # nothing but the header is written yet
+            self._file.write(header)
+
+    def _header(self, part):
+        return b''
+
+    def _encode(self, records):
+        raise NotImplementedError
+
+
+class binary_logger(telemetry_logger):
+    """
+    Writes records of LOG_DTYPE, see the module description for the file format
+    """
+    EXTENSION = '.l3b'
+
+    def _header(self, part):
+        start_time = self.start_time + (self.part_start_ns - self.start_ns) / 1e9
+        return HEADER.pack(MAGIC, VERSION, LOG_DTYPE.itemsize, part, self.part_start_ns, start_time)
+
+    def _encode(self, records):
+        return np.array(records, dtype=LOG_DTYPE).tobytes()
+
+
+class text_logger(telemetry_logger):
+    """
+    Writes text log lines: time since the start of the file, then telemetry fields, comma separated
+    """
+    EXTENSION = '.txt'
+
+    def log_text(self, line):
+        """
+        Write any other line into the log, e.g. str(lps.get_info()) of extended log
+        :param line: text without line break
+        """
+        self.queue.put([(line, self.start_ns)])  # passes receive time check, written as is
+
+    def _encode(self, records):
+        start_ns = self.part_start_ns
+        # The same lines format_lines makes, lines of log_text are written as they are
+        return ''.join([record[0] + '\n' if record[0].__class__ is str else
+                        '%.4f, %s\n' % ((record[-1] - start_ns) / 1e9, str(tuple(record[:-1]))[1:-1])
+                        for record in records]).encode()
+
+
+def make_logger(log_format='binary', **kwargs):
+    """
+    :param log_format: one of FORMATS
+    :param kwargs: telemetry_logger arguments
+    :return: started binary_logger or text_logger
+    """
+    if log_format not in FORMATS:
+        raise ValueError("unknown log format: " + str(log_format))
+    logger = binary_logger(**kwargs) if log_format == 'binary' else text_logger(**kwargs)
+    logger.start()
+    return logger
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Smooth drone motion between telemetry packets. Telemetry of a drone arrives a few times per second while the view is
+drawn at the display refresh rate, so instead of jumping from sample to sample a drone is drawn where its last sample
+and velocity put it at the time of the frame:
+    live view - dead reckoning, position is extrapolated with the velocity of the packet (vX, vY, vZ) for at most
+                MAX_EXTRAPOLATION seconds, and when the next packet disagrees with the extrapolation, the difference is
+                blended out during BLEND_TIME seconds instead of jumping
+    log player - interpolation, the next sample is known, so position moves along the segment between two samples
+Positions of all drones are computed at once with NumPy, once per frame
+"""
+import numpy as np
+
+MAX_EXTRAPOLATION = 0.5  # seconds a drone keeps moving after its last packet
+BLEND_TIME = 0.2  # seconds extrapolation error is blended out during
+
+
+class motion_smoother(object):
+    """
+    Last sample of every drone slot: time, position and velocity, plus correction being blended out. Slots are the ones
+    of the swarm in lps_render, times are seconds of any clock the caller uses consistently
+    """
+    def __init__(self, capacity=64, max_extrapolation=MAX_EXTRAPOLATION, blend_time=BLEND_TIME):
+        """
+        :param capacity: amount of slots to allocate, it is doubled whenever exceeded
+        :param max_extrapolation: seconds a drone keeps moving after its last sample
+        :param blend_time: seconds extrapolation error is blended out during, 0 to jump to every sample
+        """
+        self.max_extrapolation = max_extrapolation
+        self.blend_time = blend_time
+        self.count = 0
+        self.t = np.zeros(0)  # time of the last sample
+        self.pos = np.zeros((0, 3))  # position of the last sample, meters
+        self.vel = np.zeros((0, 3))  # velocity, m/s
+        self.horizon = np.zeros(0)  # seconds to move with the velocity after the sample
+        self.offset = np.zeros((0, 3))  # difference of drawn and sampled position at the time of the sample
+        self.valid = np.zeros(0, dtype=bool)  # whether the slot has a sample
+        self._allocate(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, capacity):
+        for name in ('t', 'pos', 'vel', 'horizon', 'offset', 'valid'):
+            old = getattr(self, name)
+            array = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            array[:self.count] = old[:self.count]
+            setattr(self, name, array)
+
+    def spawn(self):
+        """
+        Add a slot without a sample
+        :return: slot index
+        """
+        i = self.count
+        if i == len(self.t):
+            self._allocate(len(self.t) * 2)
+        self.count += 1
+        return i
+
+    def reset(self, i):
+        """
+        Forget the slot sample, e.g. once the drone disappears, so its next sample is drawn without blending
+        """
+        self.valid[i] = False
+
+    def update(self, i, t, pos, vel):
+        """
+        Dead reckoning: new sample of a drone, it is extrapolated with its velocity
+        :param i: slot index
+        :param t: time the sample was received
+        :param pos: (x, y, z) position, meters
+        :param vel: (vx, vy, vz) velocity, m/s
+        """
+        self._set(i, t, pos, vel, self.max_extrapolation)
+
+    def set_segment(self, i, t0, pos0, t1, pos1):
+        """
+        Interpolation: a drone moves from pos0 at t0 to pos1 at t1 and stays there
+        :param i: slot index
+        :param t0: time of the current sample
+        :param pos0: (x, y, z) position of the current sample, meters
+        :param t1: time of the next sample, t0 or earlier when there's none
+        :param pos1: (x, y, z) position of the next sample, meters
+        """
+        duration = t1 - t0
+        if duration > 0:
+            vel = ((pos1[0] - pos0[0]) / duration, (pos1[1] - pos0[1]) / duration, (pos1[2] - pos0[2]) / duration)
+        else:
+            vel, duration = (0.0, 0.0, 0.0), 0.0
+        self._set(i, t0, pos0, vel, duration)
+
+    def _set(self, i, t, pos, vel, horizon):
+        if self.valid[i] and self.blend_time > 0:
+            # Drawn position at the time of the new sample becomes the starting point of the blend
+            dt = min(max(t - self.t[i], 0.0), self.horizon[i])
+            weight = max(1.0 - (t - self.t[i]) / self.blend_time, 0.0)
+            self.offset[i] = self.pos[i] + self.vel[i] * dt + self.offset[i] * weight - pos
+        else:
+            self.offset[i] = 0.0
+        self.t[i] = t
+        self.pos[i] = pos
+        self.vel[i] = vel
+        self.horizon[i] = horizon
+        self.valid[i] = True
+
+    def positions(self, now):
+        """
+        :param now: time of the frame
+        :return: array of (x, y, z) rows of every slot to draw at the given time, slots without a sample are at 0, 0, 0
+        """
+        n = self.count
+        elapsed = now - self.t[:n]
+        dt = np.clip(elapsed, 0.0, self.horizon[:n])
+        positions = self.pos[:n] + self.vel[:n] * dt[:, None]
+        if self.blend_time > 0:
+            weight = np.clip(1.0 - elapsed / self.blend_time, 0.0, 1.0)
+            positions += self.offset[:n] * weight[:, None]
+        return positions
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Log sources of the player: lines of a log in time order, addressed by their index, with what batch playback and
+seeking need. Locus objects get slots in order of their first lines, the same slots drones, labels and trails of
+lps_render use.
+    memory_log - the whole log in memory with a seek index of keyframes, for logs that fit in memory
+    mapped_log - memory-mapped log read in chunks around the playback position, neighbouring chunks are read ahead by a
+                 background thread, so neither memory use nor open time grow with the log
+Times never go back while playing: a line is played once its time and the times before it have passed, so time of a
+line is the largest time logged up to it in both. Receive times of a log are almost always in order already.
+Both answer the same questions, every one about a few lines around the playback position, which is what lets the
+mapped log read only a window of the file:
+    search(t) - amount of lines played by the given time
+    lines(a, k) - slots and positions of lines a..k-1, played forward
+    last_lines(k) - last line of every slot before line k, to rebuild the scene after a seek
+    rows(lines), next_lines(k, slots), history(slot, k, count) - lines around the playback position
+"""
+import mmap
+import queue
+from collections import OrderedDict
+from threading import Lock, Thread
+import numpy as np
+
+KEYFRAME_LINES = 4096  # log lines between keyframes of the seek index
+CHUNK_LINES = 1 << 16  # log lines of a chunk mapped_log reads at once, about 5 MB of a binary log
+CACHED_CHUNKS = 5  # chunks mapped_log keeps: the current one, its neighbours and the ones just left
+
+
+class memory_log(object):
+    """
+    Typed columns of the whole log and a seek index: slot of every line, lines of every slot, and keyframes holding
+    the last line of every slot before every KEYFRAME_LINES lines. State at any line is rebuilt from the keyframe
+    before it and at most KEYFRAME_LINES lines after it
+    """
+    def __init__(self, times, addrs, positions, beacons, keyframe_lines=KEYFRAME_LINES):
+        """
+        :param times: seconds since the start of the log of every line
+        :param addrs: dynamic address of every line
+        :param positions: x, y, z coordinates of every line, array of 3 columns
+        :param beacons: beacon status bits of every line
+        :param keyframe_lines: lines between keyframes
+        """
+        self.positions = positions
+        self.beacons = beacons
+        self.keyframe_lines = keyframe_lines
+        # Times never go back while playing: a line is played once its time and the times before it have passed
+        self.times = np.maximum.accumulate(times) if len(times) else times
+        self.duration = float(self.times[-1]) if len(self.times) else 0.0
+        addr_num, first, inverse = np.unique(addrs, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty(len(addr_num), dtype=np.intp)
+        rank[order] = np.arange(len(addr_num))
+        self.slot_addrs = addr_num[order].tolist()  # addresses in order of their first lines
+        self.slots = rank[inverse.ravel()].astype(np.uint8)  # slot of every line, addresses are 8-bit
+        self.slot_lines = np.argsort(self.slots, kind='stable')  # lines of slot 0 in time order, then of slot 1...
+        self.slot_bounds = np.searchsorted(self.slots[self.slot_lines], np.arange(len(addr_num) + 1))
+        bounds = np.arange(0, len(times) + 1, keyframe_lines)
+        self.keyframes = np.full((len(bounds), len(addr_num)), -1, dtype=np.int64)
+        for i in range(len(addr_num)):
+            lines = self._lines_of(i)
+            before = np.searchsorted(lines, bounds) - 1  # index of the last line before every keyframe
+            self.keyframes[:, i] = np.where(before >= 0, lines[np.maximum(before, 0)], -1)
+
+    def __len__(self):
+        return len(self.times)
+
+    def _lines_of(self, slot):
+        return self.slot_lines[self.slot_bounds[slot]:self.slot_bounds[slot + 1]]
+
+    def close(self):
+        pass
+
+    def time(self, line):
+        return float(self.times[line])
+
+    def search(self, t):
+        """
+        :param t: seconds since the start of the log
+        :return: amount of lines played by the time
+        """
+        return int(np.searchsorted(self.times, t, 'right'))
+
+    def lines(self, a, k):
+        """
+        :return: slots and positions of lines a..k-1
+        """
+        return self.slots[a:k], self.positions[a:k]
+
+    def last_lines(self, k):
+        """
+        :return: last line of every slot before line k, -1 if none
+        """
+        n = k // self.keyframe_lines
+        last = self.keyframes[n].copy()
+        np.maximum.at(last, self.slots[n * self.keyframe_lines:k], np.arange(n * self.keyframe_lines, k))
+        return last
+
+    def rows(self, lines):
+        """
+        :param lines: array of line indices
+        :return: times, positions and beacon status bits of the lines
+        """
+        return self.times[lines], self.positions[lines], self.beacons[lines]
+
+    def next_lines(self, k, slots):
+        """
+        :return: first line of every given slot from line k on, -1 if none
+        """
+        return np.array([self._next_line(k, i) for i in slots], dtype=np.int64)
+
+    def _next_line(self, k, slot):
+        lines = self._lines_of(slot)
+        j = int(np.searchsorted(lines, k))
+        return int(lines[j]) if j < len(lines) else -1
+
+    def history(self, slot, k, count):
+        """
+        :return: positions of the last count lines of the slot before line k
+        """
+        lines = self._lines_of(slot)
+        end = int(np.searchsorted(lines, k))
+        return self.positions[lines[max(end - count, 0):end]]
+
+
+def _advise(records, advice):
+    # Memory map access advice, e.g. mmap.MADV_RANDOM for no read-ahead, when records are mapped and the OS takes it
+    mapping = getattr(records, 'base', None)
+    if isinstance(mapping, mmap.mmap) and hasattr(mapping, 'madvise') and advice is not None:
+        mapping.madvise(advice)
+
+
+class mapped_log(object):
+    """
+    LOG_DTYPE records mapped from a file and decoded into typed columns a chunk at a time. Chunks are kept in a small
+    LRU cache; whenever a chunk is used, its neighbours are queued for the prefetch thread, so playing forward or back
+    rarely waits for the disk.
+    A seek finds its chunk by the largest time up to the end of every chunk, then its line in the chunk. Opening the
+    log reads only the first and the last line of every chunk, the largest time of a chunk is taken from them until
+    the chunk is read: it is exact unless a line is logged more than a chunk of lines out of order, and receive times
+    are out of order by milliseconds at most. The last chunk is read on opening for the duration of the log.
+    Slots are given to addresses as they are met, so which lines are played first depends on where playback starts.
+    Lines of a Locus object older than window lines never matter: it's hidden by then
+    """
+    def __init__(self, records, start_ns, window, chunk_lines=CHUNK_LINES, cached_chunks=CACHED_CHUNKS):
+        """
+        :param records: LOG_DTYPE records, numpy.memmap or any array indexed without reading the rest of it
+        :param start_ns: receive time of the start of the log, nanoseconds
+        :param window: lines a Locus object stays shown for after its last line, lines to look back and ahead
+        :param chunk_lines: lines decoded at once
+        :param cached_chunks: amount of chunks to keep
+        """
+        self.records = records
+        self.start_ns = start_ns
+        self.window = window
+        self.chunk_lines = chunk_lines
+        self.cached_chunks = max(3, cached_chunks)
+        # Largest time of every chunk, estimated from its first and last lines until the chunk is read
+        starts = np.arange(0, len(records), chunk_lines)
+        ends = np.minimum(starts + chunk_lines, len(records)) - 1
+        stamps = records['t_ns']
+        # Read-ahead would read megabytes around each of these lines, about the whole file for a chunk each few MB
+        _advise(records, getattr(mmap, 'MADV_RANDOM', None))
+        self.chunk_times = (np.maximum(stamps[starts], stamps[ends]).astype(np.int64) - np.int64(start_ns)) / 1e9 \
+            if len(records) else np.zeros(0)
+        _advise(records, getattr(mmap, 'MADV_NORMAL', None))
+        self.exact = np.zeros(len(starts), dtype=bool)  # whether largest time of a chunk is read
+        self.bounds = np.maximum.accumulate(self.chunk_times)  # largest time up to the end of every chunk
+        self.lookup = np.full(256, -1, dtype=np.int64)  # slot of every address, -1 if not met yet
+        self.slot_addrs = []  # addresses in order they were met
+        self.cache = OrderedDict()  # chunk index: times, addresses, positions and beacon status bits of its lines
+        self.lock = Lock()
+        self.queue = queue.SimpleQueue()  # chunks to prefetch, None to stop
+        self.misses = 0  # chunks read on the calling thread
+        self.prefetched = 0  # chunks read by the prefetch thread
+        if len(starts):
+            self._store(len(starts) - 1, self._read(len(starts) - 1))
+        self.duration = float(self.bounds[-1]) if len(starts) else 0.0
+        self.thread = Thread(target=self._prefetch, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _before(self, c):
+        # Largest time before chunk c, times of chunk lines are kept without it: it grows as earlier chunks are read
+        return float(self.bounds[c - 1]) if c > 0 else -np.inf
+
+    def time(self, line):
+        c = line // self.chunk_lines
+        return max(float(self._chunk(c)[0][line - c * self.chunk_lines]), self._before(c))
+
+    def search(self, t):
+        c = int(np.searchsorted(self.bounds, t, 'right'))  # chunk of the first line not played by the time
+        while c > 0 and not self.exact[c - 1]:  # the chunk before decides whether it's this one
+            self._chunk(c - 1)
+            c = int(np.searchsorted(self.bounds, t, 'right'))
+        if c == len(self.bounds):
+            return len(self.records)
+        times = self._chunk(c)[0]
+        return c * self.chunk_lines + (int(np.searchsorted(times, t, 'right')) if t >= self._before(c) else 0)
+
+    def _read(self, c):
+        # Copy of the chunk records, reading them is where the disk is waited for
+        rows = np.array(self.records[c * self.chunk_lines:(c + 1) * self.chunk_lines])
+        return (np.maximum.accumulate((rows['t_ns'].astype(np.int64) - np.int64(self.start_ns)) / 1e9), rows['addr'],
+                np.column_stack((rows['x'], rows['y'], rows['z'])), rows['beacons'])
+
+    def _store(self, c, columns):
+        with self.lock:
+            if not self.exact[c]:  # largest time of the chunk is known now
+                self.chunk_times[c] = columns[0][-1]
+                self.exact[c] = True
+                self.bounds = np.maximum.accumulate(self.chunk_times)
+            self.cache[c] = columns
+            self.cache.move_to_end(c)
+            while len(self.cache) > self.cached_chunks:
+                self.cache.popitem(last=False)
+
+    def _prefetch(self):
+        while True:
+            c = self.queue.get()
+            if c is None:
+                break
+            with self.lock:
+                cached = c in self.cache
+            if not cached:
+                self._store(c, self._read(c))
+                self.prefetched += 1
+
+    def _chunk(self, c):
+        with self.lock:
+            columns = self.cache.get(c)
+            if columns is not None:
+                self.cache.move_to_end(c)
+        if columns is None:
+            columns = self._read(c)
+            self._store(c, columns)
+            self.misses += 1
+        with self.lock:
+            ahead = [n for n in (c + 1, c - 1) if 0 <= n * self.chunk_lines < len(self.records) and n not in self.cache]
+        for n in ahead:
+            self.queue.put(n)
+        return columns
+
+    def _columns(self, a, k):
+        """
+        :return: times, addresses, positions and beacon status bits of lines a..k-1
+        """
+        a, k = max(a, 0), min(k, len(self.records))
+        if a >= k:
+            return np.zeros(0), np.zeros(0, dtype=np.uint8), np.zeros((0, 3)), np.zeros(0, dtype=np.uint8)
+        parts = []
+        for c in range(a // self.chunk_lines, (k - 1) // self.chunk_lines + 1):
+            start = c * self.chunk_lines
+            parts.append([column[max(a - start, 0):k - start] for column in self._chunk(c)])
+        if len(parts) == 1:
+            return parts[0]
+        return [np.concatenate(column) for column in zip(*parts)]
+
+    def _slots(self, addrs):
+        """
+        :return: slots of the addresses, new addresses get the next slots in order they are met
+        """
+        new = self.lookup[addrs] < 0
+        if new.any():
+            found, first = np.unique(addrs[new], return_index=True)
+            for addr in found[np.argsort(first)].tolist():
+                self.lookup[addr] = len(self.slot_addrs)
+                self.slot_addrs.append(addr)
+        return self.lookup[addrs]
+
+    def lines(self, a, k):
+        times, addrs, positions, beacons = self._columns(a, k)
+        return self._slots(addrs), positions
+
+    def last_lines(self, k):
+        a = max(k - self.window, 0)
+        slots = self._slots(self._columns(a, k)[1])
+        last = np.full(len(self.slot_addrs), -1, dtype=np.int64)
+        found, latest = np.unique(slots[::-1], return_index=True)
+        last[found] = k - 1 - latest
+        return last
+
+    def rows(self, lines):
+        lines = np.asarray(lines, dtype=np.int64)
+        times, positions, beacons = np.zeros(len(lines)), np.zeros((len(lines), 3)), np.zeros(len(lines), np.uint8)
+        chunks = lines // self.chunk_lines
+        for c in np.unique(chunks).tolist():
+            mask = chunks == c
+            columns = self._chunk(c)
+            index = lines[mask] - c * self.chunk_lines
+            times[mask] = np.maximum(columns[0][index], self._before(c))
+            positions[mask], beacons[mask] = columns[2][index], columns[3][index]
+        return times, positions, beacons
+
+    def next_lines(self, k, slots):
+        following = self._slots(self._columns(k, k + self.window)[1])
+        found, first = np.unique(following, return_index=True)
+        next_line = np.full(len(self.slot_addrs), -1, dtype=np.int64)
+        next_line[found] = k + first
+        return next_line[np.asarray(slots, dtype=np.int64)]
+
+    def history(self, slot, k, count):
+        # Lines of every slot are assumed to be spread evenly, so the last count lines of this one are looked for among
+        # count lines per slot
+        a = k - count * max(len(self.slot_addrs), 1)
+        times, addrs, positions, beacons = self._columns(a, k)
+        return positions[self._slots(addrs) == slot][-count:]
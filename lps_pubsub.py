@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local fan-out of Locus telemetry, so the 3D view, a logger and analysis scripts share one serial reader. Publisher
+attached to gs_lps.us_nav sends every decoded telemetry record over localhost as soon as it is decoded, attached to
+gs_lps.us_nav_group it sends the merged feed of all ports as the group is drained. Subscribers are drop-in replacements
+of us_nav with the same start, drain, get_latest and stop methods. Transports:
+    'udp' - UDP multicast on the loopback interface, any amount of subscribers join the group
+    'unix' - Unix domain datagram sockets (POSIX only), every subscriber binds its own socket in SOCKET_DIR
+Datagrams are sent without blocking, so a slow subscriber loses records (counted on both sides) instead of slowing the
+reader down. Run 'python lps_pubsub.py --help' to publish a port or synthetic swarm without the 3D view
+"""
+import argparse
+import itertools
+import os
+import socket
+import struct
+import tempfile
+import time
+from threading import Lock, Thread
+import gs_lps
+
+GROUP = '239.255.76.51'  # multicast group of 'udp' transport, administratively scoped so it never leaves the host
+PORT = 7651
+SOCKET_DIR = os.path.join(tempfile.gettempdir(), 'locus3d')  # directory of subscriber sockets of 'unix' transport
+TRANSPORTS = ('udp', 'unix')
+
+"""
+Datagram is a header followed by count records. Record keeps wire resolution of the packet: receive time (ns),
+start, size, addr, event, roll, pitch, yaw (radians), x, y, z (mm), vX, vY, vZ (mm/s), voltage (mV), beacons, status,
+pos_error. 47 bytes per record instead of 34 bytes frame plus a Python object
+"""
+HEADER = struct.Struct('<2sBBI')  # magic, version, record count, sequence number
+RECORD = struct.Struct('<QBBBBfffiiihhhHBBB')
+MAGIC = b'L3'
+VERSION = 1
+MAX_RECORDS = 255  # records per datagram
+DRAIN_INTERVAL = 0.01  # seconds between drains of us_nav_group when publishing without the 3D view
+REPORT_INTERVAL = 5.0  # seconds between publishing statistics lines
+
+
+def pack(records, seq):
+    """
+    :param records: sequence of at most MAX_RECORDS telemetry records
+    :param seq: datagram sequence number
+    :return: bytes of the datagram
+    """
+    data = [HEADER.pack(MAGIC, VERSION, len(records), seq & 0xFFFFFFFF)]
+    for r in records:
+        data.append(RECORD.pack(r.t_ns, r.start, r.size, r.addr, r.event, r.roll, r.pitch, r.yaw, round(r.x * 1000),
+                                round(r.y * 1000), round(r.z * 1000), r.vX, r.vY, r.vZ, round(r.voltage * 1000),
+                                r.beacons, r.status, r.pos_error))
+    return b''.join(data)
+
+
+def unpack(data):
+    """
+    :param data: bytes of the datagram
+    :return: tuple of sequence number and list of telemetry records, sequence number is None for foreign datagrams
+    """
+    if len(data) < HEADER.size:
+        return None, []
+    magic, version, count, seq = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or len(data) != HEADER.size + count * RECORD.size:
+        return None, []
+    records = []
+    for t_ns, start, size, addr, event, roll, pitch, yaw, x, y, z, vx, vy, vz, voltage, beacons, status, pos_error in \
+            RECORD.iter_unpack(memoryview(data)[HEADER.size:]):
+        # Angles are rounded back to the 4 digits of gs_lps angle tables float32 has lost
+        records.append(gs_lps.telemetry(start, size, addr, event, round(roll, 4), round(pitch, 4), round(yaw, 4),
+                                        x / 1000.0, y / 1000.0, z / 1000.0, vx, vy, vz, voltage / 1000.0, beacons,
+                                        status, pos_error, t_ns))
+    return seq, records
+
+
+class telemetry_publisher(object):
+    """
+    Sends telemetry records decoded by us_nav readers to local subscribers. publish is called on the reader thread,
+    or on the thread draining us_nav_group, it packs the records and hands them to the kernel without blocking,
+    nothing is queued in the publisher
+    """
+    RESCAN_INTERVAL = 1.0  # seconds between looking for new subscribers of 'unix' transport
+
+    def __init__(self, transport='udp', group=GROUP, port=PORT, path=SOCKET_DIR):
+        """
+        :param transport: one of TRANSPORTS
+        :param group: multicast group of 'udp' transport
+        :param port: UDP port of 'udp' transport
+        :param path: directory of subscriber sockets of 'unix' transport
+        """
+        if transport not in TRANSPORTS:
+            raise ValueError("unknown transport: " + str(transport))
+        self.transport = transport
+        self.path = path
+        self._seq = 0  # sequence number of the next datagram
+        self._lock = Lock()  # datagrams are numbered and sent in one order even if several threads publish
+        if transport == 'udp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton('127.0.0.1'))
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 0)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            self.targets = [(group, port)]
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.targets = []
+            self._rescan = 0.0
+        self.sock.setblocking(False)
+        self.sent = 0  # amount of records sent
+        self.dropped = 0  # amount of records not sent because a subscriber socket was full
+
+    def attach(self, source):
+        """
+        Publish everything the source decodes, us_nav_group publishes the records its drain returns, so it has to be
+        drained
+        :param source: gs_lps.us_nav or gs_lps.us_nav_group
+        """
+        source.add_listener(self.publish)
+
+    def publish(self, records):
+        """
+        :param records: sequence of telemetry records
+        """
+        with self._lock:
+            self._publish(records)
+
+    def _publish(self, records):
+        if self.transport == 'unix' and time.monotonic() >= self._rescan:
+            self._find_subscribers()
+        for i in range(0, len(records), MAX_RECORDS):
+            chunk = records[i:i + MAX_RECORDS]
+            data = pack(chunk, self._seq)
+            self._seq += 1
+            for target in list(self.targets):
+                try:
+                    self.sock.sendto(data, target)
+                    self.sent += len(chunk)
+                except BlockingIOError:
+                    self.dropped += len(chunk)  # subscriber doesn't keep up, never wait for it
+                except FileNotFoundError:
+                    self.targets.remove(target)  # subscriber is gone
+                except ConnectionRefusedError:
+                    self.targets.remove(target)  # subscriber has crashed and left its socket file behind
+                    try:
+                        os.remove(target)
+                    except OSError:
+                        pass
+                except OSError:
+                    self.dropped += len(chunk)
+
+    def _find_subscribers(self):
+        self._rescan = time.monotonic() + self.RESCAN_INTERVAL
+        try:
+            self.targets = [os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith('.sock')]
+        except FileNotFoundError:
+            self.targets = []
+
+    def close(self):
+        self.sock.close()
+
+
+class telemetry_subscriber(Thread):
+    """
+    Receives published telemetry in a thread, a drop-in replacement of gs_lps.us_nav for the 3D view and other tools
+    """
+    READ_TIMEOUT = 0.1  # seconds receive waits before checking whether the thread should stop
+
+    def __init__(self, transport='udp', group=GROUP, port=PORT, path=SOCKET_DIR, queue_size=4096):
+        """
+        :param transport: one of TRANSPORTS
+        :param group: multicast group of 'udp' transport
+        :param port: UDP port of 'udp' transport
+        :param path: directory of subscriber sockets of 'unix' transport
+        :param queue_size: maximum amount of telemetry records kept until they are drained
+        """
+        Thread.__init__(self, daemon=True)
+        if transport not in TRANSPORTS:
+            raise ValueError("unknown transport: " + str(transport))
+        self.queue = gs_lps.telemetry_queue(queue_size)
+        self.socket_path = None  # socket file of 'unix' transport
+        if transport == 'udp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.sock.bind(('', port))
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                 socket.inet_aton(group) + socket.inet_aton('127.0.0.1'))
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            for n in itertools.count():
+                self.socket_path = os.path.join(path, '%d-%d.sock' % (os.getpid(), n))
+                if not os.path.exists(self.socket_path):
+                    break
+            self.sock.bind(self.socket_path)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)  # absorb bursts while consumer is busy
+        self.sock.settimeout(self.READ_TIMEOUT)
+        self._run = True
+        self._seq = None  # sequence number of the next expected datagram
+        self.received = 0  # amount of records received
+        self.lost = 0  # amount of datagrams missed, by gaps of sequence numbers
+        self.latency = gs_lps.latency_histogram()  # time from serial receive to drain of telemetry records
+
+    def run(self):
+        buffer = bytearray(HEADER.size + MAX_RECORDS * RECORD.size)
+        push = self.queue.push
+        try:
+            while self._run:
+                try:
+                    size = self.sock.recv_into(buffer)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break  # socket closed by stop
+                seq, records = unpack(bytes(buffer[:size]))
+                if seq is None:
+                    continue
+                if self._seq is not None and seq != self._seq:
+                    gap = (seq - self._seq) & 0xFFFFFFFF
+                    if gap < 0x80000000:  # otherwise publisher has restarted
+                        self.lost += gap
+                self._seq = (seq + 1) & 0xFFFFFFFF
+                self.received += len(records)
+                for record in records:
+                    push(record)
+        finally:
+            self.sock.close()
+            if self.socket_path is not None and os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def drain(self):
+        """
+        :return: list of telemetry records received since the previous call, in arrival order
+        """
+        records = self.queue.drain()
+        self.latency.add_records(records)
+        return records
+
+    def get_latest(self):
+        """
+        :return: dictionary of the last telemetry record received from each address
+        """
+        return self.queue.get_latest()
+
+    def get_metrics(self):
+        """
+        :return: dictionary of metrics, latency is counted from serial receive in the publishing process
+        """
+        return {'received': self.received, 'lost': self.lost, 'dropped': self.queue.dropped,
+                'latency': self.latency.to_dict()}
+
+    def stop(self):
+        self._run = False
+        if self.is_alive():
+            self.join(self.READ_TIMEOUT * 5)
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='Publish Locus telemetry to local subscribers')
+    parser.add_argument('--port', action='append', help='RS-485 adapter serial port, repeat to read several adapters '
+                                                        'at once (default: /dev/ttyUSB0)')
+    parser.add_argument('--sim', type=int, metavar='DRONES', help='publish synthetic swarm of given amount of drones')
+    parser.add_argument('--rate', type=float, default=10.0, help='synthetic telemetry rate of each drone, Hz')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic swarm random seed')
+    parser.add_argument('--transport', default='udp', choices=TRANSPORTS)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parseArgs()
+    if args.sim:
+        import lps_sim
+        source = lps_sim.simulate(drones=args.sim, rate=args.rate, seed=args.seed, queue_size=1)
+    elif args.port and len(args.port) > 1:
+        source = gs_lps.us_nav_group(args.port)
+    else:
+        source = gs_lps.us_nav(serial_port=args.port[0] if args.port else "/dev/ttyUSB0", queue_size=1)
+    publisher = telemetry_publisher(args.transport)
+    publisher.attach(source)
+    grouped = isinstance(source, gs_lps.us_nav_group)  # published as drained, every port otherwise
+    source.start()
+    try:
+        report = time.monotonic() + REPORT_INTERVAL
+        while True:
+            time.sleep(DRAIN_INTERVAL if grouped else REPORT_INTERVAL)
+            if grouped:
+                source.drain()
+            if time.monotonic() >= report:
+                report += REPORT_INTERVAL
+                print("%d records published, %d dropped" % (publisher.sent, publisher.dropped))
+    except KeyboardInterrupt:
+        pass
+    source.stop()
+    publisher.close()
@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Drone spheres of the 3D views. node_swarm keeps a separate model NodePath per drone, instanced_swarm draws a single
+sphere geometry as many times as there are drones in one draw call, with per-drone position and color kept in a NumPy
+array and uploaded to a GPU buffer texture once per frame. Both have the same interface, make_swarm picks instanced one
+when the graphics driver supports it (GLSL with instancing and buffer textures, e.g. Mesa llvmpipe does)
+
+Startup goes through a cache of binary .bam files in CACHE_DIR: the sphere model (scaled, flattened) with its low-poly
+variant and static scene geometry. Each cached file is rebuilt automatically once its source is newer than it
+
+drone_labels are the debug text labels of the drones, throttled to LABEL_RATE text updates per second, drone_trails are
+the lines of their recent flight paths
+"""
+import math
+import os
+import time
+import numpy as np
+from panda3d.core import Texture, GeomEnums, Shader, OmniBoundingVolume, Filename, NodePath, LODNode, Geom, GeomNode, \
+    GeomTriangles, GeomVertexData, GeomVertexFormat, GeomVertexWriter, TextNode, PStatCollector, GeomLines
+
+SCALE = 0.22  # sphere model scale, approximately 0.1m diameter
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(MODEL_DIR, 'cache')
+LOD_DISTANCE = 10.0  # meters from the camera low-poly sphere is drawn from
+LOW_POLY = (12, 8)  # slices and stacks of low-poly sphere
+LABEL_RATE = 5.0  # debug label text updates per second
+TRAIL_LENGTH = 64  # amount of points in the trail of each drone
+TRAIL_DECIMATION = 3  # position updates per trail point
+
+VERTEX_SHADER = """
+#version 140
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform samplerBuffer instances;  // two texels per drone: position and visibility (1 shows, 0 hides), color
+in vec4 p3d_Vertex;
+out vec4 color;
+
+void main() {
+    vec4 offset = texelFetch(instances, gl_InstanceID * 2);
+    color = texelFetch(instances, gl_InstanceID * 2 + 1);
+    gl_Position = p3d_ModelViewProjectionMatrix * vec4(p3d_Vertex.xyz * offset.w + offset.xyz, 1);
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 140
+in vec4 color;
+out vec4 p3d_FragColor;
+
+void main() {
+    p3d_FragColor = clamp(color, 0.0, 1.0);
+}
+"""
+
+
+def _fresh(path, sources):
+    """
+    :param path: cached file
+    :param sources: files it is built from
+    :return: whether cached file exists and is newer than every source
+    """
+    if not os.path.exists(path):
+        return False
+    mtime = os.path.getmtime(path)
+    return all(os.path.getmtime(source) <= mtime for source in sources if os.path.exists(source))
+
+
+def _load_bam(loader, path):
+    return loader.loadModel(Filename.fromOsSpecific(path), noCache=True)
+
+
+def _write_bam(node, path):
+    """
+    Cache geometry, a read-only or full disk only leaves it uncached: it is built again next time
+    :param node: NodePath to write
+    :param path: cached file
+    :return: whether the file was written
+    """
+    temporary = path + '.tmp'  # a half-written file is never taken for a fresh cache
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        written = node.writeBamFile(Filename.fromOsSpecific(temporary))
+        if written:
+            os.replace(temporary, path)
+    except OSError:
+        written = False
+    if not written:
+        print('Could not cache %s, using geometry built this time' % path)
+    return written
+
+
+def low_poly_sphere(radius, slices=LOW_POLY[0], stacks=LOW_POLY[1]):
+    """
+    :param radius: sphere radius
+    :param slices: amount of segments around the vertical axis
+    :param stacks: amount of segments from pole to pole
+    :return: NodePath of UV sphere geometry with normals
+    """
+    data = GeomVertexData('sphere', GeomVertexFormat.getV3n3(), Geom.UHStatic)
+    vertex, normal = GeomVertexWriter(data, 'vertex'), GeomVertexWriter(data, 'normal')
+    for j in range(stacks + 1):
+        theta = math.pi * j / stacks
+        for i in range(slices + 1):
+            phi = 2 * math.pi * i / slices
+            n = (math.sin(theta) * math.cos(phi), math.sin(theta) * math.sin(phi), math.cos(theta))
+            vertex.addData3(n[0] * radius, n[1] * radius, n[2] * radius)
+            normal.addData3(*n)
+    triangles = GeomTriangles(Geom.UHStatic)
+    for j in range(stacks):
+        for i in range(slices):
+            a = j * (slices + 1) + i
+            b = a + slices + 1
+            if j != 0:
+                triangles.addVertices(a, b, a + 1)
+            if j != stacks - 1:
+                triangles.addVertices(a + 1, b, b + 1)
+    geom = Geom(data)
+    geom.addPrimitive(triangles)
+    node = GeomNode('sphere_low')
+    node.addGeom(geom)
+    return NodePath(node)
+
+
+def load_sphere(loader, model='colorable_sphere'):
+    """
+    Load drone sphere scaled to SCALE and its low-poly variant from cache, building the cache from the egg model if it
+    is missing or outdated
+    :param loader: Panda3D loader
+    :param model: sphere model name, egg file next to this module
+    :return: tuple of full and low-poly sphere NodePaths
+    """
+    egg = os.path.join(MODEL_DIR, model + '.egg')
+    high_path = os.path.join(CACHE_DIR, model + '.bam')
+    low_path = os.path.join(CACHE_DIR, model + '_low.bam')
+    if _fresh(high_path, [egg, __file__]) and _fresh(low_path, [egg, __file__]):
+        return _load_bam(loader, high_path), _load_bam(loader, low_path)
+    high = loader.loadModel(Filename.fromOsSpecific(egg))
+    high.setScale(SCALE)
+    high.flattenStrong()  # scale is baked into vertices, so LOD distances and instances are in meters
+    low = low_poly_sphere(max(high.getTightBounds()[1]))
+    _write_bam(high, high_path)
+    _write_bam(low, low_path)
+    return high, low
+
+
+def load_static(loader, name, build, sources):
+    """
+    Load static scene geometry from cache, building and caching it if it is missing or outdated
+    :param loader: Panda3D loader
+    :param name: name of cached geometry, unique per build function: geometry of another one is never fresh for it
+    :param build: function to fill an empty NodePath with the geometry
+    :param sources: files build function is defined in
+    :return: NodePath of flattened geometry
+    """
+    path = os.path.join(CACHE_DIR, name + '.bam')
+    if _fresh(path, list(sources)):
+        return _load_bam(loader, path)
+    root = NodePath(name)
+    build(root)
+    root.flattenStrong()
+    _write_bam(root, path)
+    return root
+
+
+def report_first_frame(base, start, name):
+    """
+    Print time from the start of the program till its first frame is rendered
+    :param base: ShowBase
+    :param start: time.perf_counter() at the start of the program
+    :param name: program name to print
+    """
+    def first_frame(task):
+        if task.frame == 0:  # scene is rendered after the tasks of the frame
+            return task.cont
+        base.firstFrameTime = time.perf_counter() - start
+        print('%s: first frame in %.3f s' % (name, base.firstFrameTime))
+        return task.done
+    base.taskMgr.add(first_frame, 'firstFrame')
+
+
+def drone_color(i):
+    """
+    :param i: drone slot index
+    :return: RGBA color of the drone, the same random color scheme the views always used
+    """
+    return 1.0-0.14*i, 0.0+0.14*i, 0.4+0.7*i, 1
+
+
+class node_swarm(object):
+    """
+    Separate model NodePath per drone, works with any graphics driver. Cost grows with a draw call and a scene graph
+    node per drone
+    """
+    def __init__(self, loader, parent, model='colorable_sphere'):
+        """
+        :param loader: Panda3D loader
+        :param parent: NodePath drones are attached to
+        :param model: sphere model name
+        """
+        self.parent = parent
+        self.high, self.low = load_sphere(loader, model)
+        self.nodes = []
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def spawn(self):
+        """
+        Add a hidden drone
+        :return: slot index of the drone
+        """
+        i = len(self.nodes)
+        lod = LODNode('drone')  # full sphere nearby, low-poly one further than LOD_DISTANCE
+        drone = self.parent.attachNewNode(lod)
+        lod.addSwitch(LOD_DISTANCE, 0)
+        self.high.instanceTo(drone)
+        lod.addSwitch(1e6, LOD_DISTANCE)
+        self.low.instanceTo(drone)
+        drone.setColor(*drone_color(i))
+        drone.hide()  # hide object until it's assigned to a Locus object
+        self.nodes.append(drone)
+        return i
+
+    def set_pos(self, i, x, y, z):
+        self.nodes[i].setPos(x, y, z)
+
+    def set_visible(self, i, visible):
+        if visible:
+            self.nodes[i].show()
+        else:
+            self.nodes[i].hide()
+
+    def set_positions(self, slots, positions):
+        """
+        :param slots: sequence of slot indexes
+        :param positions: array of (x, y, z) rows of the slots
+        """
+        nodes = self.nodes
+        for i, (x, y, z) in zip(slots, np.asarray(positions).tolist()):
+            nodes[i].setPos(x, y, z)
+
+    def flush(self):
+        pass
+
+
+class instanced_swarm(object):
+    """
+    One sphere geometry drawn with hardware instancing. Positions and colors live in data array, (x, y, z, visibility)
+    and RGBA rows of every drone, and are uploaded to the buffer texture the vertex shader reads by flush, once per
+    frame
+    """
+    def __init__(self, loader, parent, model='colorable_sphere', capacity=64, low_poly=True):
+        """
+        :param loader: Panda3D loader
+        :param parent: NodePath drones are attached to
+        :param model: sphere model name
+        :param capacity: amount of drones to allocate GPU memory for, it is doubled whenever exceeded
+        :param low_poly: draw low-poly sphere, instancing is meant for swarms too large to look at closely
+        """
+        high, low = load_sphere(loader, model)
+        self.node = low if low_poly else high
+        self.node.clearTexture()
+        self.node.setShader(Shader.make(Shader.SL_GLSL, VERTEX_SHADER, FRAGMENT_SHADER))
+        self.node.node().setBounds(OmniBoundingVolume())  # instances are anywhere, the model itself is never culled
+        self.node.node().setFinal(True)
+        self.node.reparentTo(parent)
+        self.count = 0
+        self.data = np.zeros((0, 2, 4), dtype=np.float32)
+        self._allocate(capacity)
+        self.dirty = True
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, capacity):
+        data = np.zeros((capacity, 2, 4), dtype=np.float32)
+        data[:self.count] = self.data[:self.count]
+        self.data = data
+        self.texture = Texture('instances')
+        self.texture.setupBufferTexture(capacity * 2, Texture.T_float, Texture.F_rgba32, GeomEnums.UH_dynamic)
+        self.node.setShaderInput('instances', self.texture)
+
+    def spawn(self):
+        i = self.count
+        if i == len(self.data):
+            self._allocate(len(self.data) * 2)
+        self.data[i, 1] = drone_color(i)
+        self.count += 1
+        self.node.setInstanceCount(self.count)
+        self.dirty = True
+        return i
+
+    def set_pos(self, i, x, y, z):
+        self.data[i, 0, :3] = x, y, z
+        self.dirty = True
+
+    def set_visible(self, i, visible):
+        self.data[i, 0, 3] = 1.0 if visible else 0.0
+        self.dirty = True
+
+    def set_positions(self, slots, positions):
+        self.data[slots, 0, :3] = positions
+        self.dirty = True
+
+    def flush(self):
+        """
+        Upload changed positions and colors to the GPU, call once per frame after all updates
+        """
+        if self.dirty:
+            self.texture.setRamImage(self.data.tobytes())
+            self.dirty = False
+
+
+class drone_labels(object):
+    """
+    Debug text labels of drones: dynamic address, x, y, z and beacon status. Labels follow their drones every frame,
+    while the text, which Panda3D has to regenerate geometry for, is formatted at most rate times per second and only
+    set when the rounded text has changed. Time spent is reported to PStats as 'App:Show code:Labels', amount of text
+    updates as 'Label text updates'
+    """
+    def __init__(self, parent, rate=LABEL_RATE, scale=0.22):
+        """
+        :param parent: NodePath labels are attached to
+        :param rate: text updates per second
+        :param scale: text scale
+        """
+        self.parent = parent
+        self.scale = scale
+        self.period = 1.0 / rate
+        self.nodes = []  # label NodePaths, None until the label is shown for the first time
+        self.shown = []  # text currently set of every label
+        self.state = []  # address, position and beacon status to show of every label, None if hidden
+        self.moved = set()  # slots of labels to move on the next flush
+        self.dirty = set()  # slots of labels with text to check on the next text update
+        self.next_update = 0.0
+        self.updates = 0  # amount of text updates
+        self.skipped = 0  # amount of text updates skipped as the text hasn't changed
+        self._time = PStatCollector('App:Show code:Labels')
+        self._level = PStatCollector('Label text updates')
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def spawn(self):
+        """
+        Add a hidden label
+        :return: slot index of the label
+        """
+        self.nodes.append(None)
+        self.shown.append('')
+        self.state.append(None)
+        return len(self.nodes) - 1
+
+    def _node(self, i):
+        label = self.nodes[i]
+        if label is None:
+            label = self.parent.attachNewNode(TextNode('label'))
+            label.setScale(self.scale)
+            label.setBillboardPointEye()  # labels follow the camera so they're always readable
+            self.nodes[i] = label
+        return label
+
+    def set(self, i, addr, pos, beacons):
+        """
+        :param i: slot index
+        :param addr: dynamic address
+        :param pos: (x, y, z) position
+        :param beacons: beacon status string, e.g. 1_3_
+        """
+        self.state[i] = addr, pos, beacons
+        self.moved.add(i)
+        self.dirty.add(i)
+
+    def hide(self, i):
+        self.state[i] = None
+        self.moved.discard(i)
+        self.dirty.discard(i)
+        if self.shown[i]:
+            self.nodes[i].node().setText('')
+            self.shown[i] = ''
+
+    def clear(self):
+        """
+        Hide all labels
+        """
+        for i in range(len(self.nodes)):
+            self.hide(i)
+
+    def flush(self, now=None):
+        """
+        Move labels and update their text if it's due, call once per frame after all updates
+        :param now: seconds of the clock text updates are spread over, time.monotonic() if None
+        """
+        if not self.moved and not self.dirty:
+            return
+        self._time.start()
+        for i in self.moved:
+            _, (x, y, z), _ = self.state[i]
+            self._node(i).setPos(x + 0.2, y, z + 0.2)
+        self.moved.clear()
+        if now is None:
+            now = time.monotonic()
+        if now >= self.next_update and self.dirty:
+            self.next_update = now + self.period
+            updates = 0
+            for i in self.dirty:
+                addr, (x, y, z), beacons = self.state[i]
+                text = '%d\n%.2f, %.2f, %.2f\n%s' % (addr, x, y, z, beacons)
+                if text != self.shown[i]:
+                    self.nodes[i].node().setText(text)
+                    self.shown[i] = text
+                    updates += 1
+            self.updates += updates
+            self.skipped += len(self.dirty) - updates
+            self._level.setLevel(updates)
+            self.dirty.clear()
+        self._time.stop()
+
+
+class drone_trails(object):
+    """
+    Recent flight paths of drones as lines, all in one Geom. Every drone owns length rows of a preallocated vertex
+    buffer used as a ring buffer: a new point takes the place of the oldest one, the rows are copied into the
+    GeomVertexData in place by flush, and only the line indexes are rebuilt to connect the points from the oldest to the
+    newest. The newest point follows the drone on every update, the trail gets a new point every decimation updates
+    """
+    FORMAT = np.dtype([('vertex', '<f4', 3), ('color', 'u1', 4)])  # row layout of GeomVertexFormat.getV3c4()
+
+    def __init__(self, parent, length=TRAIL_LENGTH, decimation=TRAIL_DECIMATION, capacity=64):
+        """
+        :param parent: NodePath trails are attached to
+        :param length: amount of points in the trail of each drone
+        :param decimation: position updates per trail point
+        :param capacity: amount of drones to allocate the vertex buffer for, it is doubled whenever exceeded
+        """
+        if length < 2:
+            raise ValueError("trail needs at least 2 points")
+        self.length = length
+        self.decimation = max(1, int(decimation))
+        self.count = 0
+        self.rows = np.zeros((0, length), dtype=self.FORMAT)  # vertex buffer contents, a row of points per drone
+        self.vertex = self.rows['vertex']
+        # Lists rather than arrays, they are updated one drone at a time
+        self.head = []  # index of the newest point of every drone
+        self.points = []  # amount of points of every drone
+        self.tick = []  # position updates since the newest point was added
+        self.vdata = GeomVertexData('trails', GeomVertexFormat.getV3c4(), Geom.UHDynamic)
+        self.lines = GeomLines(Geom.UHDynamic)
+        self.lines.setIndexType(Geom.NT_uint32)
+        geom = Geom(self.vdata)
+        geom.addPrimitive(self.lines)
+        node = GeomNode('trails')
+        node.addGeom(geom)
+        node.setBounds(OmniBoundingVolume())  # bounds aren't recomputed whenever points move
+        node.setFinal(True)
+        self.node = parent.attachNewNode(node)
+        self.node.setLightOff()
+        self._allocate(capacity)
+        self.moved = self.dirty = False  # whether points have moved, whether lines have to be reconnected
+        self._time = PStatCollector('App:Show code:Trails')
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, capacity):
+        rows = np.zeros((capacity, self.length), dtype=self.FORMAT)
+        rows[:self.count] = self.rows[:self.count]
+        self.rows = rows
+        self.vertex = rows['vertex']
+        self.vdata.setNumRows(capacity * self.length)
+
+    def spawn(self):
+        """
+        Add a drone with an empty trail
+        :return: slot index of the drone
+        """
+        i = self.count
+        if i == len(self.rows):
+            self._allocate(len(self.rows) * 2)
+        self.rows[i]['color'] = [min(255, max(0, round(c * 255))) for c in drone_color(i)]
+        self.head.append(self.length - 1)
+        self.points.append(0)
+        self.tick.append(self.decimation - 1)
+        self.count += 1
+        return i
+
+    def set_pos(self, i, x, y, z):
+        """
+        Move the newest point of the drone trail, starting a new point every decimation calls
+        """
+        tick = self.tick[i] + 1
+        if tick >= self.decimation:
+            tick = 0
+            self.head[i] = (self.head[i] + 1) % self.length
+            if self.points[i] < self.length:
+                self.points[i] += 1
+            self.dirty = True
+        self.tick[i] = tick
+        self.vertex[i, self.head[i]] = x, y, z
+        self.moved = True
+
+    def set_visible(self, i, visible):
+        """
+        Hidden drone loses its trail, it starts over with the next position
+        """
+        if not visible and self.points[i]:
+            self.head[i] = self.length - 1
+            self.points[i] = 0
+            self.tick[i] = self.decimation - 1
+            self.dirty = True
+
+    def flush(self):
+        """
+        Upload moved points and reconnect lines, call once per frame after all updates
+        """
+        if not self.moved and not self.dirty:
+            return
+        self._time.start()
+        if self.moved:
+            self.vdata.modifyArrayHandle(0).copyDataFrom(self.rows)
+            self.moved = False
+        if self.dirty:
+            k = np.arange(self.length - 1)
+            points = np.array(self.points)
+            start = (np.array(self.head) - points + 1) % self.length  # index of the oldest point
+            base = np.arange(self.count)[:, None] * self.length
+            a = (start[:, None] + k) % self.length + base
+            b = (start[:, None] + k + 1) % self.length + base
+            valid = k < points[:, None] - 1
+            indexes = np.stack((a[valid], b[valid]), axis=-1).astype(np.uint32)
+            array = self.lines.modifyVertices()
+            array.setNumRows(indexes.size)
+            array.modifyHandle().copyDataFrom(indexes)
+            self.dirty = False
+        self._time.stop()
+
+
+def supports_instancing(win):
+    """
+    :param win: Panda3D window or offscreen buffer
+    :return: whether instanced_swarm can be drawn
+    """
+    gsg = win.getGsg()
+    return bool(gsg.getSupportsGlsl() and gsg.getSupportsGeometryInstancing() and gsg.getSupportsBufferTexture())
+
+
+def make_swarm(base, parent, instanced=True, model='colorable_sphere'):
+    """
+    :param base: ShowBase
+    :param parent: NodePath drones are attached to
+    :param instanced: whether to use instanced rendering if supported
+    :param model: sphere model name
+    :return: instanced_swarm or node_swarm
+    """
+    if instanced and supports_instancing(base.win):
+        return instanced_swarm(base.loader, parent, model)
+    if instanced:
+        print("instanced rendering isn't supported by the graphics driver, drawing every drone separately")
+    return node_swarm(base.loader, parent, model)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic Locus swarm to run and load test the ground station without hardware. swarm_emitter produces correctly framed,
+CRC-valid packets of any amount of drones, which are fed to the real gs_lps.us_nav parser through memory_port (in-memory
+serial-like stream) or virtual_port (pseudo-terminal any serial tool can open)
+"""
+import heapq
+import math
+import os
+import random
+import time
+from threading import Thread, Condition, Event
+import gs_lps
+
+PATTERNS = ('hover', 'circle', 'figure8', 'random_walk')
+
+
+class swarm_emitter(object):
+    """
+    Seeded generator of Locus telemetry byte stream. Every drone flies its own pattern inside the 11x11x4 meters grid
+    and sends telemetry at its own rate (requested rate +-10%), so frames of different drones interleave like on a real
+    bus. Same arguments always produce the same stream
+    """
+    def __init__(self, drones=10, rate=10.0, pattern='circle', seed=0, corrupt=0.0, garbage=0.0, first_addr=1):
+        """
+        :param drones: amount of simulated drones
+        :param rate: telemetry packets per second sent by each drone
+        :param pattern: flight pattern, one of PATTERNS
+        :param seed: random generator seed
+        :param corrupt: probability of a frame to get a random bit flipped
+        :param garbage: probability of random bytes to be inserted before a frame
+        :param first_addr: dynamic address of the first drone, the rest follow it
+        """
+        if pattern not in PATTERNS:
+            raise ValueError("unknown flight pattern: " + str(pattern))
+        if first_addr + drones > 256:
+            raise ValueError("too many drones for 8-bit addresses")
+        self.pattern = pattern
+        self.corrupt = corrupt
+        self.garbage = garbage
+        self.rng = random.Random(seed)
+        self.drones = []
+        for i in range(drones):
+            self.drones.append({
+                'addr': first_addr + i,
+                'period': 1.0 / (rate * self.rng.uniform(0.9, 1.1)),
+                'center': (self.rng.uniform(-4.0, 4.0), self.rng.uniform(-4.0, 4.0), self.rng.uniform(1.0, 3.0)),
+                'radius': self.rng.uniform(0.3, 1.5),
+                'speed': self.rng.uniform(0.2, 1.0) * self.rng.choice((-1, 1)),  # angular speed, rad/s
+                'phase': self.rng.uniform(0, 2 * math.pi),
+                'walk': [0.0, 0.0, 0.0],  # random walk offset and velocity
+                'walk_vel': [0.0, 0.0, 0.0],
+                'voltage': self.rng.uniform(8.0, 8.4),
+            })
+        # Next send time of each drone, drones start at random moments of their first period
+        self.schedule = [(self.rng.uniform(0, drone['period']), i) for i, drone in enumerate(self.drones)]
+        heapq.heapify(self.schedule)
+        self.sent = 0  # amount of frames generated
+        self.corrupted = 0  # amount of frames corrupted on purpose
+
+    def state(self, drone, t):
+        """
+        Position (meters) and velocity (mm/s) of a drone at the given time
+        :param drone: drone parameters
+        :param t: simulation time, seconds
+        :return: tuple of (x, y, z) and (vx, vy, vz)
+        """
+        cx, cy, cz = drone['center']
+        r, w, a = drone['radius'], drone['speed'], drone['phase'] + drone['speed'] * t
+        if self.pattern == 'hover':
+            return (cx, cy, cz), (0.0, 0.0, 0.0)
+        if self.pattern == 'circle':
+            return (cx + r * math.cos(a), cy + r * math.sin(a), cz), \
+                (-r * w * math.sin(a) * 1000, r * w * math.cos(a) * 1000, 0.0)
+        if self.pattern == 'figure8':
+            return (cx + r * math.sin(a), cy + r * math.sin(a) * math.cos(a), cz + 0.3 * math.sin(a / 2)), \
+                (r * w * math.cos(a) * 1000, r * w * math.cos(2 * a) * 1000, 0.15 * w * math.cos(a / 2) * 1000)
+        walk, vel = drone['walk'], drone['walk_vel']  # random walk is integrated step by step
+        dt = drone['period']
+        for k in range(3):
+            vel[k] = max(-0.5, min(0.5, vel[k] + self.rng.gauss(0, 0.2)))
+            walk[k] = max(-1.5, min(1.5, walk[k] + vel[k] * dt))
+        return (cx + walk[0], cy + walk[1], cz + walk[2] / 3), tuple(v * 1000 for v in vel)
+
+    def next_frame(self):
+        """
+        Generate the next frame of the swarm in time order
+        :return: tuple of simulation time the frame is sent at and bytes of the frame (with garbage, if injected)
+        """
+        t, i = heapq.heappop(self.schedule)
+        drone = self.drones[i]
+        heapq.heappush(self.schedule, (t + drone['period'], i))
+        (x, y, z), (vx, vy, vz) = self.state(drone, t)
+        drone['voltage'] = max(6.4, drone['voltage'] - 0.00002)
+        yaw = (drone['phase'] + drone['speed'] * t) % (2 * math.pi)
+        beacons = 15 if self.rng.random() > 0.02 else self.rng.randrange(16)
+        record = gs_lps.telemetry(0xFE, 30, drone['addr'], gs_lps.EV_TELEMETRY, self.rng.uniform(0, 0.05),
+                                  self.rng.uniform(0, 0.05), yaw, x, y, z, round(vx), round(vy), round(vz),
+                                  drone['voltage'], beacons, 130, self.rng.randrange(3))
+        frame = gs_lps.encode_telemetry(record)
+        if self.corrupt and self.rng.random() < self.corrupt:
+            frame = bytearray(frame)
+            frame[self.rng.randrange(len(frame))] ^= 1 << self.rng.randrange(8)
+            frame = bytes(frame)
+            self.corrupted += 1
+        if self.garbage and self.rng.random() < self.garbage:
+            frame = bytes(self.rng.randrange(256) for _ in range(self.rng.randrange(1, 40))) + frame
+        self.sent += 1
+        return t, frame
+
+    def generate(self, duration):
+        """
+        Generate frames of the given amount of simulation time
+        :param duration: simulation time, seconds
+        :return: list of (time, frame) tuples
+        """
+        frames = []
+        while self.schedule[0][0] < duration:
+            frames.append(self.next_frame())
+        return frames
+
+    def stream(self, duration):
+        """
+        :param duration: simulation time, seconds
+        :return: bytes of everything the swarm sends during the given time
+        """
+        return b''.join(frame for _, frame in self.generate(duration))
+
+
+class memory_port(object):
+    """
+    In-memory serial-like stream implementing the part of serial.Serial us_nav uses. Bytes written with feed() are read
+    by us_nav through the usual blocking or polling reads. It has no file descriptor, so 'select' reader mode and
+    run_async need virtual_port instead
+    """
+    def __init__(self):
+        self._data = bytearray()
+        self._cond = Condition()
+        self.is_open = True
+        self.timeout = None
+        self.port = 'memory'
+        self.flushed = Event()  # set once the reader has flushed the input, as us_nav does before it starts reading
+
+    def feed(self, data):
+        with self._cond:
+            self._data += data
+            self._cond.notify()
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+    def inWaiting(self):
+        return len(self._data)
+
+    in_waiting = property(inWaiting)
+
+    def read(self, size=1):
+        with self._cond:
+            if not self._data and self.timeout != 0 and self.is_open:
+                self._cond.wait(self.timeout)
+            data = bytes(self._data[:size])
+            del self._data[:size]
+        return data
+
+    def flushInput(self):
+        with self._cond:
+            self._data.clear()
+        self.flushed.set()
+
+    def flushOutput(self):
+        pass
+
+
+class virtual_port(object):
+    """
+    Pseudo-terminal pair (POSIX only). name is the path of the slave side to be opened as a regular serial port, e.g.
+    gs_lps.us_nav(serial_port=port.name), while emitted bytes are written into the master side
+    """
+    def __init__(self):
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.name = os.ttyname(self.slave)
+
+    def write(self, data):
+        os.write(self.master, data)
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def play(emitter, port, duration=None, speed=1.0, wait_reader=False):
+    """
+    Write swarm frames into a port in real time (or faster/slower with speed) on a background thread
+    :param emitter: swarm_emitter
+    :param port: memory_port (frames are fed) or virtual_port (frames are written)
+    :param duration: simulation time to play, seconds, forever if None
+    :param speed: simulation time speed factor
+    :param wait_reader: whether to start the simulation clock once the reader has flushed memory_port, so no frame is
+                        flushed away and the same seed gives the same packets from the very first one
+    :return: started daemon thread, it finishes when duration is over or memory_port is closed
+    """
+    write = port.feed if isinstance(port, memory_port) else port.write
+
+    def run():
+        while wait_reader and not port.flushed.wait(0.1):
+            if not port.is_open:
+                return
+        start = time.perf_counter()
+        while duration is None or emitter.schedule[0][0] < duration:
+            if isinstance(port, memory_port) and not port.is_open:
+                break
+            t, frame = emitter.next_frame()
+            delay = start + t / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            write(frame)
+
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def simulate(drones=10, rate=10.0, pattern='circle', seed=0, corrupt=0.0, garbage=0.0, speed=1.0, **kwargs):
+    """
+    Create us_nav reading synthetic swarm in real time, a drop-in replacement of the one reading a real port
+    :param drones: amount of simulated drones
+    :param rate: telemetry packets per second sent by each drone
+    :param pattern: flight pattern, one of PATTERNS
+    :param seed: random generator seed
+    :param corrupt: probability of a frame to get a random bit flipped
+    :param garbage: probability of random bytes to be inserted before a frame
+    :param speed: simulation time speed factor
+    :param kwargs: other us_nav arguments
+    :return: gs_lps.us_nav object, not started yet
+    """
+    port = memory_port()
+    play(swarm_emitter(drones, rate, pattern, seed, corrupt, garbage), port, speed=speed, wait_reader=True)
+    return gs_lps.us_nav(ser=port, **kwargs)
@@ -1,12 +1,23 @@
+import time
+START = time.perf_counter()  # to report time to the first frame
 from direct.gui.OnscreenText import OnscreenText
 from direct.showbase.ShowBase import ShowBase
 from panda3d.core import *
 from datetime import datetime
-import timeit
+import argparse
+import json
+import os
 import gs_lps
+import lps_sim
+import lps_pubsub
+import lps_render
+import lps_log
+import lps_motion
+import numpy as np
 
-MAX_OBJECTS = 30  # amount of sphere models to spawn for further assigning to Locus objects
-MAX_MISMATCHES = 150  # maximum amount of missed iterations before Locus object will disappear from visualization
+MAX_OBJECTS = 30  # amount of sphere models to spawn in advance, the pool grows when more Locus objects show up
+STALE_TIMEOUT = 2.5  # seconds without telemetry before Locus object disappears from visualization
+STALE_CHECK = 0.25  # seconds between checks for disappeared Locus objects
 
 
 def displayText(pos, msg, parent, align):
@@ -90,151 +101,356 @@ def drawGrid(render):
     grid_node.setColor((0.2, 0.2, 0.2, 1), 1)
 
 
+def drawScene(render):
+    """
+    Create static scene: axis lines and grid
+    :param render: NodePath to attach lines to
+    """
+    drawAxis(render)
+    drawGrid(render)
+
+
 class Locus3D(ShowBase):
-    def __init__(self):
+    def __init__(self, lps=None, instanced=False, labelRate=lps_render.LABEL_RATE, trailLength=0,
+                 trailDecimation=lps_render.TRAIL_DECIMATION, logFormat='binary', logRotate=None, smooth=False):
+        """
+        :param lps: telemetry source to visualize (gs_lps.us_nav, gs_lps.us_nav_group or anything with the same start,
+                    drain and stop methods), not started yet. us_nav reading /dev/ttyUSB0 is created if None
+        :param instanced: draw all drones with a single instanced sphere when the graphics driver supports it
+        :param labelRate: debug label text updates per second
+        :param trailLength: amount of points in flight path trail of each Locus object, no trails if 0
+        :param trailDecimation: telemetry packets of Locus object per trail point, newest of a frame or not
+        :param logFormat: one of lps_log.FORMATS
+        :param logRotate: minutes to start the next log file after, besides every lps_log.MAX_BYTES, never if None
+        :param smooth: draw Locus objects where their last packet and velocity put them at the time of the frame
+                       instead of jumping from packet to packet
+        """
         ShowBase.__init__(self)
-        window = WindowProperties()
-        window.setTitle('Locus 3D visualization')
-        base.win.requestProperties(window)
-        base.win.setCloseRequestEvent('window_exit')
+        if isinstance(base.win, GraphicsWindow):  # offscreen buffer has neither title nor close button
+            window = WindowProperties()
+            window.setTitle('Locus 3D visualization')
+            base.win.requestProperties(window)
+            base.win.setCloseRequestEvent('window_exit')
         self.accept('f1', self._startLogger)  # assign _startLogger method to F1 keyboard button
         self.accept('f2', self._stopLogger)  # assign _stopLogger method to F2 keyboard button
         self.accept('f3', self._debugger)  # assign _debugger method to F3 keyboard button
+        self.accept('f4', self._metricsHud)  # assign _metricsHud method to F4 keyboard button
+        self.accept('f5', self._exportMetrics)  # assign _exportMetrics method to F5 keyboard button
         self.accept('window_exit', self._exit)  # call _exit method upon closing window
         taskMgr.add(self.__main, 'mainTask')  # add __main to Panda3D event handler
 
         displayText((0.08, -0.04 - 0.04), '[F1]: Start logger', base.a2dTopLeft, TextNode.ALeft)
         displayText((0.08, -0.11 - 0.04), '[F2]: Stop logger, save log', base.a2dTopLeft, TextNode.ALeft)
         displayText((0.08, -0.18 - 0.04), '[F3]: Show/hide debug labels', base.a2dTopLeft, TextNode.ALeft)
+        displayText((0.08, -0.25 - 0.04), '[F4]: Show/hide ingest metrics', base.a2dTopLeft, TextNode.ALeft)
+        displayText((0.08, -0.32 - 0.04), '[F5]: Export metrics', base.a2dTopLeft, TextNode.ALeft)
+        self.metricsText = displayText((-0.08, -0.04 - 0.04), '', base.a2dTopRight, TextNode.ARight)
         self.loggerText = displayText((0.08, 0.09), "", base.a2dBottomLeft, TextNode.ALeft)
         self.timerText = displayText((0.08, 0.09), '', base.a2dBottomCenter, TextNode.ACenter)
         base.setBackgroundColor(0, 0, 0)  # set background color of visualization to black
-        drawAxis(self.render)
-        drawGrid(self.render)
+        # Axis and grid never change, they are built once and loaded from cache afterwards
+        lps_render.load_static(self.loader, 'main_scene', drawScene, [__file__]).reparentTo(self.render)
+        lps_render.report_first_frame(self, START, 'Locus 3D visualization')
 
         # Initialize gs_lps.us_nav class object with given serial port. us_nav creates a serial connection to Locus
         # in a separate thread to receive structured data packets
-        self.lps = gs_lps.us_nav(serial_port="/dev/ttyUSB0")
+        self.lps = lps if lps is not None else gs_lps.us_nav(serial_port="/dev/ttyUSB0")
         self.lps.start()  # start the thread
 
         self.logging = False  # flag to monitor whether visualization should log incoming data or not
+        self.logFormat = logFormat
+        self.logRotate = logRotate
         self.debugging = False  # flag to monitor whether visualization should display telemetry data or not
+        self.showMetrics = False  # flag to monitor whether ingest metrics are displayed or not
+        self.frames = 0  # amount of frames rendered since the previous metrics update
+        self.handleTime = 0  # time spent handling telemetry during these frames, ns
+        self.metricsTime = time.monotonic()
+        self.labelUpdates = 0  # amount of label text updates at the previous metrics update
 
-        self.drones = []  # list for Panda3D objects containing models, colors and position parameters
-        self.dronesText = []  # list for debugging text labels shown whenever self.debugging is True
+        self.drones = lps_render.make_swarm(self, self.render, instanced)  # sphere models of Locus objects
+        self.labels = lps_render.drone_labels(self.render, labelRate)  # debug labels shown when self.debugging is True
+        self.trails = lps_render.drone_trails(self.render, trailLength, trailDecimation) if trailLength else None
+        self.motion = lps_motion.motion_smoother() if smooth else None  # dead reckoning between packets
+        self.slots = {}  # dynamic address of Locus object -> index of its objects in the lists
         self.addr = []  # list for dynamic addresses of Locus objects
         self.pos = []  # list for x, y, z coordinates of Locus objects
         self.beacons = []  # list for beacon statuses of Locus objects. 0 = no beacons, 15 = all beacons
-        self.mismatches = []  # list for amounts of missed iterations of each Locus objects to monitor their connection
+        self.lastSeen = []  # list for receive times of the last telemetry of Locus objects, time.monotonic_ns()
+        self.visible = []  # list for flags whether Locus objects are shown
 
-        # Set model, random color and reparentness for each Panda3D object and hide it. Create telemetry data label
-        # with no info yet and set their scale and reparentness for each Panda3D object
         for i in range(MAX_OBJECTS):
-            drone = loader.loadModel('colorable_sphere')  # use colorable_sphere model for each object
-            drone.setScale(0.22, 0.22, 0.22)  # scale it to approximately 0.1m diameter size
-            drone.setColor(1.0-0.14*i, 0.0+0.14*i, 0.4+0.7*i, 1)  # set color from random color scheme
-            drone.reparentTo(self.render)
-            drone.hide()  # hide object until it's assigned to a Locus object
-            self.drones.append(drone)
-
-            node = TextNode('xyz')
-            node.setText('')
-            droneText = self.aspect2d.attachNewNode(node)  # create TextNode using Panda3D method
-            droneText.setScale(0.22)
-            droneText.reparentTo(self.render)
-            self.dronesText.append(droneText)
+            self._spawnDrone()
+        taskMgr.doMethodLater(STALE_CHECK, self._expireDrones, 'expireTask')
 
-    def __main(self, task):
-        if self.lps.telemetry_received() is not None:  # True if Locus telemetry packet received
-            addr = self.lps.get_addr()  # get current Locus object dynamic address
-            pos, b_beacons = self.lps.get_position()  # get (x, y, z) and beacons status
-            beacons = list('____')
-            if b_beacons & 1 != 0:  # if first bit is 1, then beacons = '1___'
-                beacons[0] = '1'
-            if b_beacons & 2 != 0:  # if second bit is 1, then beacons = '*2__' (* - depends on previous bit check)
-                beacons[1] = '2'
-            if b_beacons & 3 != 0:  # if third bit is 1, then beacons = '**3_' (* - depends on previous bit checks)
-                beacons[2] = '3'
-            if b_beacons & 4 != 0:  # if forth bit is 1, then beacons = '***4' (* - depends on previous bit checks)
-                beacons[3] = '4'
+    def _spawnDrone(self):
+        """
+        Add sphere model and its hidden telemetry data label to the pool
+        """
+        self.drones.spawn()  # hidden until it's assigned to a Locus object
+        self.labels.spawn()
+        if self.trails is not None:
+            self.trails.spawn()
+        if self.motion is not None:
+            self.motion.spawn()
 
+    def __main(self, task):
+        start = time.perf_counter_ns()
+        # Take every Locus telemetry packet received since the previous frame at once. Every packet is logged, while
+        # the scene is updated once per Locus object with its newest packet
+        records = self.lps.drain()
+        if records:
             if self.logging:
-                # Amount of time passed since logger was started as string
-                time = '%.4f' % (round((timeit.default_timer() - self.timer), 4))
-                data = time+', '+str(self.lps.get_telemetry())[1:-1]  # [1:-1] without brackets
-                self.timerText.setText(time)  # display amount of time passed since logger was started on the screen
-                self.log.write(data+'\n')  # write time and telemetry data
-                # Uncomment two lines below to create extended log instead (INFO and RAWACCEL packets included)
-                # self.log.write(str(self.lps.get_info())+'\n')
-                # self.log.write(str(self.lps.get_rawAccel())+'\n')
-
-            if addr not in self.addr:  # if Locus object wasn't detected before
-                self.addr.append(addr)  # add its address to self.addr list
-                self.pos.append(pos)  # add its current position to self.pos list
-                self.beacons.append(''.join(beacons))  # add its current beacon status to self.beacons list
-                self.mismatches.append(0)  # set its missed iterations amount to 0
-            if addr in self.addr:
-                # Find index of given address and update its position and beacon status
-                i = self.addr.index(addr)
-                self.pos[i] = pos
-                self.beacons[i] = ''.join(beacons)
-
-            for i in range(len(self.addr)):
-                if addr != self.addr[i]:
-                    self.mismatches[i] += 1  # increase amount of mismatches by 1 for each address expect addr
-                else:
-                    self.mismatches[i] = 0  # set addr' mismatches amount to 0
-
-                if self.mismatches[i] > MAX_MISMATCHES:  # if amount of missed iterations exceeds maximum
-                    self.drones[i].hide()  # hide sphere model
-                    node = self.dronesText[i].node()
-                    node.setText('')  # hide telemetry data label
-                else:
-                    self.drones[i].show()  # show sphere model
-                    self.drones[i].setX(self.pos[i][0])
-                    self.drones[i].setY(self.pos[i][1])
-                    self.drones[i].setZ(self.pos[i][2])
-
-                    if self.debugging:
-                        node = self.dronesText[i].node()
-                        # Display telemetry data label with 1st line being dynamic address, 2nd line being x, y, z and
-                        # 3rd line being beacon status (e.g. 1_3_)
-                        node.setText('%d\n%.2f, %.2f, %.2f\n%s' % (self.addr[i], self.pos[i][0], self.pos[i][1],
-                                                                   self.pos[i][2], self.beacons[i]))
-                        self.dronesText[i].setX(self.pos[i][0]+0.2)
-                        self.dronesText[i].setY(self.pos[i][1])
-                        self.dronesText[i].setZ(self.pos[i][2]+0.2)
-                        # Labels follow the camera so they're always visible
-                        self.dronesText[i].setBillboardPointEye()
+                self._logTelemetry(records)
+            latest = {record.addr: record for record in records}  # later packets overwrite earlier ones
+            for record in latest.values():
+                self._handleTelemetry(record)
+            if self.trails is not None:
+                # Trails take every packet, not only the newest one, so their points don't depend on the frame rate
+                slots, set_pos = self.slots, self.trails.set_pos
+                for record in records:
+                    set_pos(slots[record.addr], record.x, record.y, record.z)
+                self.trails.flush()
+        if self.motion is not None:
+            # Every shown Locus object is moved every frame, all at once
+            slots = np.flatnonzero(self.visible)
+            if len(slots):
+                self.drones.set_positions(slots, self.motion.positions(time.monotonic_ns() / 1e9)[slots])
+        self.drones.flush()
+        self.labels.flush()  # text of labels is updated even when no packets came this frame, if it was throttled
+        self.frames += 1
+        self.handleTime += time.perf_counter_ns() - start
         return task.cont
 
+    def _logTelemetry(self, records):
+        """
+        Hand telemetry records over to the logger thread, formatting and writing them never stalls the frame
+        :param records: list of gs_lps.telemetry records in arrival order
+        """
+        self.log.log(records)
+        # Uncomment two lines below to create extended log instead (INFO and RAWACCEL packets included, text log only)
+        # self.log.log_text(str(self.lps.get_info()))
+        # self.log.log_text(str(self.lps.get_rawAccel()))
+        # Display amount of time passed since logger was started till the last packet was received. Receive time is
+        # stamped by the reader thread, so it doesn't depend on the frame rate
+        self.timerText.setText('%.4f' % max(0.0, (records[-1].t_ns - self.log.start_ns) / 1e9))
+
+    def _handleTelemetry(self, record):
+        """
+        Update visualization of Locus object the record was received from
+        :param record: gs_lps.telemetry record, the newest one of the Locus object
+        """
+        addr = record.addr  # get current Locus object dynamic address
+        pos, b_beacons = [record.x, record.y, record.z], record.beacons  # get (x, y, z) and beacons status
+        beacons = list('____')
+        if b_beacons & 1 != 0:  # if first bit is 1, then beacons = '1___'
+            beacons[0] = '1'
+        if b_beacons & 2 != 0:  # if second bit is 1, then beacons = '*2__' (* - depends on previous bit check)
+            beacons[1] = '2'
+        if b_beacons & 3 != 0:  # if third bit is 1, then beacons = '**3_' (* - depends on previous bit checks)
+            beacons[2] = '3'
+        if b_beacons & 4 != 0:  # if forth bit is 1, then beacons = '***4' (* - depends on previous bit checks)
+            beacons[3] = '4'
+
+        i = self.slots.get(addr)
+        if i is None:  # if Locus object wasn't detected before
+            i = self.slots[addr] = len(self.addr)
+            if i == len(self.drones):
+                self._spawnDrone()
+            self.addr.append(addr)
+            self.pos.append(pos)
+            self.beacons.append(''.join(beacons))
+            self.lastSeen.append(record.t_ns)
+            self.visible.append(False)
+        else:
+            self.pos[i] = pos
+            self.beacons[i] = ''.join(beacons)
+            self.lastSeen[i] = record.t_ns
+
+        if not self.visible[i]:
+            self.visible[i] = True
+            self.drones.set_visible(i, True)  # show sphere model
+        if self.motion is not None:
+            # Packets are stamped with receive time, so the time they've spent in the queue is extrapolated too
+            self.motion.update(i, record.t_ns / 1e9, pos, (record.vX / 1000.0, record.vY / 1000.0, record.vZ / 1000.0))
+        else:
+            self.drones.set_pos(i, pos[0], pos[1], pos[2])
+        if self.debugging:
+            # Display telemetry data label with 1st line being dynamic address, 2nd line being x, y, z and 3rd line
+            # being beacon status (e.g. 1_3_)
+            self.labels.set(i, addr, pos, self.beacons[i])
+
+    def _expireDrones(self, task):
+        """
+        Hide Locus objects no telemetry was received from for STALE_TIMEOUT seconds
+        """
+        deadline = time.monotonic_ns() - int(STALE_TIMEOUT * 1e9)
+        for i, seen in enumerate(self.lastSeen):
+            if seen < deadline and self.visible[i]:
+                self.visible[i] = False
+                self.drones.set_visible(i, False)  # hide sphere model
+                self.labels.hide(i)  # hide telemetry data label
+                if self.trails is not None:
+                    self.trails.set_visible(i, False)  # trail starts over once Locus object is back
+                if self.motion is not None:
+                    self.motion.reset(i)  # Locus object appears at its next packet, not blended from here
+        self.drones.flush()
+        if self.trails is not None:
+            self.trails.flush()
+        return task.again
+
     def _startLogger(self):
         if not self.logging:
             self.logging = True
             self.loggerText.setText('Logging...')  # display 'Logging...' on the screen
-            self.timer = timeit.default_timer()  # timer initialization
-            self.logName = datetime.now().strftime('%d-%m-%Y_%H-%M')  # e.g. filename will be 29-03-2023_17-53.txt
-            self.log = open('logs/'+str(self.logName)+'.txt', 'w')  # create file with given filename
+            # Logger thread stamps its start with the same clock packets are stamped with, filename is date and time,
+            # e.g. 29-03-2023_17-53.l3b
+            self.log = lps_log.make_logger(self.logFormat, directory='logs',
+                                           max_seconds=self.logRotate * 60 if self.logRotate else None)
 
     def _stopLogger(self):
         if self.logging:
             self.logging = False
-            self.loggerText.setText('Saved as {}.txt'.format(self.logName))  # display filename that log was saved with
+            self.log.close()  # write the rest of the log and close the file
+            # Display filename that log was saved with
+            names = [os.path.basename(path) for path in self.log.paths]
+            self.loggerText.setText('Saved as {}'.format(names[0] if len(names) == 1 else
+                                                         '{} ... {}'.format(names[0], names[-1])))
 
     def _debugger(self):
         if not self.debugging:
             self.debugging = True
         else:
             self.debugging = False
-            for i in range(len(self.dronesText)):  # hide all telemetry data labels
-                node = self.dronesText[i].node()
-                node.setText('')
+            self.labels.clear()  # hide all telemetry data labels
+
+    def _metricsHud(self):
+        self.showMetrics = not self.showMetrics
+        if self.showMetrics:
+            self._updateMetrics(None)
+            taskMgr.doMethodLater(0.5, self._updateMetrics, 'metricsTask')  # refresh twice a second
+        else:
+            taskMgr.remove('metricsTask')
+            self.metricsText.setText('')
+
+    def _getMetrics(self):
+        """
+        Collect ingest metrics of telemetry source and render metrics since the previous call
+        :return: dictionary of metrics
+        """
+        now = time.monotonic()
+        elapsed = now - self.metricsTime
+        render = {'fps': self.frames / elapsed if elapsed else None,
+                  'handle_ms_per_frame': self.handleTime / self.frames / 1e6 if self.frames else None,
+                  'label_updates_per_s': (self.labels.updates - self.labelUpdates) / elapsed if elapsed else None}
+        self.frames, self.handleTime, self.metricsTime = 0, 0, now
+        self.labelUpdates = self.labels.updates
+        get_metrics = getattr(self.lps, 'get_metrics', None)
+        return {'time': datetime.now().isoformat(), 'ingest': get_metrics() if get_metrics else None,
+                'render': render}
+
+    def _updateMetrics(self, task):
+        metrics = self._getMetrics()
+        ingest, render = metrics['ingest'], metrics['render']
+        lines = []
+        if ingest is not None:
+            ports = ingest.get('ports', [ingest])  # gs_lps.us_nav_group reports every port
+            for port in ports:
+                if 'bytes_per_s' not in port:
+                    continue
+                line = '%s: %s B/s' % (port['port'], '%.0f' % port['bytes_per_s'] if port['bytes_per_s'] is not None
+                                       else '-')
+                if port['bus_load'] is not None:
+                    line += ' (bus %.0f%%)' % (port['bus_load'] * 100)
+                if port['parser_busy'] is not None:
+                    line += ', parser busy %.1f%%' % (port['parser_busy'] * 100)
+                lines.append(line)
+                if port['frames_per_s']:
+                    lines.append('  ' + '  '.join('%s %.0f/s' % (name, rate) for name, rate in
+                                                  port['frames_per_s'].items() if rate or name == 'telemetry'))
+                lines.append('  crc errors %d, resyncs %d, dropped %d' % (port['crc_errors'], port['resyncs'],
+                                                                        port['dropped']))
+            if 'duplicates' in ingest:
+                lines.append('duplicates %d' % ingest['duplicates'])
+            if 'lost' in ingest:
+                lines.append('received %d, lost datagrams %d, dropped %d' % (ingest['received'], ingest['lost'],
+                                                                              ingest['dropped']))
+            latency = ingest['latency']
+            lines.append('latency p50 %.1f ms, p99 %.1f ms, max %.1f ms' % (latency['p50_us'] / 1000,
+                                                                           latency['p99_us'] / 1000,
+                                                                           latency['max_us'] / 1000))
+        else:
+            lines.append('no ingest metrics')
+        if render['fps'] is not None and render['handle_ms_per_frame'] is not None:
+            lines.append('render %.1f fps, telemetry handling %.2f ms/frame' % (render['fps'],
+                                                                                 render['handle_ms_per_frame']))
+        if self.debugging and render['label_updates_per_s'] is not None:
+            lines.append('label text updates %.0f/s' % render['label_updates_per_s'])
+        self.metricsText.setText('\n'.join(lines))
+        return task.again if task is not None else None
+
+    def _exportMetrics(self):
+        name = 'logs/metrics_' + datetime.now().strftime('%d-%m-%Y_%H-%M-%S') + '.json'
+        with open(name, 'w') as f:
+            json.dump(self._getMetrics(), f, indent=2)
+        self.loggerText.setText('Metrics saved as {}'.format(name[5:]))
 
     def _exit(self):
+        self._stopLogger()  # log is never left unflushed
         self.lps.stop()  # stop gs_lps.us_nav thread, close serial port
         exit(0)
 
 
+def parseArgs():
+    """
+    Parse command line arguments. Without arguments /dev/ttyUSB0 is read
+    :return: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description='Locus 3D visualization')
+    parser.add_argument('--port', action='append', help='RS-485 adapter serial port, repeat to read several adapters '
+                                                        'at once (default: /dev/ttyUSB0)')
+    parser.add_argument('--sim', type=int, metavar='DRONES', help='visualize synthetic swarm of given amount of drones '
+                                                                  'instead of reading the port')
+    parser.add_argument('--rate', type=float, default=10.0, help='synthetic telemetry rate of each drone, Hz')
+    parser.add_argument('--pattern', default='circle', choices=lps_sim.PATTERNS, help='synthetic flight pattern')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic swarm random seed')
+    parser.add_argument('--subscribe', choices=lps_pubsub.TRANSPORTS, help='visualize telemetry published by another '
+                                                                          'process instead of reading the port')
+    parser.add_argument('--publish', choices=lps_pubsub.TRANSPORTS, help='also publish received telemetry to local '
+                                                                        'subscribers')
+    parser.add_argument('--instanced', action='store_true', help='draw all drones with a single instanced sphere, '
+                                                                 'for swarms of hundreds of drones')
+    parser.add_argument('--label-rate', type=float, default=lps_render.LABEL_RATE, help='debug label text updates '
+                                                                                       'per second')
+    parser.add_argument('--trail', type=int, default=0, metavar='LENGTH', help='show flight path trails of given '
+                                                                               'amount of points')
+    parser.add_argument('--trail-decimation', type=int, default=lps_render.TRAIL_DECIMATION,
+                        help='telemetry packets of each drone per trail point')
+    parser.add_argument('--smooth', action='store_true', help='move drones between packets with their velocity')
+    parser.add_argument('--log-format', default='binary', choices=lps_log.FORMATS, help='format of logs written with '
+                                                                                      'F1')
+    parser.add_argument('--log-rotate', type=float, metavar='MINUTES', help='start the next log file every given '
+                                                                            'amount of minutes')
+    parser.add_argument('--pstats', action='store_true', help='send frame timing to a running PStats server')
+    parser.add_argument('--dedup', type=float, default=0.05, help='time two copies of a packet may arrive apart on '
+                                                                  'different adapters, seconds')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    visualization = Locus3D()
+    args = parseArgs()
+    if args.subscribe:
+        source = lps_pubsub.telemetry_subscriber(args.subscribe)
+    elif args.sim:
+        source = lps_sim.simulate(drones=args.sim, rate=args.rate, pattern=args.pattern, seed=args.seed)
+    elif args.port and len(args.port) > 1:
+        source = gs_lps.us_nav_group(args.port, dedup_window=args.dedup)
+    else:
+        source = gs_lps.us_nav(serial_port=args.port[0] if args.port else "/dev/ttyUSB0")
+    if args.publish and not args.subscribe:
+        lps_pubsub.telemetry_publisher(args.publish).attach(source)
+    if args.pstats:
+        PStatClient.connect()
+    visualization = Locus3D(source, instanced=args.instanced, labelRate=args.label_rate, trailLength=args.trail,
+                            trailDecimation=args.trail_decimation, logFormat=args.log_format,
+                            logRotate=args.log_rotate, smooth=args.smooth)
     visualization.run()
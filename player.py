@@ -1,11 +1,29 @@
+import time
+START = time.perf_counter()  # to report time to the first frame
+from direct.gui.DirectSlider import DirectSlider
 from direct.gui.OnscreenText import OnscreenText
 from direct.showbase.ShowBase import ShowBase
 from panda3d.core import *
-import tkinter as tk
-from tkinter.filedialog import askopenfilename
+import argparse
+import os
 import timeit
+import numpy as np
+import lps_render
+import lps_export
+import lps_log
+import lps_motion
+import lps_playback
 
 MAX_MISMATCHES = 1000  # maximum amount of missed iterations before Locus object will disappear from visualization
+STREAM_BYTES = 512 << 20  # logs larger than that are played from a memory-mapped file instead of memory
+SEEK_STEP = 10.0  # seconds to seek with left and right arrows, SEEK_STEP_LONG with shift held
+SEEK_STEP_LONG = 60.0
+SPEEDS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0)  # playback speeds switched with up and down arrows
+EXPORT_FPS = 30.0  # frames per second of exported video
+EXPORT_SIZE = (1280, 720)  # pixels of exported frames
+EXPORT_REPORT = 5.0  # seconds between export progress lines
+EXPORT_CAMERA = (0, -16, 9)  # camera position of exported frames, looking at EXPORT_TARGET
+EXPORT_TARGET = (0, 0, 1.5)
 
 
 def displayText(pos, msg, parent, align):
@@ -22,6 +40,23 @@ def displayText(pos, msg, parent, align):
                         pos=pos, align=align)
 
 
+def beaconText(b_beacons):
+    """
+    :param b_beacons: beacon status bits
+    :return: beacon status text, e.g. '1_34'
+    """
+    beacons = list('____')
+    if b_beacons & 1 != 0:  # if first bit is 1, then beacons = '1___'
+        beacons[0] = '1'
+    if b_beacons & 2 != 0:  # if second bit is 1, then beacons = '*2__'
+        beacons[1] = '2'
+    if b_beacons & 3 != 0:  # if third bit is 1, then beacons = '**3_'
+        beacons[2] = '3'
+    if b_beacons & 4 != 0:  # if forth bit is 1, then beacons = '***4'
+        beacons[3] = '4'
+    return ''.join(beacons)
+
+
 def drawAxis(render):
     """
     Create axis lines at the center of the environment. X-axis is red, Y-axis is green and Z-axis is blue
@@ -89,163 +124,403 @@ def drawGrid(render):
     grid_node.setColor((0.2, 0.2, 0.2, 1), 1)
 
 
+def drawScene(render):
+    """
+    Create static scene: axis lines and grid
+    :param render: NodePath to attach lines to
+    """
+    drawAxis(render)
+    drawGrid(render)
+
+
 class LogPlayer(ShowBase):
-    def __init__(self):
+    def __init__(self, fn=None, instanced=False, labelRate=lps_render.LABEL_RATE, trailLength=0,
+                 trailDecimation=lps_render.TRAIL_DECIMATION, smooth=False, speed=1.0, stream=None):
+        """
+        :param fn: log filename, asked with a file dialog if None
+        :param instanced: draw all drones with a single instanced sphere when the graphics driver supports it
+        :param labelRate: debug label text updates per second
+        :param trailLength: amount of points in flight path trail of each Locus object, no trails if 0
+        :param trailDecimation: log lines of Locus object per trail point
+        :param smooth: move Locus objects between their log lines instead of jumping from line to line
+        :param speed: log seconds played per second
+        :param stream: whether to play the log from a memory-mapped file, reading only the lines around the playback
+                       position, instead of loading it into memory. Logs larger than STREAM_BYTES are if None
+        """
         ShowBase.__init__(self)
-        window = WindowProperties()
-        window.setTitle('Locus 3D log player')
-        base.win.requestProperties(window)
+        if isinstance(base.win, GraphicsWindow):  # offscreen buffer has neither title nor close button
+            window = WindowProperties()
+            window.setTitle('Locus 3D log player')
+            base.win.requestProperties(window)
+            base.win.setCloseRequestEvent('window_exit')
         self.accept('f1', self._interact)  # assign _interact method to F1 keyboard button
         self.accept('f2', self._restart)  # assign _restart method to F2 keyboard button
         self.accept('f3', self._debugger)  # assign _debugger method to F3 keyboard button
+        self.accept('arrow_left', self._skip, [-SEEK_STEP])  # arrows seek back and forward
+        self.accept('arrow_right', self._skip, [SEEK_STEP])
+        self.accept('shift-arrow_left', self._skip, [-SEEK_STEP_LONG])
+        self.accept('shift-arrow_right', self._skip, [SEEK_STEP_LONG])
+        self.accept('arrow_up', self._changeSpeed, [1])  # arrows up and down switch playback speed
+        self.accept('arrow_down', self._changeSpeed, [-1])
+        self.accept('f4', self._reverse)  # assign _reverse method to F4 keyboard button
+        self.accept('window_exit', self._exit)  # call _exit method upon closing window
         taskMgr.add(self.__main, 'mainTask')  # add __main to Panda3D event handler
 
-        # tkinter is used to get log filename, but other functions are locked by withdraw method
-        tk.Tk().withdraw()
-        fn = askopenfilename()
-        self.log = []
-        with open(fn, 'r') as f:
-            for line in f:
-                string = line.strip()
-                self.log.append(string.split(', '))
+        if fn is None:
+            # tkinter is used to get log filename, but other functions are locked by withdraw method
+            import tkinter as tk
+            from tkinter.filedialog import askopenfilename
+            tk.Tk().withdraw()
+            fn = askopenfilename()
+        if stream is None:
+            stream = os.path.getsize(fn) > STREAM_BYTES
+        # Log is parsed once into typed columns, text log is loaded from its parsed copy the next time
+        start_ns, records = lps_log.load(fn, mmap=stream)
+        if stream:
+            self.log = lps_playback.mapped_log(records, start_ns, MAX_MISMATCHES + 1)
+        else:
+            # Signed, a record of a rotated file may be received milliseconds before the file start
+            times = (records['t_ns'].astype(np.int64) - np.int64(start_ns)) / 1e9
+            self.log = lps_playback.memory_log(times, records['addr'],
+                                               np.column_stack((records['x'], records['y'], records['z'])),
+                                               records['beacons'])
+        del records
+        self.duration = self.log.duration
 
         self.playing = False  # flag to monitor whether player should play the log or not
-        self.timerStop = 0.0  # for further use to pause the player
-        self.iterator = 0  # to define log line reading order
+        self.speed = speed  # log seconds played per second
+        self.direction = 1  # 1 to play forward, -1 to play in reverse
+        self.timeOrigin = 0.0  # log time at self.wallOrigin, and while paused
+        self.wallOrigin = timeit.default_timer()
+        self.iterator = 0  # lines before it are played
         self.debugging = False  # flag to monitor whether visualization should display telemetry data or not
 
         displayText((0.08, -0.04 - 0.04), 'Log {} loaded'.format(fn), base.a2dTopLeft, TextNode.ALeft)
-        displayText((0.08, -0.11 - 0.04), '[F1]: Play/pause player', base.a2dTopLeft, TextNode.ALeft)
-        displayText((0.08, -0.18 - 0.04), '[F2]: Restart player', base.a2dTopLeft, TextNode.ALeft)
-        displayText((0.08, -0.25 - 0.04), '[F3]: Show/hide debug labels', base.a2dTopLeft, TextNode.ALeft)
+        self.keysText = [  # key help, hidden in exported frames
+            displayText((0.08, -0.11 - 0.04), '[F1]: Play/pause player', base.a2dTopLeft, TextNode.ALeft),
+            displayText((0.08, -0.18 - 0.04), '[F2]: Restart player', base.a2dTopLeft, TextNode.ALeft),
+            displayText((0.08, -0.25 - 0.04), '[F3]: Show/hide debug labels', base.a2dTopLeft, TextNode.ALeft),
+            displayText((0.08, -0.32 - 0.04), '[F4]: Play forward/in reverse', base.a2dTopLeft, TextNode.ALeft),
+            displayText((0.08, -0.39 - 0.04), '[Left/Right]: Seek %d s, %d s with Shift' % (SEEK_STEP, SEEK_STEP_LONG),
+                        base.a2dTopLeft, TextNode.ALeft),
+            displayText((0.08, -0.46 - 0.04), '[Up/Down]: Faster/slower', base.a2dTopLeft, TextNode.ALeft)]
         self.status_text = displayText((0.08, 0.09), '', base.a2dBottomLeft, TextNode.ALeft)
         self.timer_text = displayText((0.08, 0.09), '', base.a2dBottomCenter, TextNode.ACenter)
         base.setBackgroundColor(0, 0, 0)  # set background color of visualization to black
-        drawAxis(self.render)
-        drawGrid(self.render)
-
-        self.drones = []  # list for Panda3D objects containing models, colors and position parameters
-        self.dronesText = []  # list for debugging text labels shown whenever self.debugging is True
-        self.addr = []  # list for dynamic addresses of Locus objects
-        self.pos = []  # list for x, y, z coordinates of Locus objects
-        self.beacons = []  # list for beacon statuses of Locus objects. 0 = no beacons, 15 = all beacons
-        self.mismatches = []  # list for amounts of missed iterations of each Locus objects to monitor their connection
-
-        addrNum = []  # list for unique addressed found withing the log
-        for i in range(len(self.log)):
-            if self.log[i][3] not in addrNum:  # if addr is unique (not in addrNum list yet)
-                addrNum.append(self.log[i][3])  # add it to addrNum list
-
-        # Set model, random color and reparentness for each Panda3D object and hide it. Create telemetry data label
-        # with no info yet and set their scale and reparentness for each Panda3D object
-        for i in range(len(addrNum)):
-            drone = loader.loadModel('colorable_sphere')  # use colorable_sphere model for each object
-            drone.setScale(0.22, 0.22, 0.22)  # scale it to approximately 0.1m diameter size
-            drone.setColor(1.0-0.14*i, 0.0+0.14*i, 0.4+0.7*i, 1)  # set color from random color scheme
-            drone.reparentTo(self.render)
-            drone.hide()  # hide object until it's assigned to a Locus object
-            self.drones.append(drone)
-
-            node = TextNode('xyz')
-            node.setText('')
-            droneText = self.aspect2d.attachNewNode(node)  # create TextNode using Panda3D method
-            droneText.setScale(0.22)
-            droneText.reparentTo(self.render)
-            self.dronesText.append(droneText)
+        # Axis and grid never change, they are built once and loaded from cache afterwards
+        lps_render.load_static(self.loader, 'player_scene', drawScene, [__file__]).reparentTo(self.render)
+        lps_render.report_first_frame(self, START, 'Locus 3D log player')
+
+        self.drones = lps_render.make_swarm(self, self.render, instanced)  # sphere models of Locus objects
+        self.labels = lps_render.drone_labels(self.render, labelRate)  # debug labels shown when self.debugging is True
+        self.trails = lps_render.drone_trails(self.render, trailLength, trailDecimation) if trailLength else None
+        self.motion = lps_motion.motion_smoother() if smooth else None  # interpolation between log lines
+        # Last played line of every Locus object, -1 if none. Its address, position and beacon status are the ones
+        # of the line, a Locus object disappears once more than MAX_MISMATCHES lines of others are played after it
+        self.lastLine = np.zeros(0, dtype=np.int64)
+        self.shown = np.zeros(0, dtype=bool)  # whether sphere model of a Locus object is shown
+        self._spawn()
+        # Scrubber shows the log time and seeks when dragged or clicked
+        self.scrubber = DirectSlider(parent=base.a2dBottomCenter, pos=(0, 0, 0.2), scale=(0.9, 1, 0.5),
+                                     range=(0, max(self.duration, 1e-3)), value=0, pageSize=self.duration / 20,
+                                     command=self._scrub)
+        self.scrubberValue = self.scrubber.getValue()  # value set by the player, not by the user
+
+    def _spawn(self):
+        """
+        Spawn hidden sphere model, telemetry data label and trail for every Locus object the log has met so far, all of
+        them for a log in memory
+        """
+        for i in range(len(self.lastLine), len(self.log.slot_addrs)):
+            self.drones.spawn()  # hidden until it's assigned to a Locus object
+            self.labels.spawn()
+            if self.trails is not None:
+                self.trails.spawn()
+            if self.motion is not None:
+                self.motion.spawn()
+        missing = len(self.log.slot_addrs) - len(self.lastLine)
+        self.lastLine = np.concatenate((self.lastLine, np.full(missing, -1, dtype=np.int64)))
+        self.shown = np.concatenate((self.shown, np.zeros(missing, dtype=bool)))
 
     def __main(self, task):
-        if self.iterator >= len(self.log):  # if end of the log reached
-            self.status_text.setText('Finished')  # display 'Finished' on the screen
-        elif self.iterator < len(self.log):
-            if self.playing:
-                logTime = float(self.log[self.iterator][0])  # extract time from current log line
-                # If current line's time is smaller than real time defined with the timer, wait until it's not
-                if logTime < (timeit.default_timer() - self.timer):
-                    timeText = 'Real time ' + '%.4f' % round((timeit.default_timer()-self.timer), 4) + ' / Log time: '\
-                               + '%.4f' % round(logTime, 4)  # display both real time and log time for comparison
-                    self.timer_text.setText(timeText)
-                    addr = int(self.log[self.iterator][3])  # extract address from current log line
-                    pos = (float(self.log[self.iterator][8]), float(self.log[self.iterator][9]),
-                           float(self.log[self.iterator][10]))  # extract position from current log line
-                    b_beacons = int(self.log[self.iterator][15])  # extract beacon status from current log line
-                    beacons = list('____')
-                    if b_beacons & 1 != 0:  # if first bit is 1, then beacons = '1___'
-                        beacons[0] = '1'
-                    if b_beacons & 2 != 0:  # if second bit is 1, then beacons = '*2__'
-                        beacons[1] = '2'
-                    if b_beacons & 3 != 0:  # if third bit is 1, then beacons = '**3_'
-                        beacons[2] = '3'
-                    if b_beacons & 4 != 0:  # if forth bit is 1, then beacons = '***4'
-                        beacons[3] = '4'
-
-                    if addr not in self.addr:  # if Locus object wasn't detected before
-                        self.addr.append(addr)  # add its address to self.addr list
-                        self.pos.append(pos)  # add its current position to self.pos list
-                        self.beacons.append(''.join(beacons))  # add its current beacon status to self.beacons list
-                        self.mismatches.append(0)  # set its missed iterations amount to 0
-                    if addr in self.addr:
-                        # Find index of given address and update its position and beacon status
-                        i = self.addr.index(addr)
-                        self.pos[i] = pos
-                        self.beacons[i] = ''.join(beacons)
-
-                    for i in range(len(self.addr)):
-                        if addr != self.addr[i]:
-                            self.mismatches[i] += 1  # increase amount of mismatches by 1 for each address expect addr
-                        else:
-                            self.mismatches[i] = 0  # set addr' mismatches amount to 0
-
-                        if self.mismatches[i] > MAX_MISMATCHES:  # if amount of mismatches exceeds maximum
-                            self.drones[i].hide()  # hide sphere model
-                            node = self.dronesText[i].node()
-                            node.setText('')  # hide telemetry data label
-                        else:
-                            self.drones[i].show()  # show sphere model
-                            self.drones[i].setX(self.pos[i][0])
-                            self.drones[i].setY(self.pos[i][1])
-                            self.drones[i].setZ(self.pos[i][2])
-
-                            if self.debugging:
-                                node = self.dronesText[i].node()
-                                # Display telemetry data label with 1st line being dynamic address, 2nd line being
-                                # x, y, z and 3rd line being beacon status
-                                node.setText('%d\n%.2f, %.2f, %.2f\n%s' % (self.addr[i], self.pos[i][0], self.pos[i][1],
-                                                                           self.pos[i][2], self.beacons[i]))
-                                self.dronesText[i].setX(self.pos[i][0] + 0.2)
-                                self.dronesText[i].setY(self.pos[i][1])
-                                self.dronesText[i].setZ(self.pos[i][2] + 0.2)
-                                # Labels follow the camera so they're always visible
-                                self.dronesText[i].setBillboardPointEye()
-                    self.iterator += 1  # go to the next log line
-            return task.cont
+        if self.playing:
+            playTime = self._playTime()
+            if not 0.0 <= playTime <= self.duration:  # if end (or beginning, in reverse) of the log reached
+                playTime = min(max(playTime, 0.0), self.duration)
+                self.playing = False
+                self.timeOrigin = playTime
+                self.status_text.setText('Finished')  # display 'Finished' on the screen
+            self._playTo(playTime)
+            logTime = self.log.time(self.iterator - 1) if self.iterator else 0.0
+            # Display both play time and time of the last played line for comparison
+            self.timer_text.setText('Play time %.4f (%sx%g) / Log time: %.4f'
+                                    % (playTime, '-' if self.direction < 0 else '', self.speed, logTime))
+            if abs(playTime - self.scrubberValue) > self.duration / 1000:  # a step of the scrubber at most
+                self._setScrubber(playTime)
+        if self.trails is not None:
+            self.trails.flush()
+        self.labels.flush()
+        return task.cont
+
+    def _playTo(self, t, rebuild=False):
+        """
+        Play every line up to the given log time at once: forward from the last played line, or rebuilt from the lines
+        before the time when going back
+        :param t: seconds since the start of the log
+        :param rebuild: whether to rebuild the scene even when going forward, trails included
+        """
+        k = self.log.search(t)  # lines before k are played by the time
+        if k >= self.iterator and not rebuild:
+            slots, positions = self.log.lines(self.iterator, k)
+            self._spawn()
+            if self.trails is not None:
+                for i, (x, y, z) in zip(slots.tolist(), positions.tolist()):
+                    self.trails.set_pos(i, x, y, z)
+            updated, latest = np.unique(slots[::-1], return_index=True)  # Locus objects of the lines, last line of each
+            self.lastLine[updated] = k - 1 - latest
+        else:
+            last = self.log.last_lines(k)
+            self._spawn()
+            self.lastLine[:] = -1
+            self.lastLine[:len(last)] = last
+            updated = np.flatnonzero(self.lastLine >= 0)
+            for i in range(len(self.lastLine)):
+                if self.trails is not None:
+                    self.trails.set_visible(i, False)  # trails are drawn forward only
+                if self.motion is not None:
+                    self.motion.reset(i)  # no blending towards earlier positions
+        self.iterator = k
+        visible = (self.lastLine >= 0) & (k - 1 - self.lastLine <= MAX_MISMATCHES)
+        for i in np.flatnonzero(visible != self.shown).tolist():
+            self.drones.set_visible(i, bool(visible[i]))  # show or hide sphere model
+            if not visible[i]:
+                self.labels.hide(i)  # hide telemetry data label
+                if self.trails is not None:
+                    self.trails.set_visible(i, False)  # trail starts over once Locus object is back
+                if self.motion is not None:
+                    self.motion.reset(i)
+        self.shown = visible
+        slots = np.flatnonzero(visible)
+        if rebuild and self.trails is not None:
+            for i in slots.tolist():
+                # Trail is drawn again from the lines of the Locus object before k
+                for x, y, z in self.log.history(i, k, self.trails.length * self.trails.decimation).tolist():
+                    self.trails.set_pos(i, x, y, z)
+        times, positions, beacons = self.log.rows(self.lastLine[slots])  # last lines of shown Locus objects
+        if self.motion is not None:
+            # Locus object moves towards its next log line, or stays if there's none
+            moved = updated[visible[updated]]
+            lines = self.lastLine[moved]
+            following = self.log.next_lines(k, moved)
+            following = np.where(following >= 0, following, lines)
+            start, end = self.log.rows(lines), self.log.rows(following)
+            for i, t0, pos0, t1, pos1 in zip(moved.tolist(), start[0].tolist(), start[1].tolist(), end[0].tolist(),
+                                             end[1].tolist()):
+                self.motion.set_segment(i, t0, pos0, t1, pos1)
+            drawn = self.motion.positions(t)[slots]
+        else:
+            drawn = positions
+        if len(slots):
+            self.drones.set_positions(slots, drawn)
+        self.drones.flush()
+        if self.debugging:
+            # Display telemetry data label with 1st line being dynamic address, 2nd line being x, y, z and 3rd line
+            # being beacon status
+            for i, pos, bits in zip(slots.tolist(), positions.tolist(), beacons.tolist()):
+                self.labels.set(i, self.log.slot_addrs[i], tuple(pos), beaconText(bits))
+
+    def export(self, path, fps=EXPORT_FPS, start=0.0, end=None, jobs=None):
+        """
+        Render the log frame by frame at a fixed rate into PNG frames or a video, as fast as rendering and encoding go
+        rather than in real time. Every frame is speed / fps seconds of log later than the previous one, frames are
+        copied from the window (an offscreen buffer when run headless) and encoded by lps_export on other threads
+        :param path: video filename (one of lps_export.VIDEO_EXTENSIONS) or directory of PNG frames
+        :param fps: frames per second of the video
+        :param start: log time of the first frame, seconds
+        :param end: log time of the last frame, the end of the log if None
+        :param jobs: amount of encoding threads, all CPUs if None
+        :return: amount of frames written
+        """
+        end = self.duration if end is None else min(end, self.duration)
+        start = min(max(start, 0.0), end)
+        self.playing = False  # frames are stepped here, not by the clock in __main
+        self.disableMouse()  # the whole grid in view instead of the mouse-controlled camera
+        self.camera.setPos(*EXPORT_CAMERA)
+        self.camera.lookAt(*EXPORT_TARGET)
+        self.scrubber.hide()
+        for text in self.keysText:
+            text.hide()
+        self.status_text.setText('')
+        frame = Texture('export')
+        self.win.addRenderTexture(frame, GraphicsOutput.RTMCopyRam)  # every rendered frame is copied into memory
+        size = (self.win.getXSize(), self.win.getYSize())
+        writer = lps_export.make_writer(path, size, fps, jobs)
+        frames = int((end - start) * fps / self.speed) + 1
+        self.labels.next_update = 0.0  # label text updates follow log time from here on
+        started = report = timeit.default_timer()
+        try:
+            for n in range(frames):
+                t = start + n * self.speed / fps
+                self._playTo(t, rebuild=n == 0)
+                self.timer_text.setText('Log time: %.4f' % t)
+                if self.trails is not None:
+                    self.trails.flush()
+                self.labels.flush(t)  # label text is updated labelRate times per second of the log
+                self.graphicsEngine.renderFrame()
+                # Copy of the image, the texture keeps the same memory for the next frame. BGRA is the way the buffer
+                # is copied into memory already, so it isn't converted here
+                image = np.array(frame.getRamImageAs('BGRA'), dtype=np.uint8)
+                writer.write(image.reshape(size[1], size[0], 4))
+                if timeit.default_timer() >= report + EXPORT_REPORT:
+                    report = timeit.default_timer()
+                    print('exported %d of %d frames, %.1f frames/s' % (n + 1, frames, (n + 1) / (report - started)),
+                          flush=True)
+        finally:
+            writer.close()
+            self.win.clearRenderTextures()
+        return frames
 
     def _interact(self):
         if not self.playing:
+            if not 0.0 < self.timeOrigin < self.duration:  # finished, start over
+                self._seek(0.0 if self.direction > 0 else self.duration)
             self.playing = True
             self.status_text.setText('Playing...')  # display 'Playing...' on the screen
-            self.timer = timeit.default_timer()-self.timerStop  # timer initialization/reinitialization
+            self.wallOrigin = timeit.default_timer()  # timer initialization/reinitialization
         else:
+            self.timeOrigin = self._playTime()  # store log time reached before pause
             self.playing = False
-            self.timerStop = timeit.default_timer()-self.timer  # store amount of time passed before pause
             self.status_text.setText('Paused')  # display 'Paused' on the screen
 
     def _restart(self):
         self.playing = True
-        self.iterator = 0
-        self.timer = timeit.default_timer()  # restart timer
-        taskMgr.add(self.__main, 'mainTask')  # restart __main in Panda3D event handler
+        self.direction = 1
+        self._seek(0.0)  # rewind and restart timer
         self.status_text.setText('Restarted, playing...')  # display 'Restarted, playing...' on the screen
 
+    def _playTime(self):
+        """
+        :return: current log time, seconds
+        """
+        if not self.playing:
+            return self.timeOrigin
+        return self.timeOrigin + (timeit.default_timer() - self.wallOrigin) * self.speed * self.direction
+
+    def _setClock(self, t):
+        """
+        Continue playing (or stay paused) from the given log time
+        """
+        self.timeOrigin = t
+        self.wallOrigin = timeit.default_timer()
+
+    def _changeSpeed(self, step):
+        index = min(range(len(SPEEDS)), key=lambda n: abs(SPEEDS[n] - self.speed))
+        self._setClock(self._playTime())
+        self.speed = SPEEDS[min(max(index + step, 0), len(SPEEDS) - 1)]
+
+    def _reverse(self):
+        self._setClock(self._playTime())
+        self.direction = -self.direction
+
+    def _skip(self, step):
+        self._seek(self._playTime() + step)
+
+    def _scrub(self):
+        value = self.scrubber.getValue()
+        if abs(value - self.scrubberValue) > 1e-6 * max(self.duration, 1.0):  # moved by the user
+            self._seek(value)
+
+    def _seek(self, t):
+        """
+        Jump to the given log time: state of every Locus object is taken from the keyframe before it and updated with
+        the lines between the keyframe and the time
+        :param t: seconds since the start of the log
+        """
+        t = min(max(t, 0.0), self.duration)
+        self._playTo(t, rebuild=True)
+        self._setClock(t)
+        self._setScrubber(t)
+        self.timer_text.setText('Log time: %.4f' % t)
+
+    def _setScrubber(self, t):
+        self.scrubber.setValue(t)
+        self.scrubberValue = self.scrubber.getValue()
+
     def _debugger(self):
         if not self.debugging:
             self.debugging = True
         else:
             self.debugging = False
-            for i in range(len(self.dronesText)):  # hide all telemetry data labels
-                node = self.dronesText[i].node()
-                node.setText('')
+            self.labels.clear()  # hide all telemetry data labels
+
+    def _exit(self):
+        self.log.close()  # stop mapped_log prefetch thread
+        exit(0)
+
+
+def parseArgs():
+    """
+    Parse command line arguments. Without arguments log file is asked with a file dialog
+    :return: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description='Locus 3D log player')
+
+    def positive(value):
+        # Speed and frame rate divide export time, zero or negative ones are rejected
+        number = float(value)
+        if not number > 0:
+            parser.error('%s is not a positive number' % value)
+        return number
+
+    parser.add_argument('log', nargs='?', help='log file to play')
+    parser.add_argument('--instanced', action='store_true', help='draw all drones with a single instanced sphere')
+    parser.add_argument('--label-rate', type=float, default=lps_render.LABEL_RATE, help='debug label text updates '
+                                                                                       'per second')
+    parser.add_argument('--trail', type=int, default=0, metavar='LENGTH', help='show flight path trails of given '
+                                                                               'amount of points')
+    parser.add_argument('--trail-decimation', type=int, default=lps_render.TRAIL_DECIMATION,
+                        help='log lines of a drone per trail point')
+    parser.add_argument('--smooth', action='store_true', help='move drones between log lines')
+    parser.add_argument('--speed', type=positive, default=1.0, help='log seconds played per second')
+    parser.add_argument('--stream', action='store_true', default=None, help='play the log from a memory-mapped file '
+                                                                            '(default for logs over %d MB)'
+                                                                            % (STREAM_BYTES >> 20))
+    parser.add_argument('--labels', action='store_true', help='show debug labels from the start')
+    parser.add_argument('--export', metavar='PATH', help='render the log offscreen into a video (%s, needs ffmpeg) or '
+                                                         'a directory of PNG frames and exit'
+                                                         % ', '.join(lps_export.VIDEO_EXTENSIONS))
+    parser.add_argument('--fps', type=positive, default=EXPORT_FPS, help='frames per second of exported video, every '
+                                                                      'frame is speed / fps seconds of log')
+    parser.add_argument('--size', type=int, nargs=2, default=EXPORT_SIZE, metavar=('WIDTH', 'HEIGHT'),
+                        help='exported frame size, pixels')
+    parser.add_argument('--start', type=float, default=0.0, help='log time to export from, seconds')
+    parser.add_argument('--end', type=float, help='log time to export to, seconds (default: end of the log)')
+    parser.add_argument('--jobs', type=int, help='export encoding threads (default: all CPUs)')
+    parser.add_argument('--pstats', action='store_true', help='send frame timing to a running PStats server')
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    player = LogPlayer()
-    player.run()
+    args = parseArgs()
+    if args.export:
+        if args.log is None:
+            raise SystemExit('log file is needed to export')
+        # Headless: software rendering into an offscreen buffer works without a display or GPU
+        loadPrcFileData('', 'window-type offscreen\naudio-library-name null\nsync-video false\nwin-size %d %d'
+                        % tuple(args.size))
+    if args.pstats:
+        PStatClient.connect()
+    player = LogPlayer(args.log, instanced=args.instanced, labelRate=args.label_rate, trailLength=args.trail,
+                       trailDecimation=args.trail_decimation, smooth=args.smooth, speed=args.speed,
+                       stream=args.stream)
+    if args.labels:
+        player._debugger()
+    if args.export:
+        started = timeit.default_timer()
+        count = player.export(args.export, args.fps, args.start, args.end, args.jobs)
+        elapsed = timeit.default_timer() - started
+        print('%d frames (%.1f s of video) exported to %s in %.1f s, %.1f frames/s'
+              % (count, count / args.fps, args.export, elapsed, count / elapsed))
+        player._exit()
+    else:
+        player.run()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless Locus telemetry recorder for long sessions: serial ingestion and lps_log logging without any graphics, so it
+runs on a machine with no display or GPU. Logs are the ones main.py writes with F1 and are played by player.py.
+Controlled by signals (POSIX):
+    SIGUSR1 - pause or resume recording, every resume starts a new log
+    SIGHUP - start the next log file of the session, the finished one can be moved away
+    SIGINT, SIGTERM - write the rest of the log and exit
+Run 'python recorder.py --help' to see options
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+import gs_lps
+import lps_log
+
+POLL_INTERVAL = 0.1  # seconds between draining telemetry source
+
+
+class recorder(object):
+    """
+    Drains telemetry source and hands records over to a logger. Signal handlers only set flags, which the main loop
+    acts on between drains
+    """
+    def __init__(self, source, log_format='binary', directory='logs', max_bytes=lps_log.MAX_BYTES, max_seconds=None,
+                 paused=False, status=None):
+        """
+        :param source: telemetry source (gs_lps.us_nav, gs_lps.us_nav_group or anything with the same start, drain and
+                       stop methods), not started yet
+        :param log_format: one of lps_log.FORMATS
+        :param directory: directory logs are written to
+        :param max_bytes: log file size to start the next file at
+        :param max_seconds: log file age to start the next file at, never if None
+        :param paused: whether to wait for SIGUSR1 to start recording
+        :param status: seconds between status lines printed to stdout, never if None
+        """
+        self.source = source
+        self.log_format = log_format
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.status = status
+        self.logger = None
+        self.recording = not paused
+        self.running = True
+        self._toggle = self._rotate = False
+        self.files = []  # log files written during previous recordings
+
+    def handle_signal(self, signum, frame):
+        if signum == signal.SIGUSR1:
+            self._toggle = True
+        elif signum == signal.SIGHUP:
+            self._rotate = True
+        else:
+            self.running = False
+
+    def install_signals(self):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.handle_signal)
+        for name in ('SIGUSR1', 'SIGHUP'):
+            if hasattr(signal, name):  # POSIX only
+                signal.signal(getattr(signal, name), self.handle_signal)
+
+    def run(self):
+        """
+        Record until SIGINT or SIGTERM
+        """
+        self.source.start()
+        if self.recording:
+            self._start_logger()
+        next_status = time.monotonic() + self.status if self.status else None
+        try:
+            while self.running:
+                time.sleep(POLL_INTERVAL)
+                records = self.source.drain()
+                if self.logger is not None:
+                    self.logger.log(records)
+                if self._toggle:
+                    self._toggle = False
+                    if self.logger is None:
+                        self._start_logger()
+                    else:
+                        self._stop_logger()
+                if self._rotate:
+                    self._rotate = False
+                    if self.logger is not None:
+                        self.logger.rotate()
+                        self._print('next log file')
+                if next_status is not None and time.monotonic() >= next_status:
+                    next_status += self.status
+                    self._print_status()
+        finally:
+            self._stop_logger()
+            self.source.stop()
+
+    def _start_logger(self):
+        self.logger = lps_log.make_logger(self.log_format, directory=self.directory, max_bytes=self.max_bytes,
+                                          max_seconds=self.max_seconds)
+        self._print('recording to ' + self.logger.path)
+
+    def _stop_logger(self):
+        if self.logger is not None:
+            self.logger.close()
+            self.files.extend(self.logger.paths)
+            self._print('saved %d records to %s' % (self.logger.records, ', '.join(self.logger.paths)))
+            self.logger = None
+
+    def _print_status(self):
+        line = 'recording to %s, %d records' % (self.logger.path, self.logger.records) if self.logger is not None \
+            else 'paused'
+        get_metrics = getattr(self.source, 'get_metrics', None)
+        if get_metrics is not None:
+            metrics = get_metrics()
+            ports = metrics.get('ports', [metrics])  # gs_lps.us_nav_group reports every port
+            line += ', %d dropped, %d crc errors' % (sum(port.get('dropped', 0) for port in ports),
+                                                     sum(port.get('crc_errors', 0) for port in ports))
+            if 'duplicates' in metrics:
+                line += ', %d duplicates' % metrics['duplicates']
+        self._print(line)
+
+    @staticmethod
+    def _print(line):
+        print(time.strftime('%H:%M:%S'), line, flush=True)
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='Record Locus telemetry without the 3D view')
+    parser.add_argument('--port', action='append', help='RS-485 adapter serial port, repeat to read several adapters '
+                                                        'at once (default: /dev/ttyUSB0)')
+    parser.add_argument('--sim', type=int, metavar='DRONES', help='record synthetic swarm of given amount of drones')
+    parser.add_argument('--rate', type=float, default=10.0, help='synthetic telemetry rate of each drone, Hz')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic swarm random seed')
+    parser.add_argument('--subscribe', choices=('udp', 'unix'), help='record telemetry published by another process '
+                                                                     'instead of reading the port')
+    parser.add_argument('--mode', default='blocking', choices=gs_lps.us_nav.MODES, help='serial reader mode')
+    parser.add_argument('--dedup', type=float, default=0.05, help='time two copies of a packet may arrive apart on '
+                                                                  'different adapters, seconds')
+    parser.add_argument('--log-format', default='binary', choices=lps_log.FORMATS)
+    parser.add_argument('--directory', default='logs', help='directory logs are written to')
+    parser.add_argument('--rotate', type=float, metavar='MINUTES', help='start the next log file every given amount '
+                                                                        'of minutes')
+    parser.add_argument('--max-mb', type=float, default=lps_log.MAX_BYTES / 2 ** 20, help='start the next log file '
+                                                                                         'at given size, MB')
+    parser.add_argument('--paused', action='store_true', help='wait for SIGUSR1 to start recording')
+    parser.add_argument('--status', type=float, default=60.0, metavar='SECONDS', help='print status every given '
+                                                                                      'amount of seconds, 0 never')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parseArgs()
+    if args.subscribe:
+        import lps_pubsub
+        source = lps_pubsub.telemetry_subscriber(args.subscribe)
+    elif args.sim:
+        import lps_sim
+        source = lps_sim.simulate(drones=args.sim, rate=args.rate, seed=args.seed)
+    elif args.port and len(args.port) > 1:
+        source = gs_lps.us_nav_group(args.port, dedup_window=args.dedup, mode=args.mode)
+    else:
+        source = gs_lps.us_nav(serial_port=args.port[0] if args.port else "/dev/ttyUSB0", mode=args.mode)
+    app = recorder(source, args.log_format, args.directory, int(args.max_mb * 2 ** 20),
+                   args.rotate * 60 if args.rotate else None, args.paused, args.status or None)
+    app.install_signals()
+    print('recorder pid %d: SIGUSR1 pauses/resumes, SIGHUP starts the next file, SIGINT/SIGTERM stops' % os.getpid(),
+          flush=True)
+    app.run()
+    sys.exit(0)
@@ -0,0 +1,61 @@
+"""
+Regression tests of gs_lps.frame_scanner: frames found must not depend on how the byte stream is split into reads,
+and a corrupted frame must cost only itself
+"""
+import pytest
+
+import lps_sim
+from gs_lps import frame_scanner
+
+
+def frames_of(emitter, duration=5.0):
+    return [frame for _, frame in emitter.generate(duration)]
+
+
+def feed_chunks(stream, size):
+    scanner = frame_scanner()
+    frames = []
+    for pos in range(0, len(stream), size):
+        frames += scanner.feed(stream[pos:pos + size])
+    return scanner, frames
+
+
+@pytest.mark.parametrize('size', [1, 7, 64, 511, 512, 4096, 1 << 20])
+def test_chunk_size_invariance(size):
+    sent = frames_of(lps_sim.swarm_emitter(drones=10, seed=1))
+    stream = b''.join(sent)
+    scanner, frames = feed_chunks(stream, size)
+    assert frames == [frame[:-1] for frame in sent]
+    assert scanner.crc_errors == 0 and scanner.resyncs == 0
+    assert scanner.frames == len(sent)
+    assert not scanner.buffer
+
+
+@pytest.mark.parametrize('size', [1, 64, 4096])
+def test_partial_frame_stays_buffered(size):
+    sent = frames_of(lps_sim.swarm_emitter(drones=3, seed=2), 1.0)
+    stream = b''.join(sent) + sent[0][:10]
+    scanner, frames = feed_chunks(stream, size)
+    assert frames == [frame[:-1] for frame in sent]
+    assert scanner.feed(sent[0][10:]) == [sent[0][:-1]]
+
+
+@pytest.mark.parametrize('size', [1, 64, 4096])
+def test_crc_error_recovery(size):
+    sent = frames_of(lps_sim.swarm_emitter(drones=10, seed=3))
+    bad = len(sent) // 2
+    corrupted = bytearray(sent[bad])
+    corrupted[10] ^= 0x10  # payload byte, frame length stays intact
+    stream = b''.join(sent[:bad]) + bytes(corrupted) + b''.join(sent[bad + 1:])
+    scanner, frames = feed_chunks(stream, size)
+    assert frames == [frame[:-1] for i, frame in enumerate(sent) if i != bad]
+    assert scanner.crc_errors >= 1  # 0xFE bytes inside the rejected frame may be tried as false starts too
+
+
+def test_garbage_resync():
+    emitter = lps_sim.swarm_emitter(drones=10, seed=4, garbage=0.1)
+    stream = emitter.stream(5.0)
+    reference = feed_chunks(stream, len(stream))[1]
+    assert len(reference) >= emitter.sent - 1  # garbage may hide at most a frame behind a false start
+    for size in (1, 7, 64, 4096):
+        assert feed_chunks(stream, size)[1] == reference
@@ -0,0 +1,86 @@
+"""
+Regression tests of gs_lps.us_nav_group deduplication: a packet heard on two buses is delivered once, repeats from the
+same bus are kept, and the merged feed is ordered by receive time
+"""
+import time
+
+import lps_sim
+from gs_lps import telemetry, us_nav, us_nav_group
+
+MS = 10**6
+
+
+def record(addr, t_ns, x=1.0):
+    return telemetry(0xFE, 30, addr, 0, 0.0, 0.0, 0.0, x, 2.0, 1.0, 0, 0, 0, 8.0, 15, 130, 0, t_ns)
+
+
+def make_group(ports=2, dedup_window=0.05):
+    navs = [us_nav(ser=lps_sim.memory_port()) for _ in range(ports)]
+    return us_nav_group(navs=navs, dedup_window=dedup_window), navs
+
+
+def push(nav, *records):
+    for item in records:
+        nav.queue.push(item)
+
+
+def test_cross_bus_copy_dropped():
+    group, (a, b) = make_group()
+    t0 = time.monotonic_ns()
+    push(a, record(1, t0))
+    push(b, record(1, t0 + 2 * MS))
+    merged = group.drain()
+    assert merged == [record(1, t0)]
+    assert group.received == [1, 1]
+    assert group.duplicates == [0, 1]
+
+
+def test_same_port_repeats_kept():
+    group, (a, b) = make_group()
+    t0 = time.monotonic_ns()
+    push(a, record(1, t0), record(1, t0 + MS), record(1, t0 + 2 * MS))
+    assert len(group.drain()) == 3
+    assert group.duplicates == [0, 0]
+
+
+def test_copy_outside_window_kept():
+    group, (a, b) = make_group(dedup_window=0.05)
+    t0 = time.monotonic_ns()
+    push(a, record(1, t0))
+    push(b, record(1, t0 + 60 * MS))
+    assert len(group.drain()) == 2
+    assert group.duplicates == [0, 0]
+
+
+def test_copy_across_drains_dropped():
+    group, (a, b) = make_group()
+    t0 = time.monotonic_ns()
+    push(a, record(1, t0))
+    assert len(group.drain()) == 1
+    push(b, record(1, t0 + 10 * MS))
+    assert group.drain() == []
+    assert group.duplicates == [0, 1]
+
+
+def test_different_packets_kept_and_ordered():
+    group, (a, b) = make_group()
+    t0 = time.monotonic_ns()
+    push(a, record(1, t0), record(2, t0 + 3 * MS), record(1, t0 + 4 * MS, x=1.5))
+    push(b, record(1, t0 + MS, x=1.1), record(3, t0 + 2 * MS), record(2, t0 + 5 * MS))
+    merged = group.drain()
+    assert [item.t_ns - t0 for item in merged] == [0, MS, 2 * MS, 3 * MS, 4 * MS]
+    assert group.duplicates == [0, 1]
+    assert {addr: item.x for addr, item in group.get_latest().items()} == {1: 1.5, 2: 1.0, 3: 1.0}
+
+
+def test_listener_gets_merged_feed():
+    group, (a, b) = make_group()
+    received = []
+    group.add_listener(received.append)
+    t0 = time.monotonic_ns()
+    push(a, record(1, t0))
+    push(b, record(1, t0 + MS), record(2, t0 + 2 * MS))
+    merged = group.drain()
+    group.drain()
+    assert received == [merged]
+    assert [item.addr for item in merged] == [1, 2]
@@ -0,0 +1,61 @@
+"""
+Regression tests of gs_lps.telemetry_queue drop policy: a full queue overwrites its oldest records, counts them per
+address, and still drains the newest ones in arrival order
+"""
+import lps_sim
+from gs_lps import telemetry, telemetry_queue, us_nav
+
+
+def record(addr, t_ns):
+    return telemetry(0xFE, 30, addr, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 0, 0, 8.0, 15, 130, 0, t_ns)
+
+
+def test_drain_in_arrival_order():
+    queue = telemetry_queue(8)
+    pushed = [record(addr, t) for t, addr in enumerate((1, 2, 1, 3))]
+    for item in pushed:
+        queue.push(item)
+    assert queue.drain() == pushed
+    assert queue.drain() == []
+    assert queue.pushed == 4 and queue.dropped == 0
+
+
+def test_overflow_drops_oldest():
+    queue = telemetry_queue(4)
+    pushed = [record(1 + t % 2, t) for t in range(10)]
+    for item in pushed:
+        queue.push(item)
+    assert len(queue) == 4
+    assert queue.drain() == pushed[-4:]
+    assert queue.pushed == 10
+    assert queue.dropped == 6
+    assert queue.dropped_by_addr == {1: 3, 2: 3}
+
+
+def test_drops_counted_by_address_of_dropped_record():
+    queue = telemetry_queue(2)
+    for item in (record(5, 0), record(5, 1), record(7, 2), record(7, 3)):
+        queue.push(item)
+    assert queue.dropped_by_addr == {5: 2}
+
+
+def test_latest_survives_drain_and_overflow():
+    queue = telemetry_queue(2)
+    for t, addr in enumerate((1, 2, 3, 3)):
+        queue.push(record(addr, t))
+    queue.drain()
+    assert {addr: item.t_ns for addr, item in queue.get_latest().items()} == {1: 0, 2: 1, 3: 3}
+    assert telemetry_queue(2, latest=False).get_latest() == {}
+
+
+def test_reader_overflow():
+    stream = lps_sim.swarm_emitter(drones=10, seed=5).stream(5.0)
+    reference = us_nav(ser=lps_sim.memory_port(), queue_size=len(stream))
+    reference._ingest(stream)
+    expected = [item[:-1] for item in reference.drain()]
+    nav = us_nav(ser=lps_sim.memory_port(), queue_size=100)
+    nav._ingest(stream)
+    assert [item[:-1] for item in nav.drain()] == expected[-100:]
+    assert nav.queue.pushed == len(expected)
+    assert nav.queue.dropped == len(expected) - 100
+    assert sum(nav.queue.dropped_by_addr.values()) == nav.queue.dropped